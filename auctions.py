@@ -0,0 +1,338 @@
+"""
+Timed auctions with escrowed bids.
+
+A seller puts a character up with a reserve price and a duration. Every bid
+is escrowed through the gold ledger: one ledger entry moves the new bid
+from the bidder into the auction's escrow account and refunds the previous
+high bidder out of it, so the escrow always holds exactly the high bid.
+Every auction's deadline goes into the shared DeadlineScheduler (one timer
+heap for the whole bot). A bid in the last EXTEND_WINDOW seconds pushes the
+deadline back so nobody can snipe.
+
+At the deadline one settlement entry either pays the escrow to the seller
+(and the character goes to the winner) or, below the reserve, refunds the
+high bidder. Bids and settlements are posted under idempotency keys
+("auction:<id>:bid:<n>", "auction:<id>:settle"), so after a crash recover()
+replays whatever the ledger has that the saved auction doesn't: missing bids
+are re-read from their entries and a written settlement is completed
+instead of being paid twice.
+"""
+import asyncio
+import itertools
+import time
+
+from rankings import RankedList
+
+EXTEND_WINDOW = 60  # A bid this close to the end...
+EXTEND_BY = 60  # ...moves the end to this long after the bid
+
+# How an auction ended
+SOLD = "sold"
+UNSOLD = "unsold"  # No bids, or the high bid was below the reserve
+CANCELLED = "cancelled"  # The seller lost the character before the end
+
+
+class AuctionError(Exception):
+    pass
+
+
+def escrow_account(auction_id):
+    return f"escrow:auction:{auction_id}"
+
+
+def bid_key(auction_id, number):
+    return f"auction:{auction_id}:bid:{number}"
+
+
+def settle_key(auction_id):
+    return f"auction:{auction_id}:settle"
+
+
+def minimum_bid(auction):
+    """The lowest bid that would be accepted now: the start price, or 5% (at least 1) over the high bid."""
+    if auction["high_bid"] is None:
+        return auction["start_price"]
+    return auction["high_bid"] + max(1, auction["high_bid"] // 20)
+
+
+class AuctionHouse:
+    def __init__(self, characters, ledger, scheduler, on_change=None, on_closed=None, on_bid=None,
+                 extend_window=EXTEND_WINDOW, extend_by=EXTEND_BY, next_id=None):
+        """
+        Args:
+            characters: The characters dict.
+            ledger: The GoldLedger that holds the escrow.
+            scheduler: The shared DeadlineScheduler.
+            on_change: Called with an auction ID whenever an auction changes (used to queue a save).
+            on_closed: Called as `on_closed(auction, result)` once an auction is settled.
+            on_bid: Called with the auction after every accepted bid.
+            extend_window, extend_by: A bid less than `extend_window` seconds
+                before the end moves it to `extend_by` seconds after the bid.
+            next_id: `next_id()` -> an auction ID that has never been used
+                (storage.IdSequence). Bid and settlement keys are built from it,
+                so it must not repeat across restarts; the default counter is for
+                tests and benchmarks only.
+        """
+        self.characters = characters
+        self.ledger = ledger
+        self.scheduler = scheduler
+        self.on_change = on_change
+        self.on_closed = on_closed
+        self.on_bid = on_bid
+        self.extend_window = extend_window
+        self.extend_by = extend_by
+        # auction ID -> {"id", "name", "seller", "reserve", "start_price", "created_at", "ends_at",
+        #                "high_bid", "high_bidder", "bids", "channel_id", "message_id"}
+        self.auctions = {}
+        self._by_name = {}
+        self._by_end = RankedList()  # (ends_at, id): ending soonest first
+        self._locks = {}
+        if next_id is None:
+            counter = itertools.count(1)
+            next_id = lambda: str(next(counter))
+        self.next_id = next_id
+
+        # Stats
+        self.bids = 0
+        self.rejected_bids = 0
+        self.sold = 0
+        self.unsold = 0
+        self.volume = 0
+
+    def __len__(self):
+        return len(self.auctions)
+
+    def _changed(self, auction_id):
+        if self.on_change is not None:
+            self.on_change(auction_id)
+
+    def _index(self, auction):
+        self.auctions[auction["id"]] = auction
+        self._by_name[auction["name"]] = auction["id"]
+        self._by_end.insert((auction["ends_at"], auction["id"]))
+
+    def _unindex(self, auction):
+        self.auctions.pop(auction["id"], None)
+        if self._by_name.get(auction["name"]) == auction["id"]:
+            del self._by_name[auction["name"]]
+        self._by_end.remove((auction["ends_at"], auction["id"]))
+
+    def load(self, auctions):
+        """Index saved auctions (call recover() once the bot is running)."""
+        for auction in auctions.values():
+            self._index(auction)
+
+    def recover(self):
+        """Replay bids and settlements that reached the ledger but not the saved auctions."""
+        for auction in list(self.auctions.values()):
+            while True:
+                entry = self.ledger.find(bid_key(auction["id"], auction["bids"] + 1))
+                if entry is None:
+                    break
+                self._record_bid(auction, entry)
+            entry = self.ledger.find(settle_key(auction["id"]))
+            if entry is not None:
+                self._finish(auction, entry)
+
+    def schedule(self, auction_id):
+        auction = self.auctions.get(auction_id)
+        if auction is not None:
+            self.scheduler.schedule(("auction", auction_id), auction["ends_at"], lambda: self.settle(auction_id))
+
+    #---------------- starting ----------------#
+
+    def auction_for(self, name):
+        auction_id = self._by_name.get(name)
+        return self.auctions.get(auction_id) if auction_id else None
+
+    def create(self, name, seller, reserve, duration, start_price=1, now=None):
+        """Put `name` up for `duration` seconds. Bids below `reserve` don't sell it."""
+        character = self.characters.get(name)
+        if character is None:
+            raise AuctionError(f"Character '{name}' not found.")
+        if character.owner != seller:
+            raise AuctionError(f"You do not own the character '{name}'.")
+        if name in self._by_name:
+            raise AuctionError(f"'{name}' is already being auctioned.")
+        if reserve < 0 or start_price < 1:
+            raise AuctionError("The reserve can't be negative and bids start at 1 gold or more.")
+
+        now = time.time() if now is None else now
+        auction = {
+            "id": self.next_id(),
+            "name": name,
+            "seller": seller,
+            "reserve": reserve,
+            "start_price": start_price,
+            "created_at": now,
+            "ends_at": now + duration,
+            "high_bid": None,
+            "high_bidder": None,
+            "bids": 0,
+            "channel_id": None,
+            "message_id": None,
+        }
+        self._index(auction)
+        self.schedule(auction["id"])
+        self._changed(auction["id"])
+        return auction
+
+    def attach_message(self, auction_id, channel_id, message_id):
+        auction = self.auctions.get(auction_id)
+        if auction is not None:
+            auction["channel_id"] = channel_id
+            auction["message_id"] = message_id
+            self._changed(auction_id)
+
+    #---------------- bidding ----------------#
+
+    def _lock(self, auction_id):
+        lock = self._locks.get(auction_id)
+        if lock is None:
+            lock = self._locks[auction_id] = asyncio.Lock()
+        return lock
+
+    def _record_bid(self, auction, entry):
+        """Apply a posted bid entry to the auction record."""
+        escrow = escrow_account(auction["id"])
+        raised = next(delta for account, delta in entry.legs if account == escrow)
+        bidder = next(account for account, delta in entry.legs if account != escrow and delta < 0)
+        auction["high_bid"] = (auction["high_bid"] or 0) + raised
+        auction["high_bidder"] = int(bidder)
+        auction["bids"] += 1
+        self._changed(auction["id"])
+
+    async def bid(self, auction_id, bidder, amount, now=None):
+        """
+        Place a bid. Returns the auction.
+
+        Raises AuctionError for a closed auction, a bid on your own auction or
+        a bid below minimum_bid(), and InsufficientFunds if the bidder can't
+        cover it (a raise only needs the difference).
+        """
+        if auction_id not in self.auctions:
+            self.rejected_bids += 1
+            raise AuctionError("This auction has ended.")
+        async with self._lock(auction_id):
+            auction = self.auctions.get(auction_id)
+            now = time.time() if now is None else now
+            if auction is None or now >= auction["ends_at"]:
+                self.rejected_bids += 1
+                raise AuctionError("This auction has ended.")
+            if auction["seller"] == bidder:
+                self.rejected_bids += 1
+                raise AuctionError("You can't bid on your own auction.")
+            if amount < minimum_bid(auction):
+                self.rejected_bids += 1
+                raise AuctionError(f"The minimum bid is {minimum_bid(auction):,} gold.")
+
+            escrow = escrow_account(auction_id)
+            previous = auction["high_bidder"]
+            legs = [(bidder, -amount), (escrow, amount)]
+            if previous is not None:
+                # Refund the previous high bid in the same entry (nets out if they're raising)
+                legs += [(escrow, -auction["high_bid"]), (previous, auction["high_bid"])]
+            async with self.ledger.locked(bidder, escrow, *([previous] if previous is not None else [])):
+                try:
+                    entry = self.ledger.post(legs, kind="auction_bid", key=bid_key(auction_id, auction["bids"] + 1),
+                                             memo=auction["name"])
+                except Exception:
+                    self.rejected_bids += 1
+                    raise
+                self._record_bid(auction, entry)
+
+            self.bids += 1
+            if auction["ends_at"] - now < self.extend_window:
+                self._by_end.remove((auction["ends_at"], auction_id))
+                auction["ends_at"] = now + self.extend_by
+                self._by_end.insert((auction["ends_at"], auction_id))
+                self.schedule(auction_id)
+                self._changed(auction_id)
+        if self.on_bid is not None:
+            self.on_bid(auction)
+        return auction
+
+    #---------------- settling ----------------#
+
+    async def settle(self, auction_id, cancelled=False, now=None):
+        """
+        Close an auction (the scheduler calls this at the deadline): pay the
+        seller and hand over the character, or refund the high bidder.
+        Returns the closed auction, or None if it is gone or was extended.
+        """
+        async with self._lock(auction_id):
+            auction = self.auctions.get(auction_id)
+            if auction is None:
+                return None
+            now = time.time() if now is None else now
+            if not cancelled and now < auction["ends_at"]:
+                # A last-minute bid moved the deadline while this timer was waiting for the lock
+                return None
+
+            escrow = escrow_account(auction_id)
+            bidder = auction["high_bidder"]
+            async with self.ledger.locked(escrow, auction["seller"], *([bidder] if bidder is not None else [])):
+                character = self.characters.get(auction["name"])
+                if character is None or character.owner != auction["seller"]:
+                    cancelled = True
+                entry = None
+                if bidder is not None:
+                    sold = not cancelled and auction["high_bid"] >= auction["reserve"]
+                    payee = auction["seller"] if sold else bidder
+                    entry = self.ledger.post(
+                        ((escrow, -auction["high_bid"]), (payee, auction["high_bid"])),
+                        kind="auction_settle", key=settle_key(auction_id), memo=auction["name"]
+                    )
+                return self._finish(auction, entry, cancelled)
+
+    def _finish(self, auction, entry, cancelled=False):
+        """Apply a settlement (None when there were no bids) and close the auction."""
+        result = UNSOLD
+        if cancelled:
+            result = CANCELLED
+        elif entry is not None:
+            payee = next(account for account, delta in entry.legs if delta > 0)
+            if payee == str(auction["seller"]):
+                result = SOLD
+                character = self.characters.get(auction["name"])
+                if character is not None:
+                    character.owner = auction["high_bidder"]
+                self.volume += auction["high_bid"]
+        if result == SOLD:
+            self.sold += 1
+        else:
+            self.unsold += 1
+
+        auction["result"] = result
+        self._unindex(auction)
+        self._locks.pop(auction["id"], None)
+        self.scheduler.cancel(("auction", auction["id"]))
+        self._changed(auction["id"])
+        if self.on_closed is not None:
+            self.on_closed(auction, result)
+        return auction
+
+    def revalidate(self, name):
+        """Cancel (and refund) the auction for `name` if the seller no longer owns it."""
+        auction = self.auction_for(name)
+        if auction is None:
+            return
+        character = self.characters.get(name)
+        if character is None or character.owner != auction["seller"]:
+            asyncio.get_running_loop().create_task(self.settle(auction["id"], cancelled=True))
+
+    #---------------- browsing ----------------#
+
+    def page(self, offset, count):
+        """Auctions ending soonest first."""
+        return [self.auctions[auction_id] for _, auction_id in self._by_end.slice(offset, count)]
+
+    def stats(self):
+        return {
+            "active": len(self.auctions),
+            "bids": self.bids,
+            "rejected_bids": self.rejected_bids,
+            "sold": self.sold,
+            "unsold": self.unsold,
+            "volume": self.volume,
+        }
@@ -0,0 +1,180 @@
+"""
+Auction benchmark: hundreds of concurrent bidders against escrowed auctions.
+
+Starts --auctions auctions that end after --seconds, with random reserves,
+and lets --bidders concurrent bidders outbid each other until every auction
+has been settled by the shared deadline scheduler. Each bidder values each
+lot at a random price and stops bidding on it past that. Bids in the last
+--extend seconds extend the auction, as in the bot. Reports accepted bids
+per second, bid latency (including waiting for the auction's lock) and how
+late the timer heap settled auctions after their deadline.
+
+Afterwards it checks that the escrow always held exactly the high bid, that no
+gold was created or lost, that escrow ends empty, that winners own what they
+won and paid for it, and that replaying the ledger over auctions saved
+halfway through (a crash) reaches the same result without posting anything
+twice. Exits 1 if a check fails.
+
+Usage:
+    python benchmarks/bench_auction.py [--bidders 500] [--auctions 20] [--seconds 3]
+"""
+import argparse
+import asyncio
+import copy
+import os
+import random
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from auctions import AuctionHouse, AuctionError, SOLD, escrow_account, minimum_bid
+from ledger import GoldLedger, InsufficientFunds
+from scheduler import DeadlineScheduler
+
+STARTING_BALANCE = 20000
+
+
+def check(label, condition, failures):
+    print(f"  {'ok ' if condition else 'FAIL'} {label}")
+    if not condition:
+        failures.append(label)
+
+
+def percentile(samples, share):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * share))]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bidders", type=int, default=500)
+    parser.add_argument("--auctions", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=3.0, help="Auction duration")
+    parser.add_argument("--extend", type=float, default=0.2, help="Anti-sniping window and extension")
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    sellers = list(range(1, args.auctions + 1))
+    bidders = list(range(1000, 1000 + args.bidders))
+    opening = {str(user_id): STARTING_BALANCE for user_id in sellers + bidders}
+    total = sum(opening.values())
+    characters = {f"lot{i}": SimpleNamespace(owner=seller) for i, seller in enumerate(sellers)}
+
+    failures = []
+    escrow_mismatches = 0
+    settle_delays = []
+    results = {}
+    saved = None  # (auctions, owners) as they'd be on disk halfway through
+
+    ledger = GoldLedger(balances=dict(opening))
+    scheduler = DeadlineScheduler()
+
+    def on_bid(auction):
+        nonlocal escrow_mismatches, saved
+        if ledger.balance(escrow_account(auction["id"])) != auction["high_bid"]:
+            escrow_mismatches += 1
+        if saved is None and house.bids >= target_bids:
+            saved = (copy.deepcopy(house.auctions), {name: c.owner for name, c in characters.items()})
+
+    def on_closed(auction, result):
+        settle_delays.append(time.time() - auction["ends_at"])
+        results[auction["id"]] = (result, auction["high_bidder"], auction["high_bid"])
+
+    house = AuctionHouse(characters, ledger, scheduler, on_closed=on_closed, on_bid=on_bid,
+                         extend_window=args.extend, extend_by=args.extend)
+    target_bids = args.bidders  # Save a copy once roughly every bidder has bid once
+    for name, character in characters.items():
+        house.create(name, character.owner, reserve=rng.choice((0, 2000, 50000)), duration=args.seconds)
+    auctions = {auction["id"]: dict(auction) for auction in house.auctions.values()}
+
+    latencies = []
+    rejected = 0
+
+    async def bidder(user_id):
+        nonlocal rejected
+        bid_rng = random.Random(user_id)
+        values = {auction_id: bid_rng.randint(100, STARTING_BALANCE // 2) for auction_id in auctions}
+        while True:
+            wanted = [a for a in house.auctions if house.auctions[a]["high_bidder"] != user_id
+                      and minimum_bid(house.auctions[a]) <= values[a]]
+            if not wanted:
+                if not any(minimum_bid(house.auctions[a]) <= values[a] for a in house.auctions):
+                    return  # Priced out of everything that's left
+                await asyncio.sleep(0.01)  # Leading everywhere it still wants to be
+                continue
+            auction_id = bid_rng.choice(wanted)
+            amount = min(values[auction_id], minimum_bid(house.auctions[auction_id]) + bid_rng.randint(0, 20))
+            start = time.perf_counter()
+            try:
+                await house.bid(auction_id, user_id, amount)
+                latencies.append(time.perf_counter() - start)
+            except (AuctionError, InsufficientFunds):
+                rejected += 1
+            await asyncio.sleep(bid_rng.random() * 0.02)
+
+    scheduler.start()
+    start = time.perf_counter()
+    await asyncio.gather(*(bidder(user_id) for user_id in bidders))
+    elapsed = time.perf_counter() - start
+    while house.auctions:  # Everyone is priced out: wait for the deadlines
+        await asyncio.sleep(0.05)
+    scheduler.stop()
+
+    sold = sum(1 for result, _, _ in results.values() if result == SOLD)
+    print(f"{args.bidders} bidders, {args.auctions} auctions ({sold} sold, {len(results) - sold} unsold)")
+    print(f"  accepted bids:    {house.bids:8d} ({house.bids / elapsed:,.0f}/s over {elapsed:.2f} s of bidding)")
+    print(f"  rejected bids:    {rejected:8d} (short of gold with escrow held elsewhere)")
+    print(f"  bid latency:      p50 {statistics.median(latencies) * 1e6:7.0f} µs, "
+          f"p99 {percentile(latencies, 0.99) * 1e6:7.0f} µs, max {max(latencies) * 1e6:7.0f} µs")
+    print(f"  settled late by:  p50 {statistics.median(settle_delays) * 1e3:7.1f} ms, "
+          f"max {max(settle_delays) * 1e3:7.1f} ms")
+
+    print("checks:")
+    check("every auction settled", len(results) == args.auctions and not house.auctions, failures)
+    check("escrow held the high bid after every bid", escrow_mismatches == 0, failures)
+    check("no gold created or lost", sum(ledger.balances.values()) == total, failures)
+    check("escrow accounts empty", all(ledger.balance(escrow_account(a)) == 0 for a in auctions), failures)
+    check("no negative balances", min(ledger.balances.values()) >= 0, failures)
+
+    paid = {str(user_id): 0 for user_id in bidders}
+    ok = True
+    for auction_id, (result, winner, price) in results.items():
+        auction = auctions[auction_id]
+        if result == SOLD:
+            paid[str(winner)] += price
+            ok &= characters[auction["name"]].owner == winner and price >= auction["reserve"]
+            ok &= ledger.balance(auction["seller"]) == STARTING_BALANCE + price
+        else:
+            ok &= characters[auction["name"]].owner == auction["seller"]
+            ok &= ledger.balance(auction["seller"]) == STARTING_BALANCE
+    check("winners own their lots and sellers were paid", ok, failures)
+    check("bidders paid for what they won and nothing else",
+          all(ledger.balance(user_id) == STARTING_BALANCE - spent for user_id, spent in paid.items()), failures)
+
+    # Crash: the auctions and owners on disk are from halfway through; the ledger is current
+    saved_auctions, saved_owners = saved
+    for name, owner in saved_owners.items():
+        characters[name].owner = owner
+    posted = ledger.posted
+    replayed = {}
+    recovered = AuctionHouse(characters, ledger, DeadlineScheduler(),
+                             on_closed=lambda auction, result: replayed.update(
+                                 {auction["id"]: (result, auction["high_bidder"], auction["high_bid"])}))
+    recovered.load(saved_auctions)
+    start = time.perf_counter()
+    recovered.recover()
+    print(f"  (replayed {len(saved_auctions)} half-saved auctions in {(time.perf_counter() - start) * 1e3:.1f} ms)")
+    check("replay after a crash reaches the same results", all(replayed.get(a) == results[a] for a in saved_auctions),
+          failures)
+    check("replay posted nothing twice", ledger.posted == posted and not recovered.auctions, failures)
+    check("replay restored owners", all(characters[auctions[a]["name"]].owner == (r[1] if r[0] == SOLD else auctions[a]["seller"])
+                                        for a, r in results.items()), failures)
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
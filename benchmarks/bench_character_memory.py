@@ -0,0 +1,100 @@
+"""
+Memory and access-time benchmark: plain dicts vs Character records.
+
+Loads the shipped characters.json both ways and reports the memory each
+representation keeps alive (measured with tracemalloc, strings included),
+then times the status and owner checks the bot does most often.
+
+Usage:
+    python benchmarks/bench_character_memory.py [--copies 1] [--repeat 200]
+
+--copies loads the file several times under different names to simulate a
+bigger roster.
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from models import Character, Status
+
+CHARACTERS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "characters.json")
+
+
+def load_dicts(text, copies):
+    characters = {}
+    for copy in range(copies):
+        for name, data in json.loads(text).items():
+            characters[f"{name} #{copy}" if copy else name] = data
+    return characters
+
+
+def load_records(text, copies):
+    return {name: Character.from_dict(data) for name, data in load_dicts(text, copies).items()}
+
+
+def retained(build, *args):
+    """Bytes still allocated after build(*args) returns (the result is kept alive)."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build(*args)
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--copies", type=int, default=1, help="Load the roster this many times")
+    parser.add_argument("--repeat", type=int, default=200, help="Runs per timing")
+    args = parser.parse_args()
+
+    with open(CHARACTERS_FILE, "r", encoding="utf-8") as f:
+        text = f.read()
+
+    dicts, dict_bytes = retained(load_dicts, text, args.copies)
+    records, record_bytes = retained(load_records, text, args.copies)
+    count = len(dicts)
+
+    assert all(records[name].to_dict() == data for name, data in dicts.items()), "round trip changed data"
+
+    print(f"{count} characters")
+    print(f"  dicts:   {dict_bytes / 1024:8.1f} KiB ({dict_bytes / count:6.0f} B/character)")
+    print(f"  records: {record_bytes / 1024:8.1f} KiB ({record_bytes / count:6.0f} B/character)")
+    print(f"  saved:   {(dict_bytes - record_bytes) / 1024:8.1f} KiB ({1 - record_bytes / dict_bytes:.1%})")
+
+    dict_values = list(dicts.values())
+    record_values = list(records.values())
+    owner = next(c["owner"] for c in dict_values if c.get("owner"))
+    deceased = Status.DECEASED  # Enum class attribute lookups are slow; the bot uses module constants too
+
+    checks = (
+        ("status check", lambda: sum(1 for c in dict_values if c.get("status", "Alive") == "Deceased 💀"),
+                         lambda: sum(1 for c in record_values if c.status is deceased)),
+        ("owner check", lambda: sum(1 for c in dict_values if c.get("owner") == owner),
+                        lambda: sum(1 for c in record_values if c.owner == owner)),
+    )
+    for label, dict_check, record_check in checks:
+        assert dict_check() == record_check()
+        dict_time = timed(dict_check, args.repeat)
+        record_time = timed(record_check, args.repeat)
+        print(f"  {label + ':':14} dicts {dict_time * 1e6:8.1f} µs, records {record_time * 1e6:8.1f} µs "
+              f"per pass ({dict_time / record_time:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Leaderboard benchmark: incremental skip-list board vs sorting on every query.
+
+Builds a board for --users simulated users, then applies --updates random
+balance changes, timing each operation, and compares "top 10", "a page deep
+in the list" and "my rank" against sorting the balances on every call (what
+a leaderboard over gold_data would otherwise do). Checks the final board
+against a full sort and exits 1 on a mismatch.
+
+Usage:
+    python benchmarks/bench_leaderboard.py [--users 100000] [--updates 100000] [--queries 2000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from rankings import Leaderboard
+
+
+def sorted_board(balances):
+    return sorted(((-score, member) for member, score in balances.items() if score > 0))
+
+
+def per_call(func, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--updates", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--naive-queries", type=int, default=20, help="Full sorts are slow; time fewer of them")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    members = [str(10**17 + i) for i in range(args.users)]
+    balances = {member: int(rng.paretovariate(1.2) * 100) for member in members}
+
+    board = Leaderboard(seed=1)
+    start = time.perf_counter()
+    for member, balance in balances.items():
+        board.update(member, balance)
+    build = time.perf_counter() - start
+    print(f"{args.users} users, {len(board)} ranked")
+    print(f"  build:              {build * 1000:10.1f} ms")
+
+    start = time.perf_counter()
+    for _ in range(args.updates):
+        member = members[rng.randrange(args.users)]
+        balances[member] = max(0, balances[member] + rng.randint(-200, 200))
+        board.update(member, balances[member])
+    update = (time.perf_counter() - start) / args.updates
+    print(f"  balance update:     {update * 1e6:10.2f} µs")
+
+    someone = members[rng.randrange(args.users)]
+    while not balances[someone]:
+        someone = members[rng.randrange(args.users)]
+    middle = len(board) // 2
+    queries = (
+        ("top 10", lambda: board.page(0, 10), lambda: sorted_board(balances)[:10]),
+        ("page in the middle", lambda: board.page(middle, 10), lambda: sorted_board(balances)[middle:middle + 10]),
+        ("my rank", lambda: board.rank(someone), lambda: sorted_board(balances).index((-balances[someone], someone))),
+    )
+    for label, incremental, naive in queries:
+        fast = per_call(incremental, args.queries)
+        slow = per_call(naive, args.naive_queries)
+        print(f"  {label + ':':20}{fast * 1e6:10.2f} µs (sorting each time: {slow * 1e3:8.2f} ms, {slow / fast:,.0f}x)")
+
+    expected = sorted_board(balances)
+    actual = [(-score, member) for _, member, score in board.page(0, len(board))]
+    ok = actual == expected and board.rank(someone) == expected.index((-balances[someone], someone)) + 1
+    print(f"  matches a full sort: {'yes' if ok else 'NO'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
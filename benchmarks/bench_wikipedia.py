@@ -0,0 +1,149 @@
+"""
+Benchmark the Wikipedia lead-paragraph extractor against the old stripper.
+
+Runs against the saved article pages in fixtures/wikipedia/. Each page is
+padded with generated article sections (--body-kb) so it is about the size
+of a real article. For every page the script checks the extracted text
+against expected.json, checks that feeding it in small chunks gives the
+same result, and reports:
+
+  - time:     extraction time per page, old stripper vs new parser, and the
+              new parser's throughput over the bytes it actually parsed
+  - streamed: bytes the streaming fetch reads before it stops (the old code
+              downloaded the whole page before looking at it)
+
+Usage:
+    python benchmarks/bench_wikipedia.py [--body-kb 256] [--repeat 50]
+"""
+import argparse
+import codecs
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from wikipedia import LeadParagraphParser, extract_lead_paragraph
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "wikipedia")
+CHUNK_SIZE = 16384
+
+
+def legacy_extract(data):
+    """The stripper bot.py used before: first '<p>', char-by-char, two entities."""
+    data = data[data.find('<p>'):]
+    data = data[:data.find('</p>')]
+    data = data.replace('&#91;', '[').replace('&#93;', ']')
+    text = ''
+    waiting_on = None
+    for c in data:
+        if not waiting_on:
+            if c == '<':
+                waiting_on = '>'
+            elif c == '&':
+                waiting_on = ';'
+            elif c == '(':
+                text = text.strip()
+                waiting_on = ')'
+            elif c == '[':
+                waiting_on = ']'
+            else:
+                text += c
+        elif c == waiting_on:
+            waiting_on = None
+    return ' '.join(text.split())
+
+
+def article_body(size_kb):
+    """Generated sections that look like the rest of an article."""
+    section = (
+        '<h3 id="Section_{n}">Section {n}</h3>\n'
+        '<p>Paragraph {n} of the article body, with a <a href="/wiki/Link_{n}">link</a>, '
+        'some <i>emphasis</i> (and an aside)<sup class="reference"><a href="#cite_note-{n}">&#91;{n}&#93;</a></sup> '
+        'and enough ordinary prose to be a typical paragraph in a long encyclopedia article &amp; its sections.</p>\n'
+        '<ul><li>Item one of section {n}</li><li>Item two of section {n}</li></ul>\n'
+    )
+    parts = []
+    size = 0
+    n = 0
+    while size < size_kb * 1024:
+        n += 1
+        part = section.format(n=n)
+        parts.append(part)
+        size += len(part)
+    return "".join(parts)
+
+
+def streamed(html):
+    """Feed the page in CHUNK_SIZE pieces like fetch_lead_paragraph does; return (text, bytes read)."""
+    data = html.encode("utf-8")
+    parser = LeadParagraphParser()
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    read = 0
+    for start in range(0, len(data), CHUNK_SIZE):
+        chunk = data[start:start + CHUNK_SIZE]
+        parser.feed(decoder.decode(chunk))
+        read += len(chunk)
+        if parser.done:
+            break
+    else:
+        parser.close()
+    return parser.text, read
+
+
+def chunked(html, size):
+    parser = LeadParagraphParser()
+    for start in range(0, len(html), size):
+        parser.feed(html[start:start + size])
+        if parser.done:
+            break
+    parser.close()
+    return parser.text
+
+
+def timed(func, arg, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func(arg)
+    return result, (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--body-kb", type=int, default=256, help="Generated article body per page, in KiB")
+    parser.add_argument("--repeat", type=int, default=50, help="Runs per measurement")
+    args = parser.parse_args()
+
+    with open(os.path.join(FIXTURES, "expected.json"), encoding="utf-8") as f:
+        expected = json.load(f)
+    body = article_body(args.body_kb)
+
+    failures = 0
+    for name, want in expected.items():
+        with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+            html = f.read().replace("<!-- BODY -->", body)
+        size = len(html.encode("utf-8"))
+
+        new_text, new_time = timed(extract_lead_paragraph, html, args.repeat)
+        old_text, old_time = timed(legacy_extract, html, args.repeat)
+        (stream_text, read), stream_time = timed(streamed, html, args.repeat)
+
+        ok = new_text == want and stream_text == want and all(chunked(html, n) == want for n in (1, 7, 64))
+        failures += not ok
+
+        print(f"{name} ({size / 1024:.0f} KiB)")
+        print(f"  correct:  new {'yes' if ok else 'NO'}, old {'yes' if old_text == want else 'no'}")
+        print(f"  time:     new {new_time * 1000:.2f} ms ({read / new_time / 2**20:.1f} MiB/s parsed), "
+              f"old {old_time * 1000:.2f} ms")
+        print(f"  streamed: {read / 1024:.0f} KiB read ({read / size:.1%} of page), {stream_time * 1000:.2f} ms")
+        if old_text != want:
+            print(f"  old gave: {old_text[:100]!r}")
+        if not ok:
+            print(f"  new gave: {new_text!r}")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Local stand-in for the image hosts, for running image_health.py offline.
+
+Serves /<host>/<path> (the layout image_health.py --base-url produces). The
+answer for a path is picked from a hash of it, so repeated runs agree:
+
+  - most paths are a JPEG (HEAD gives type and length, ranged GET gives 206)
+  - some are 404, some are an HTML page, some are 503
+  - some hosts reject HEAD with 405, so the checker has to fall back to GET
+
+It also tracks the most requests that were ever in flight to one host, so
+the checker's per-host limit can be verified (GET /_stats).
+
+Usage:
+    python benchmarks/mock_image_server.py [--port 8080] [--latency 0.05]
+    python image_health.py characters.json --base-url http://127.0.0.1:8080 --report --force
+"""
+import argparse
+import asyncio
+import hashlib
+
+from aiohttp import web
+
+IMAGE_SIZE = 48213
+
+
+def outcome(path):
+    bucket = hashlib.blake2b(path.encode(), digest_size=2).digest()[0] % 20
+    if bucket == 0:
+        return "missing"
+    if bucket == 1:
+        return "html"
+    if bucket == 2:
+        return "unavailable"
+    return "image"
+
+
+def make_app(latency):
+    in_flight = {}
+    peak = {}
+
+    async def handle(request):
+        host = request.match_info["host"]
+        in_flight[host] = in_flight.get(host, 0) + 1
+        peak[host] = max(peak.get(host, 0), in_flight[host])
+        try:
+            await asyncio.sleep(latency)
+            result = outcome(request.path)
+            if request.method == "HEAD" and hashlib.blake2b(host.encode(), digest_size=1).digest()[0] % 4 == 0:
+                return web.Response(status=405)
+            if result == "missing":
+                return web.Response(status=404, text="Not Found")
+            if result == "unavailable":
+                return web.Response(status=503, text="Service Unavailable")
+            if result == "html":
+                return web.Response(text="<html><body>This image was removed</body></html>", content_type="text/html")
+
+            headers = {"Content-Type": "image/jpeg", "Accept-Ranges": "bytes"}
+            if request.method == "HEAD":
+                headers["Content-Length"] = str(IMAGE_SIZE)
+                return web.Response(headers=headers)
+            if request.headers.get("Range") == "bytes=0-0":
+                headers["Content-Range"] = f"bytes 0-0/{IMAGE_SIZE}"
+                return web.Response(status=206, body=b"\xff", headers=headers)
+            return web.Response(body=b"\xff" * IMAGE_SIZE, headers=headers)
+        finally:
+            in_flight[host] -= 1
+
+    async def stats(request):
+        return web.json_response({"peak_in_flight_per_host": peak})
+
+    app = web.Application()
+    app.router.add_get("/_stats", stats)
+    app.router.add_route("*", "/{host}/{path:.*}", handle)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock image host for image_health.py.")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds before each response")
+    args = parser.parse_args()
+    web.run_app(make_app(args.latency), host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
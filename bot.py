@@ -1,87 +1,206 @@
+from startup import startup  # First import: starts the startup clock
 import discord
 from discord.ext import commands
 import asyncio
 from dotenv import load_dotenv
 import os
 import json
-import requests
 import random
+import math
+import time
 from datetime import datetime, timedelta, timezone
-import shutil
 from discord import app_commands
-import aiohttp
-
+from storage import Store, IdSequence, encode, loads
+from persistence import PersistenceScheduler, atomic_write_json
+from indexes import CharacterIndex, ImageIndex, NameIndex, ALIVE, DECEASED, normalize_images
+from models import Character
+from events import EventBus, CoalescingTask
+from publishers import CharacterListRenderer, ChunkedPublisher, GraveyardRenderer
+from scheduler import DeadlineScheduler
+from router import MessageRouter
+from carousel import CarouselView
+from claims import ClaimService
+from http_client import HttpClient
+from image_search import ImageSearch, ImageSearchError, SERPER_IMAGES_URL
+from cache import TTLCache, MISSING
+from wikipedia import fetch_lead_paragraph, is_disambiguation
+from image_health import ImageHealthChecker, character_image_urls, prune_images, DEAD, ERROR
+from image_mirror import ImageMirror, MirrorError
+from ledger import GoldLedger, InsufficientFunds
+from rankings import Leaderboard
+from market import Marketplace, MarketError, SOLD, EXPIRED, CANCELLED, INVALID
+from auctions import AuctionHouse, AuctionError, minimum_bid, SOLD as AUCTION_SOLD, CANCELLED as AUCTION_CANCELLED
+from trades import TradeDesk, TradeError, ACCEPTED, DECLINED, CANCELLED as TRADE_CANCELLED, EXPIRED as TRADE_EXPIRED, INVALID as TRADE_INVALID
+from paging import PagedView
+from metrics import MetricsRegistry, LoopLagMonitor, start_metrics_server
 
 
 # Load environment variables from the .env file
 load_dotenv()
+startup.lap("imports")
 
 # Bot Token and Admin ID
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
 ADMIN_IDS = set(map(int, os.getenv("ADMIN_IDS", "").split(",")))
 
+# One pooled HTTP client for every outbound call, opened in setup_hook
+http_client = HttpClient(headers={'User-Agent': 'Mozilla/5.0 (Windows NT 6.1; rv:52.0) Gecko/20100101 Firefox/52.0'})
+
+# Wikipedia summaries and image search results are cached by normalized query.
+# "May refer to" pages, 404s and searches without images are cached as misses
+# for a shorter time. Both caches are saved to LOOKUP_CACHE_FILE (set it empty
+# to keep them in memory only).
+wikipedia_cache = TTLCache(maxsize=1024, ttl=7 * 86400, negative_ttl=86400, on_change=lambda: save_lookup_caches())
+image_search_cache = TTLCache(maxsize=512, ttl=86400, negative_ttl=6 * 3600, on_change=lambda: save_lookup_caches())
+lookup_caches = {"wikipedia": wikipedia_cache, "images": image_search_cache}
+
+# Serper image search on the shared client (SERPER_URL can point it at a stub server)
+image_search = ImageSearch(
+    http_client,
+    api_key=os.getenv("SERPAPI_API_KEY"),
+    url=os.getenv("SERPER_URL", SERPER_IMAGES_URL),
+    concurrency=int(os.getenv("IMAGE_SEARCH_CONCURRENCY", "3")),
+    cache=image_search_cache
+)
+
 # Set up bot with intents
 intents = discord.Intents.default()
 intents.message_content = True
-intents.reactions = True  # Ensure bot has permission to handle reactions
 bot = commands.Bot(command_prefix="!", intents=intents)
 
+# Command, task and loop metrics for /botstats. Set METRICS_PORT to also serve
+# them in the Prometheus text format on http://METRICS_HOST:METRICS_PORT/metrics.
+metrics = MetricsRegistry()
+loop_lag = LoopLagMonitor(metrics)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 0 = no endpoint
+metrics_server = None
+
+def record_task_run(task, seconds, ok):
+    """Record one run of a background job (timers, debounced channel updates)."""
+    metrics.observe("task_seconds", seconds, task=task)
+    if not ok:
+        metrics.inc("task_failures_total", task=task)
+
+# Command latency runs from when the tree picks up the interaction to when
+# the command returns; failed commands are counted by the tree's error hook.
+async def stamp_interaction(interaction: discord.Interaction):
+    interaction.extras["started"] = time.perf_counter()
+    return True
+
+bot.tree.interaction_check = stamp_interaction
+
+def record_command(interaction, command, outcome):
+    name = command.qualified_name if command else "unknown"
+    metrics.inc("commands_total", command=name, outcome=outcome)
+    started = interaction.extras.get("started")
+    if started is not None:
+        metrics.observe("command_seconds", time.perf_counter() - started, command=name)
+
+@bot.event
+async def on_app_command_completion(interaction: discord.Interaction, command):
+    record_command(interaction, command, "ok")
+
+tree_on_error = bot.tree.on_error
+
+async def on_tree_error(interaction: discord.Interaction, error):
+    record_command(interaction, interaction.command, "error")
+    await tree_on_error(interaction, error)
+
+bot.tree.on_error = on_tree_error
+
 #---------------------- IMPORTANT FOLDER PATHS----------------------#
 CHARACTERS_FILE = "characters.json"
 IMAGE_FOLDER = "images/"
 COMMAND_LOCKS_FILE = "command_locks.json"
 GOLD_FILE = "gold.json"
 CHANNEL_SETTINGS_FILE = "channel_settings.json"
+DATABASE_FILE = "botty.db"
+LOOKUP_CACHE_FILE = os.getenv("LOOKUP_CACHE_FILE", "lookup_cache.json")
+IMAGE_HEALTH_FILE = "image_health.json"
 
 #---------------------------------INITIALIZING ALL THE PATHS AND STUFF----------------------#
-if os.path.exists(CHANNEL_SETTINGS_FILE):
-    try:
-        with open(CHANNEL_SETTINGS_FILE, "r") as f:
-            raw_settings = json.load(f)
-    except (json.JSONDecodeError, ValueError):
-        print(f"Corrupted or empty {CHANNEL_SETTINGS_FILE}. Reinitializing...")
-        raw_settings = {}
-else:
-    raw_settings = {}
-
-# Deserialize datetime strings back to datetime objects
+# All characters, gold and channel settings live in SQLite now. The old JSON
+# files are imported once on first start and then kept as a backup.
+store = Store(DATABASE_FILE)
+store.migrate_from_json(CHARACTERS_FILE, GOLD_FILE, CHANNEL_SETTINGS_FILE)
+startup.lap("database")
+
+# Mutations only mark records dirty; the scheduler batches them into one
+# background write per window (PERSIST_FLUSH_WINDOW seconds, default 2).
+persistence = PersistenceScheduler(
+    window=float(os.getenv("PERSIST_FLUSH_WINDOW", "2.0")),
+    on_flush=lambda seconds, ok: record_task_run("persistence", seconds, ok)
+)
+
+raw_settings = store.load_channel_settings()
+
+upgraded_guilds = []
 for guild_id, settings in raw_settings.items():
-    hunting_ground = settings.get("hunting_ground")
-    if hunting_ground and "last_spawn" in hunting_ground:
-        hunting_ground["last_spawn"] = datetime.fromisoformat(hunting_ground["last_spawn"])
+    # Older settings hold a single "hunting_ground"; guilds can now have several,
+    # keyed by channel ID under "hunting_grounds"
+    hunting_ground = settings.pop("hunting_ground", None)
+    if hunting_ground:
+        settings.setdefault("hunting_grounds", {})[str(hunting_ground.pop("channel_id"))] = hunting_ground
+        upgraded_guilds.append(guild_id)
+
+    # Deserialize datetime strings back to datetime objects
+    for hunting_ground in settings.get("hunting_grounds", {}).values():
+        if "last_spawn" in hunting_ground:
+            hunting_ground["last_spawn"] = datetime.fromisoformat(hunting_ground["last_spawn"])
 
 channel_settings = raw_settings
 
-shutil.copy(CHANNEL_SETTINGS_FILE, CHANNEL_SETTINGS_FILE + ".backup")
-
-def save_channel_settings():
-    """Save the channel settings to the file, creating it if necessary."""
-    def serialize(obj):
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        return obj
-
-    with open(CHANNEL_SETTINGS_FILE, "w") as f:
-        json.dump(channel_settings, f, indent=4, default=serialize)
-
-
-
-# Load gold data or initialize if file does not exist
-if os.path.exists(GOLD_FILE):
-    with open(GOLD_FILE, "r") as f:
-        gold_data = json.load(f)
-else:
-    gold_data = {}
-
-def save_gold_data():
-    """Save the current gold data to the JSON file."""
-    with open(GOLD_FILE, "w") as f:
-        json.dump(gold_data, f, indent=4)
+def save_channel_settings(guild_id):
+    """Queue one guild's channel settings for saving."""
+    persistence.mark_dirty("channel_settings", guild_id)
+
+persistence.register(
+    "channel_settings",
+    snapshot=lambda keys: {k: encode(channel_settings[k]) if k in channel_settings else None for k in keys},
+    write=store.write_channel_settings
+)
+
+for guild_id in upgraded_guilds:
+    save_channel_settings(guild_id)
+
+
+
+# Leaderboards, kept in rank order as balances and rosters change: the ledger
+# updates gold_board on every posted entry and the character index updates
+# roster_board whenever a character is claimed, released, given or sold
+gold_board = Leaderboard()
+roster_board = Leaderboard()
+
+def on_gold_balance(user_id, balance):
+    """Ledger callback: keep player balances on the gold board (escrow accounts like "escrow:auction:3" stay off it)."""
+    if user_id.isdigit():
+        gold_board.update(user_id, balance)
+
+# Every gold change is an entry in the append-only ledger; startup loads the
+# last balance snapshot and replays the entries after it. gold_data is the
+# ledger's live balances dict (read it, but post to the ledger to change it).
+ledger = GoldLedger.load(
+    store,
+    on_append=lambda seq: persistence.mark_dirty("ledger", seq),
+    on_balance=on_gold_balance,
+    snapshot_every=int(os.getenv("LEDGER_SNAPSHOT_EVERY", "500"))
+)
+gold_data = ledger.balances
+for user_id, balance in gold_data.items():
+    on_gold_balance(user_id, balance)
+
+persistence.register(
+    "ledger",
+    snapshot=ledger.persist_batch,
+    write=lambda batch: store.append_ledger(*batch),
+    requeue=lambda batch: ledger.requeue(*batch)
+)
 
 # Load or initialize command locks
 if os.path.exists(COMMAND_LOCKS_FILE):
     with open(COMMAND_LOCKS_FILE, "r") as f:
-        command_locks = json.load(f)
+        command_locks = loads(f.read())
 else:
     command_locks = {}
 
@@ -102,61 +221,130 @@ def remove_admin(user_id):
 
 # Save command locks function
 def save_command_locks():
-    with open(COMMAND_LOCKS_FILE, "w") as f:
-        json.dump(command_locks, f, indent=4)
+    persistence.mark_dirty("command_locks")
+
+persistence.register(
+    "command_locks",
+    snapshot=lambda keys: json.dumps(command_locks, indent=4),
+    write=lambda data: atomic_write_json(COMMAND_LOCKS_FILE, data)
+)
+
+# Load the Wikipedia / image search caches
+if LOOKUP_CACHE_FILE and os.path.exists(LOOKUP_CACHE_FILE):
+    with open(LOOKUP_CACHE_FILE, "r", encoding="utf-8") as f:
+        saved_caches = loads(f.read())
+    for cache_name, cache in lookup_caches.items():
+        cache.load(saved_caches.get(cache_name, []))
+
+def save_lookup_caches():
+    if LOOKUP_CACHE_FILE:
+        persistence.mark_dirty("lookup_caches")
+
+persistence.register(
+    "lookup_caches",
+    snapshot=lambda keys: json.dumps({cache_name: cache.dump() for cache_name, cache in lookup_caches.items()}),
+    write=lambda data: atomic_write_json(LOOKUP_CACHE_FILE, data)
+)
 
 # Ensure image folder exists
 os.makedirs(IMAGE_FOLDER, exist_ok=True)
 
-# Load characters from file if it exists
-if os.path.exists(CHARACTERS_FILE):
-    with open(CHARACTERS_FILE, 'r') as f:
-        characters = json.load(f)
-else:
-    characters = {}
+# Uploaded images, and images added by URL, are kept in a content-addressed
+# store under IMAGE_FOLDER; the Discord CDN URL of the first upload is reused
+# until it expires
+image_mirror = ImageMirror(IMAGE_FOLDER, http_client, on_change=lambda: persistence.mark_dirty("image_mirror"))
+if os.path.exists(image_mirror.index_path):
+    with open(image_mirror.index_path, "r", encoding="utf-8") as f:
+        image_mirror.load(loads(f.read()))
+
+persistence.register(
+    "image_mirror",
+    snapshot=lambda keys: json.dumps(image_mirror.dump()),
+    write=lambda data: atomic_write_json(image_mirror.index_path, data)
+)
+
+async def mirror_image_urls(urls):
+    """Download image URLs into the mirror and return the refs to store (a URL that fails stays a URL)."""
+    async def mirror(url):
+        try:
+            return image_mirror.object_path(await image_mirror.add_url(url))
+        except MirrorError as e:
+            print(f"Could not mirror image {url}: {e}")
+            return url
+    return list(await asyncio.gather(*(mirror(url) for url in urls)))
+
+startup.lap("settings and caches")
+
+# Characters as compact Character records, loaded in one pass below once the indexes exist
+characters = {}
+
+# Mutations publish events here; channel views subscribe instead of polling
+events = EventBus()
+
+# Secondary indexes (owner, status, unclaimed pool, names, images), built while loading below
+character_index = CharacterIndex(on_owner_change=lambda owner: roster_board.update(owner, len(character_index.owned_by(owner))))
+name_index = NameIndex()
+image_index = ImageIndex()
+
+# Every character mutation ends with save_character(), so this is also where
+# the indexes are kept up to date and new image entries are normalized. Only
+# the changed rows are written; deleted or renamed-away names are written as
+# deletions.
+def save_character(*names):
+    for name in names:
+        if name in characters:
+            char = characters[name]
+            char["images"] = normalize_images(char.get("images", []))
+            character_index.reindex(name, char)
+            name_index.add(name)
+            image_index.reindex(name, char)
+        else:
+            character_index.discard(name)
+            name_index.remove(name)
+            image_index.discard(name)
+        events.publish("character_changed", name)
+    persistence.mark_dirty("characters", *names)
+
+persistence.register(
+    "characters",
+    snapshot=lambda keys: {k: encode(characters[k].to_dict()) if k in characters else None for k in keys},
+    write=store.write_characters
+)
+
+# Load every character in a single pass: build the record, split old image
+# entries that hold several space-separated URLs into one URL each (a missing
+# status already defaults to Alive in Character.from_dict), index it and
+# check that its images are URLs or images we have stored
+normalized_characters = []
+invalid_characters = []
+for name, data in store.load_characters().items():
+    char = characters[name] = Character.from_dict(data)
+    images = tuple(normalize_images(char.images))
+    if images != char.images:
+        char["images"] = images
+        normalized_characters.append(name)
+    character_index.reindex(name, char)
+    image_index.reindex(name, char)
+    if image_index.has_local(name) and not all(
+        ref.startswith("http") or image_mirror.import_file(ref) for ref in images
+    ):
+        invalid_characters.append(name)
+name_index.build(characters)
+
+# Write the normalized image lists back once
+if normalized_characters:
+    persistence.mark_dirty("characters", *normalized_characters)
 
-# Sync the slash commands with Discord
-@bot.event
-async def on_ready():
-    await bot.tree.sync()
-    print(f'Logged in as {bot.user}')
-
-# Update the save_characters function
-def save_characters():
-    with open(CHARACTERS_FILE, 'w') as f:
-        json.dump(characters, f, indent=4)
-
-# Ensure default attributes are set when loading characters
-if os.path.exists(CHARACTERS_FILE):
-    with open(CHARACTERS_FILE, 'r') as f:
-        characters = json.load(f)
-        # Add missing attributes to existing characters
-        for char_data in characters.values():
-            if "status" not in char_data:
-                char_data["status"] = "Alive"
+if invalid_characters:
+    print(f"Characters with invalid image URLs: {', '.join(invalid_characters)}")
 else:
-    characters = {}
+    print("All characters have valid image URLs.")
+startup.lap("characters")
  
 # Check if a command is locked
 def is_command_locked(command_name):
     return command_locks.get(command_name, False)
 
-def validate_image_urls():
-    invalid_characters = []
-    for name, char in characters.items():
-        for url in char.get("images", []):
-            if not url or not url.startswith("http"):
-                invalid_characters.append(name)
-                break  # Stop checking further URLs for this character
-    return invalid_characters
-
-# Example usage:
-invalid_characters = validate_image_urls()
-if invalid_characters:
-    print(f"Characters with invalid image URLs: {', '.join(invalid_characters)}")
-else:
-    print("All characters have valid image URLs.")
-
 # Decorator to enforce command lock
 def check_admin_lock(command_name):
     async def predicate(interaction: discord.Interaction):
@@ -166,11 +354,17 @@ def check_admin_lock(command_name):
         return True
     return commands.check(predicate)
 
+# Shared autocomplete for every command that takes a character name
+async def character_name_autocomplete(interaction: discord.Interaction, current: str):
+    """Suggest up to 25 character names (Discord's limit): prefix matches, then close spellings."""
+    return [app_commands.Choice(name=name, value=name) for name in name_index.suggest(current, limit=25)]
+
 #-------%%%%%%%%%%%%%%% THE START OF ALL COMMANDS/ COMMAND LIST/ COMMANDS %%%%%%%%-------------##############
 
 #=-----------------------KILL AND RESSURECT COMMAND-------------------------#
 @bot.tree.command(name="kill", description="Change a character's status to deceased and specify the cause of death.")
 @check_admin_lock("kill")
+@app_commands.autocomplete(character_name=character_name_autocomplete)
 async def kill_character(interaction: discord.Interaction, character_name: str, how: str):
     """
     Mark a character as deceased and save the cause of death.
@@ -187,15 +381,16 @@ async def kill_character(interaction: discord.Interaction, character_name: str,
         return
 
     # Update the character's status and cause of death
-    character["status"] = "Deceased 💀"
+    character.status = DECEASED
     character["cause_of_death"] = how  # Add the cause of death
-    save_characters()
+    save_character(character_name)
 
     await interaction.response.send_message(f"💀 The character '{character_name}' has been marked as deceased. Cause of death: {how}")
 
 
 @bot.tree.command(name="revive", description="Change a character's status to alive.")
 @check_admin_lock("revive")
+@app_commands.autocomplete(character_name=character_name_autocomplete)
 async def resurrect_character(interaction: discord.Interaction, character_name: str):
     # Check if the character exists
     character = characters.get(character_name)
@@ -204,8 +399,8 @@ async def resurrect_character(interaction: discord.Interaction, character_name:
         return
 
     # Update the character's status
-    character["status"] = "Alive"
-    save_characters()
+    character.status = ALIVE
+    save_character(character_name)
 
     await interaction.response.send_message(f"The character '{character_name}' has been resurrected and is now alive.")
 
@@ -239,41 +434,50 @@ async def upload_character(interaction: discord.Interaction, name: str, descript
                            side_note: str = "No side note provided.", imageurl: str = None, 
                            imagefile: discord.Attachment = None):
     """Upload a character with name, description, side note, and optional image (URL or file)."""
+    await interaction.response.defer()  # Downloading the image can take a while
     
-    # Ensure the character doesn't already exist
-    if name.lower() in [char.lower() for char in characters]:
-        await interaction.response.send_message(f"A character named '{name}' already exists!")
+    # Ensure the character doesn't already exist (case-insensitive)
+    if name in name_index:
+        await interaction.followup.send(f"A character named '{name}' already exists!")
         return
     
-    # Handle image URL if provided
+    # Handle image URL if provided: keep our own copy of it
     character_images = []
     
     if imageurl:
         if imageurl.startswith("http"):  # Validate that it's a URL
-            character_images.append(imageurl)
+            character_images.extend(await mirror_image_urls([imageurl]))
         else:
-            await interaction.response.send_message("Please provide a valid image URL.", ephemeral=True)
+            await interaction.followup.send("Please provide a valid image URL.", ephemeral=True)
             return
 
-    # Handle image file attachment if provided
+    # Handle image file attachment if provided: keep our own copy, since the
+    # attachment URL Discord gives us expires
     if imagefile:
-        # Get the image file URL (attachment provided by Discord)
-        image_url = imagefile.url  # The bot can access the URL of the uploaded image
-        character_images.append(image_url)
+        try:
+            digest = await image_mirror.add_attachment(imagefile)
+        except (MirrorError, discord.HTTPException) as e:
+            await interaction.followup.send(f"Error saving image file: {e}", ephemeral=True)
+            return
+        character_images.append(image_mirror.object_path(digest))
+
+    if name in name_index:  # Uploaded by someone else while the image was downloading
+        await interaction.followup.send(f"A character named '{name}' already exists!")
+        return
     
     # Create the character data and add it
-    characters[name] = {
-        "description": description,
-        "side_note": side_note,  # Add the side note
-        "images": character_images,
-        "status": "Alive",
-        "owner": None
-    }
+    characters[name] = Character(
+        description=description,
+        side_note=side_note,  # Add the side note
+        images=character_images,
+        status=ALIVE,
+        owner=None
+    )
     
-    save_characters()  # Save to the file
+    save_character(name)  # Save to the database
 
     # Send confirmation message
-    await interaction.response.send_message(f"Character '{name}' uploaded successfully!")
+    await interaction.followup.send(f"Character '{name}' uploaded successfully!")
 
 
 
@@ -281,7 +485,8 @@ async def upload_character(interaction: discord.Interaction, name: str, descript
 #Change info for a character
 @bot.tree.command(name="changeinfo", description="Change info for an existing character.")
 @check_admin_lock("changeinfo")
-async def changeinfo(interaction: discord.Interaction, character_name: str, new_name: str = None, new_info: str = None, new_side_note: str = None, new_images: str = None):
+@app_commands.autocomplete(character_name=character_name_autocomplete)
+async def changeinfo(interaction: discord.Interaction, character_name: str, new_name: str = None, new_info: str = None, new_side_note: str = None, new_images: str = None, new_image_file: discord.Attachment = None):
     """Change a character's name, description, side note, or images."""
     
     # Check if the character exists
@@ -289,6 +494,25 @@ async def changeinfo(interaction: discord.Interaction, character_name: str, new_
         await interaction.response.send_message(f"Character '{character_name}' not found.", ephemeral=True)
         return
 
+    # Store an attached file and download new image URLs first, so a failed
+    # upload leaves the character untouched
+    await interaction.response.defer()
+    attached_image = None
+    if new_image_file:
+        try:
+            digest = await image_mirror.add_attachment(new_image_file)
+        except (MirrorError, discord.HTTPException) as e:
+            await interaction.followup.send(f"Error saving image file: {e}", ephemeral=True)
+            return
+        attached_image = image_mirror.object_path(digest)
+    image_urls = new_images.split() if new_images else []  # Split images by spaces for multiple URLs
+    mirrored = await mirror_image_urls([url for url in image_urls if url.startswith("http")])
+    stored = {url for url in image_urls if not url.startswith("http") and await image_mirror.add_file(url)}
+
+    if character_name not in characters:  # Renamed or deleted while the images were stored
+        await interaction.followup.send(f"Character '{character_name}' not found.", ephemeral=True)
+        return
+
     # Get the character's data
     character_data = characters.pop(character_name)  # Remove the old entry
 
@@ -310,30 +534,25 @@ async def changeinfo(interaction: discord.Interaction, character_name: str, new_
         characters[new_name if new_name else character_name]['side_note'] = new_side_note
 
     # Update the character's images if provided
-    if new_images:
+    if new_images or new_image_file:
         character_images = []
-        image_urls = new_images.split()  # Split images by spaces for multiple URLs
+        mirrored = iter(mirrored)
         
         for url in image_urls:
-            if url.startswith("http"):  # If it's a URL
+            if url.startswith("http"):  # A URL, now in the mirror if it could be downloaded
+                character_images.append(next(mirrored))
+            elif url in stored:  # An image we already have
                 character_images.append(url)
-            else:
-                # Assume it's a local file (uploaded via Discord)
-                try:
-                    attachment = await interaction.message.attachments[0].read()
-                    file_path = os.path.join(IMAGE_FOLDER, f"{new_name if new_name else character_name}_{len(character_images)}.png")
-                    with open(file_path, 'wb') as f:
-                        f.write(attachment)
-                    character_images.append(file_path)  # Store the file path
-                except Exception as e:
-                    await interaction.response.send_message(f"Error saving image file: {e}", ephemeral=True)
-                    return
+
+        # The attached file, already in the image store
+        if attached_image:
+            character_images.append(attached_image)
         
         # Set the new images for the character
         characters[new_name if new_name else character_name]['images'] = character_images
 
-    # Save the updated character data to the file
-    save_characters()
+    # Save the updated character data (a rename also deletes the old row)
+    save_character(character_name, new_name if new_name else character_name)
 
     # Send confirmation message
     updated_name = new_name if new_name else character_name  # Use character_name directly if no new_name is provided
@@ -343,10 +562,10 @@ async def changeinfo(interaction: discord.Interaction, character_name: str, new_
         update_message += f"\nNew Description: {new_info}"
     if new_side_note:
         update_message += f"\nNew Side Note: {new_side_note}"
-    if new_images:
-        update_message += f"\nNew Images: {', '.join(new_images.split())}"
+    if new_images or new_image_file:
+        update_message += f"\nNew Images: {', '.join(image_mirror.source_url(ref) or ref for ref in characters[updated_name]['images'])}"
 
-    await interaction.response.send_message(update_message)
+    await interaction.followup.send(update_message)
 
 
 
@@ -366,7 +585,7 @@ async def list_characters(interaction: discord.Interaction):
 
     # Prepare character details
     character_list = [
-        f"{i+1}. {name} {'💀' if char.get('status', 'Alive') == 'Deceased 💀' else ''}"
+        f"{i+1}. {name} {'💀' if char.status is DECEASED else ''}"
         for i, (name, char) in enumerate(sorted_characters)
     ]
 
@@ -397,23 +616,20 @@ async def list_characters(interaction: discord.Interaction):
 # Slash Command to delete a character
 @bot.tree.command(name="delete", description="Delete a character.")
 @check_admin_lock("delete")
+@app_commands.autocomplete(name=character_name_autocomplete)
 async def delete_character(interaction: discord.Interaction, name: str):
     """Delete an existing character."""
     
     # Find the character (case-insensitive lookup)
-    character = None
-    for char_name in characters:
-        if char_name.lower() == name.lower():
-            character = characters[char_name]
-            break
+    char_name = name_index.get(name)
     
-    if not character:
+    if not char_name:
         await interaction.response.send_message(f"Character '{name}' not found.")
         return
 
     # Delete the character and save
     del characters[char_name]
-    save_characters()
+    save_character(char_name)
     
     await interaction.response.send_message(f"Character '{name}' has been deleted.")
 
@@ -487,145 +703,370 @@ async def admin_list(interaction: discord.Interaction):
 
     await interaction.response.send_message(response, ephemeral=True)
 
-#------------------SPAWN CHARACTER COMMAND---------------------#
 
-# Spawn a random character with image navigation
-# Spawn a random character with image navigation
-@bot.tree.command(name="spawn", description="Spawn a random unclaimed character.")
-@check_admin_lock("spawn")
-async def spawn_character(interaction: discord.Interaction):
-    """Spawn a random character for claiming with image navigation."""
-    import random
+@bot.tree.command(name="persiststats", description="View how many saves the write-behind queue has batched.")
+async def persist_stats(interaction: discord.Interaction):
+    if not is_admin(interaction.user.id):
+        await interaction.response.send_message("You are not authorized to view persistence stats.", ephemeral=True)
+        return
 
-    # Defer the interaction to avoid timeout issues
-    await interaction.response.defer(thinking=True)
+    stats = persistence.stats()
+    response = (
+        "**💾 Persistence Stats:**\n"
+        f"- Save requests: {stats['marks']}\n"
+        f"- Flushes: {stats['flushes']} (writes saved: {stats['writes_saved']}, failed and retried: {stats['failures']})\n"
+        f"- Records written: {stats['records_written']}\n"
+        f"- Flush latency: last {stats['last_flush_ms']} ms, avg {stats['avg_flush_ms']} ms, max {stats['max_flush_ms']} ms"
+    )
+    await interaction.response.send_message(response, ephemeral=True)
 
-    # Filter characters that are unclaimed and alive
-    unclaimed_characters = {
-        name: char for name, char in characters.items()
-        if ("owner" not in char or char["owner"] is None) and char.get("status") == "Alive"
-    }
+@bot.tree.command(name="claimstats", description="View claim outcomes and latency stats.")
+async def claim_stats(interaction: discord.Interaction):
+    if not is_admin(interaction.user.id):
+        await interaction.response.send_message("You are not authorized to view claim stats.", ephemeral=True)
+        return
 
-    if not unclaimed_characters:
-        await interaction.followup.send("No unclaimed alive characters are available!", ephemeral=True)
+    stats = claim_service.stats()
+    rejections = ", ".join(f"{reason}: {count}" for reason, count in stats["rejections"].items()) or "none"
+    response = (
+        "**✨ Claim Stats:**\n"
+        f"- Claim attempts: {stats['attempts']} (won: {stats['wins']})\n"
+        f"- Rejected: {rejections}\n"
+        f"- Open spawns: {stats['open_spawns']}"
+    )
+    latency = {dict(labels)["outcome"]: summary for labels, summary in metrics.summaries("claim_seconds").items()}
+    for outcome in ("won", "lost"):
+        if outcome in latency:
+            response += f"\n- Press to result ({outcome}): {format_summary(latency[outcome])}"
+    to_claim = metrics.summaries("spawn_to_claim_seconds").get(())
+    if to_claim:
+        response += f"\n- Spawn to claim: {format_summary(to_claim)}"
+    await interaction.response.send_message(response, ephemeral=True)
+
+@metrics.collector
+def bot_gauges():
+    """Gauges read when /botstats or /metrics asks, instead of being tracked on every change."""
+    for phase, seconds in startup.phases.items():
+        yield "startup_phase_seconds", {"phase": phase}, seconds
+    yield "time_to_ready_seconds", {}, startup.ready
+    yield "uptime_seconds", {}, time.perf_counter() - startup.started
+    if math.isfinite(bot.latency):
+        yield "gateway_latency_seconds", {}, bot.latency
+    yield "guilds", {}, len(bot.guilds)
+    yield "characters", {}, len(characters)
+    yield "open_spawns", {}, len(active_spawns)
+    yield "pending_timers", {}, len(timers)
+    persist = persistence.stats()
+    yield "ledger_entries", {}, ledger.next_seq - 1
+    yield "market_listings", {}, len(market)
+    yield "active_auctions", {}, len(auction_house)
+    yield "pending_trades", {}, len(trade_desk)
+    mirror = image_mirror.stats()
+    yield "image_mirror_objects", {}, mirror["objects"]
+    yield "image_mirror_bytes", {}, mirror["bytes"]
+    yield "image_mirror_downloads", {}, mirror["downloads"]
+    yield "image_mirror_uploads", {}, mirror["uploads"]
+    yield "image_mirror_cdn_hits", {}, mirror["cdn_hits"]
+    yield "persistence_flushes", {}, persist["flushes"]
+    yield "persistence_last_flush_seconds", {}, persist["last_flush_ms"] / 1000
+
+def format_ms(seconds):
+    return f"{seconds * 1000:.1f} ms"
+
+def format_summary(summary):
+    stats = summary.stats()
+    return (f"p50 {format_ms(stats['p50'])}, p95 {format_ms(stats['p95'])}, "
+            f"p99 {format_ms(stats['p99'])}, max {format_ms(stats['max'])}")
+
+@bot.tree.command(name="botstats", description="View startup, command, gateway and background task timings.")
+async def bot_stats(interaction: discord.Interaction):
+    if not is_admin(interaction.user.id):
+        await interaction.response.send_message("You are not authorized to view bot stats.", ephemeral=True)
         return
 
-    # Choose a random unclaimed character
-    name, character = random.choice(list(unclaimed_characters.items()))
-    description = character.get("description", "No description available.")
-    images = character.get("images", [])
-    images = ' '.join(images).split() 
-    side_note = character.get("side_note", "No side note provided.")
+    ready = f"{startup.ready:.2f}s ({startup.summary()})" if startup.ready is not None else "not ready yet"
+    sync = metrics.summaries("command_sync_seconds").get(())
+    lag = metrics.summaries("event_loop_lag_seconds").get(())
+    gateway = format_ms(bot.latency) if math.isfinite(bot.latency) else "unknown"
+    uptime = timedelta(seconds=int(time.perf_counter() - startup.started))
+    mirror = image_mirror.stats()
+    lines = [
+        "**📊 Bot Stats:**",
+        f"- Uptime: {uptime} (ready events: {sum(metrics.counters('ready_total').values())})",
+        f"- Time to ready: {ready}",
+        f"- Command sync: {format_ms(sync.samples[-1]) if sync else 'not run'}",
+        f"- Gateway latency: {gateway}",
+        f"- Event loop lag: {format_summary(lag) if lag else 'no samples yet'}",
+        f"- Gold ledger: {ledger.next_seq - 1} entries, snapshot at #{ledger.snapshot_seq} "
+        f"({ledger.replayed} replayed at startup, {ledger.duplicates} duplicate posts ignored)",
+        f"- Image mirror: {mirror['objects']} images ({mirror['bytes'] / 2**20:.1f} MB), "
+        f"{mirror['downloads']} downloaded, {mirror['uploads']} attached, {mirror['cdn_hits']} CDN URL reuses",
+    ]
 
-    # Double-check the character is unclaimed before continuing
-    if character.get("owner"):
-        await interaction.followup.send(
-            f"An error occurred: {name} is already claimed. Please try again.",
-            ephemeral=True
-        )
+    # Per-command counts and latencies, busiest first
+    counts = {}
+    for labels, count in metrics.counters("commands_total").items():
+        labels = dict(labels)
+        entry = counts.setdefault(labels["command"], {"ok": 0, "error": 0})
+        entry[labels["outcome"]] += count
+    latencies = {dict(labels)["command"]: summary for labels, summary in metrics.summaries("command_seconds").items()}
+    lines.append("\n**⌨️ Commands:**")
+    busiest = sorted(counts.items(), key=lambda item: -(item[1]["ok"] + item[1]["error"]))[:10]
+    for name, entry in busiest:
+        errors = f", {entry['error']} failed" if entry["error"] else ""
+        timing = f" — {format_summary(latencies[name])}" if name in latencies else ""
+        lines.append(f"- `/{name}`: {entry['ok'] + entry['error']} runs{errors}{timing}")
+    if not busiest:
+        lines.append("- No commands run yet.")
+
+    failures = {dict(labels)["task"]: count for labels, count in metrics.counters("task_failures_total").items()}
+    lines.append("\n**⏱️ Background Tasks:**")
+    tasks = sorted(metrics.summaries("task_seconds").items())
+    for labels, summary in tasks:
+        task = dict(labels)["task"]
+        failed = f", {failures[task]} failed" if task in failures else ""
+        lines.append(f"- {task}: {summary.count} runs{failed} — {format_summary(summary)}")
+    if not tasks:
+        lines.append("- No background runs yet.")
+
+    await interaction.response.send_message("\n".join(lines)[:2000], ephemeral=True)
+
+@bot.tree.command(name="cache", description="Inspect or purge the Wikipedia and image search caches.")
+@app_commands.choices(
+    action=[
+        app_commands.Choice(name="inspect", value="inspect"),
+        app_commands.Choice(name="purge", value="purge"),
+    ],
+    cache=[
+        app_commands.Choice(name="all", value="all"),
+        app_commands.Choice(name="wikipedia", value="wikipedia"),
+        app_commands.Choice(name="images", value="images"),
+    ]
+)
+async def cache_command(interaction: discord.Interaction, action: str, cache: str = "all", query: str = None):
+    """
+    Inspect or purge the lookup caches.
+
+    Args:
+        interaction: The interaction object from Discord.
+        action: "inspect" to show stats and recent keys, "purge" to drop entries.
+        cache: Which cache to act on.
+        query: Purge only this query (all entries if left empty).
+    """
+    if not is_admin(interaction.user.id):
+        await interaction.response.send_message("You are not authorized to manage the caches.", ephemeral=True)
         return
 
-    # Send an initial spawning message
-    spawning_message = await interaction.followup.send(
-        "Spawning a character...", ephemeral=True  # Temporary message
-    )
+    selected = lookup_caches if cache == "all" else {cache: lookup_caches[cache]}
 
-    # Initialize image navigation variables
-    current_index = 0
-    total_images = len(images)
+    if action == "purge":
+        purged = {cache_name: c.purge(query) for cache_name, c in selected.items()}
+        summary = ", ".join(f"{cache_name}: {count}" for cache_name, count in purged.items())
+        await interaction.response.send_message(f"Purged cache entries ({summary}).", ephemeral=True)
+        return
 
-    # Create an embed with character details
-    embed = discord.Embed(
-        title=name,
-        description=f"{description}\n\n"
-        f"Side Note: {side_note}\n\n"
-        f"Unclaimed",
-        color=discord.Color.green()
+    sections = []
+    for cache_name, c in selected.items():
+        stats = c.stats()
+        recent = ", ".join(c.keys()[:10]) or "empty"
+        sections.append(
+            f"**🗃️ {cache_name.capitalize()} Cache:**\n"
+            f"- Entries: {stats['size']} / {stats['maxsize']}\n"
+            f"- Hits: {stats['hits']} (negative: {stats['negative_hits']}), misses: {stats['misses']}, hit rate: {stats['hit_rate']:.0%}\n"
+            f"- Evictions: {stats['evictions']}, expirations: {stats['expirations']}\n"
+            f"- Most recent: {recent}"
+        )
+    await interaction.response.send_message("\n\n".join(sections)[:2000], ephemeral=True)
+
+#------------------MESSAGE ROUTER AND ACTIVE SPAWNS---------------------#
+
+# Every deadline in the bot (hunting grounds, spawn and /view expiry) shares
+# this one scheduler task
+timers = DeadlineScheduler(on_fired=lambda key, seconds, ok: record_task_run(key[0], seconds, ok))
+
+# Live carousels by message ID, with their expiry
+message_router = MessageRouter(timers)
+
+SPAWN_TIMEOUT = 600  # /spawn
+HUNT_SPAWN_TIMEOUT = 60000  # Hunting ground posts
+VIEW_TIMEOUT = 60  # /view
+
+# Spawns waiting to be claimed, saved so their buttons keep working after a restart
+# Format: {message_id (str): {"channel_id", "name", "kind", "index", "expires_at"}}
+active_spawns = store.load_spawns()
+
+# Every ✨ press goes through here so exactly one claim wins
+claim_service = ClaimService(characters, on_claimed=save_character)
+
+persistence.register(
+    "spawns",
+    snapshot=lambda keys: {k: encode(active_spawns[k]) if k in active_spawns else None for k in keys},
+    write=store.write_spawns
+)
+
+
+def spawn_images(name):
+    # Local images can only be shown once they have a CDN URL from an earlier
+    # upload; until then a downloaded image is shown from where it came from
+    images = image_index.get(name)
+    if not image_index.has_local(name):
+        return images
+    urls = (image_mirror.embed_url(ref) or image_mirror.source_url(ref) for ref in images)
+    return [url for url in urls if url]
+
+
+def build_spawn_embeds(kind, name, character):
+    """One embed per image for a /spawn ("spawn") or hunting ground ("hunt") post."""
+    description = character.get("description", "No description available.")
+    side_note = character.get("side_note", "No side note provided.")
+    if kind == "spawn":
+        text = f"{description}\n\nSide Note: {side_note}\n\nUnclaimed"
+    else:
+        text = f"{description}\n\n{side_note}"
+
+    images = spawn_images(name)
+    embeds = []
+    for index, image in enumerate(images):
+        embed = discord.Embed(title=name, description=text, color=discord.Color.green())
+        embed.set_image(url=image)
+        embed.set_footer(text=f"Image {index + 1}/{len(images)}")
+        embeds.append(embed)
+    return embeds or [discord.Embed(title=name, description=text, color=discord.Color.green())]
+
+
+def build_spawn_view(record):
+    """The carousel for a spawn: page turns are saved, ✨ claims the character."""
+    character = characters[record["name"]]
+
+    def remember_index(interaction, index):
+        record["index"] = index
+        persistence.mark_dirty("spawns", str(interaction.message.id))
+
+    return CarouselView(
+        build_spawn_embeds(record["kind"], record["name"], character),
+        index=record["index"],
+        on_claim=lambda interaction, view: claim_spawn(interaction, record),
+        on_navigate=remember_index
     )
 
-    # Check if there are valid image URLs
-    if images:
-        try:
-            # Get the first valid image URL
-            character_image = None
-            for image_url in images:
-                # Log the current URL for debugging purposes
-                print(f"Checking image URL for {name}: {image_url}")
-
-                # Ensure the URL is a valid HTTP URL
-                
-                character_image = image_url
-                break
- # Replace with an actual default image
-
-            embed.set_image(url=character_image)
-            embed.set_footer(text=f"Image {current_index + 1}/{total_images}")
-        except Exception as e:
-            # Log the error for debugging with character name and problematic URL
-            print(f"Error while setting image for character '{name}': {str(e)}")
-            await interaction.followup.send(
-                f"An error occurred with the image URL for '{name}'. Please check the logs.",
-                ephemeral=True
-            )
-            return
 
-    # Send the main message (non-ephemeral, so others can interact)
-    message = await interaction.followup.send(embed=embed)
+def track_spawn(message, record, view):
+    """Register a spawn's carousel, schedule its expiry and save it as active."""
+    key = str(message.id)
+    active_spawns[key] = record
+    persistence.mark_dirty("spawns", key)
+    claim_service.open_spawn(key, record["name"])
+    message_router.register(
+        message.id, view,
+        expires_at=record["expires_at"],
+        on_expire=lambda: expire_spawn(message)
+    )
 
-    await message.add_reaction("⬅️")
-    await message.add_reaction("➡️")
-    await message.add_reaction("✨")  # Reaction for claiming the character
 
-    # Delete the "Spawning a character..." message
-    await spawning_message.delete()
+def end_spawn(message_id):
+    message_router.unregister(message_id)
+    claim_service.close_spawn(str(message_id))
+    if active_spawns.pop(str(message_id), None) is not None:
+        persistence.mark_dirty("spawns", str(message_id))
 
-    def check(reaction, user):
-        return (
-            user != bot.user
-            and str(reaction.emoji) in ["⬅️", "➡️", "✨"]
-            and reaction.message.id == message.id
-        )
 
+async def expire_spawn(message):
+    end_spawn(message.id)
     try:
-        while True:
-            # Wait for a reaction (navigation or claim)
-            reaction, user = await bot.wait_for("reaction_add", check=check, timeout=600.0)
-
-            if str(reaction.emoji) == "⬅️" and images:
-                # Navigate to the previous image
-                current_index = (current_index - 1) % total_images
-            elif str(reaction.emoji) == "➡️" and images:
-                # Navigate to the next image
-                current_index = (current_index + 1) % total_images
-            elif str(reaction.emoji) == "✨":
-                # Handle character claiming
-                if character.get("owner"):
-                    await interaction.followup.send(
-                        f"{name} is already claimed by <@{character['owner']}>.",
-                        ephemeral=True
-                    )
-                    continue
-
-                # Mark the character as claimed
-                character["owner"] = user.id
-                save_characters()  # Save ownership changes to file
-                await interaction.followup.send(
-                    f"{name} is now claimed by <@{user.id}>!",
-                    ephemeral=False
-                )
-                break  # Exit the loop after claiming the character
+        await message.edit(view=None)  # Remove the buttons
+    except discord.HTTPException:
+        pass  # Message deleted
+
+
+def record_claim(interaction, outcome):
+    """Claim latency as players see it: from the ✨ press until the spawn shows the result."""
+    metrics.observe("claim_seconds", (discord.utils.utcnow() - interaction.created_at).total_seconds(), outcome=outcome)
+    if outcome == "won":
+        metrics.observe("spawn_to_claim_seconds", (interaction.created_at - interaction.message.created_at).total_seconds())
+
+
+async def claim_spawn(interaction: discord.Interaction, record):
+    """✨ button: claim the spawned character for whoever pressed it."""
+    message_id = interaction.message.id
+    name = record["name"]
+    result = claim_service.claim(name, interaction.user.id, spawn_id=str(message_id))
+
+    if not result.ok:
+        # Whatever the reason, this spawn can't be claimed any more
+        end_spawn(message_id)
+        await interaction.response.edit_message(view=None)
+        record_claim(interaction, "lost")
+        if result.owner:
+            reason = f"{name} is already claimed by <@{result.owner}>."
+        elif result.reason == "dead":
+            reason = f"{name} is no longer alive."
+        else:
+            reason = f"{name} is no longer available."
+        await interaction.followup.send(reason, ephemeral=True)
+        return
 
-            # Update the embed with the new image and footer
-            if images:
-                embed.set_image(url=images[current_index])
-                embed.set_footer(text=f"Image {current_index + 1}/{total_images}")
-            await message.edit(embed=embed)
+    end_spawn(message_id)
+    await interaction.response.edit_message(view=None)
+    record_claim(interaction, "won")
+    await interaction.followup.send(f"{name} is now claimed by <@{interaction.user.id}>!")
+
+    # Other spawns of the same character are resolved too: take their buttons away
+    for other_id in result.resolved_spawns:
+        other = active_spawns.get(other_id)
+        end_spawn(int(other_id))
+        channel = bot.get_channel(other["channel_id"]) if other else None
+        if channel:
+            try:
+                await channel.get_partial_message(int(other_id)).edit(view=None)
+            except discord.HTTPException:
+                pass
+
+
+def restore_spawns():
+    """Re-attach the buttons of spawns saved before a restart (expired ones are cleaned up right away)."""
+    for key, record in list(active_spawns.items()):
+        message_id = int(key)
+        if message_id in message_router:
+            continue
+        channel = bot.get_channel(record["channel_id"])
+        if channel is None or record["name"] not in characters:
+            end_spawn(message_id)
+            continue
+        view = build_spawn_view(record)
+        bot.add_view(view, message_id=message_id)
+        track_spawn(channel.get_partial_message(message_id), record, view)
 
-            # Remove the user's reaction
-            await message.remove_reaction(reaction.emoji, user)
 
-    except asyncio.TimeoutError:
-        await message.clear_reactions()
+#------------------SPAWN CHARACTER COMMAND---------------------#
+
+# Spawn a random character with image navigation
+@bot.tree.command(name="spawn", description="Spawn a random unclaimed character.")
+@check_admin_lock("spawn")
+async def spawn_character(interaction: discord.Interaction):
+    """Spawn a random character for claiming with image navigation."""
+    # Defer the interaction to avoid timeout issues
+    await interaction.response.defer(thinking=True)
+
+    # Choose a random unclaimed, alive character straight from the index
+    name = character_index.random_unclaimed()
+    if name is None:
+        await interaction.followup.send("No unclaimed alive characters are available!", ephemeral=True)
+        return
+
+    record = {
+        "channel_id": interaction.channel_id,
+        "name": name,
+        "kind": "spawn",
+        "index": 0,
+        "expires_at": time.time() + SPAWN_TIMEOUT
+    }
+
+    # Send the main message (non-ephemeral, so others can interact)
+    view = build_spawn_view(record)
+    sent = await interaction.followup.send(embed=view.embed, view=view, wait=True)
+
+    # Use a channel message handle so edits keep working after the interaction token expires
+    track_spawn(interaction.channel.get_partial_message(sent.id), record, view)
 
 
 
@@ -635,6 +1076,7 @@ async def spawn_character(interaction: discord.Interaction):
 
 @bot.tree.command(name="view", description="View a character's details and images.")
 @check_admin_lock("view")
+@app_commands.autocomplete(name=character_name_autocomplete)
 async def view_character(interaction: discord.Interaction, name: str):
     """
     View a character's details and navigate through images.
@@ -646,24 +1088,28 @@ async def view_character(interaction: discord.Interaction, name: str):
         return
 
     # Extract character details
-    owner = character.get("owner", None)
+    owner = character.owner
     description = character.get("description", "No description available.")
     side_note = character.get("side_note", "No side note provided.")
-    images = character.get("images", [])
-    status = character.get("status", "Alive")
+    status = character.status
     cause_of_death = character.get("cause_of_death", None)
 
     # Validate and clean image paths
     validated_images = []
-    local_files = {}  # For storing local files that need to be attached
-    for img_entry in images:
-        for img in img_entry.split():  # Split multiple URLs separated by spaces or newlines
-            if img.startswith("http"):  # Public URL
-                validated_images.append(img)
-            elif os.path.isfile(img):  # Local file
-                file_name = os.path.basename(img)
+    local_files = {}  # attachment file name -> (digest, path) for local images that must be uploaded
+    if not image_index.has_local(name):
+        validated_images.extend(image_index.get(name))
+    else:
+        for img in image_index.get(name):
+            url = image_mirror.embed_url(img)  # Public URL, or the CDN URL of an earlier upload
+            if url:
+                validated_images.append(url)
+                continue
+            digest = await image_mirror.add_file(img)
+            if digest:  # Local image without a usable CDN URL: attach it
+                path, file_name = await image_mirror.attachment(digest)
                 validated_images.append(f"attachment://{file_name}")  # For inline image in embed
-                local_files[file_name] = img  # Store file path for later attachment
+                local_files[file_name] = (digest, path)
 
     if not validated_images:
         await interaction.response.send_message(f"Character '{name}' has no valid images to display.", ephemeral=True)
@@ -671,72 +1117,49 @@ async def view_character(interaction: discord.Interaction, name: str):
 
     # Prepare embed details
     owner_text = f"Owned by: <@{owner}>" if owner else "Available"
-    death_text = f"**Cause of Death:** {cause_of_death}" if status == "Deceased 💀" and cause_of_death else ""
-    current_index = 0
+    death_text = f"**Cause of Death:** {cause_of_death}" if status is DECEASED and cause_of_death else ""
     total_images = len(validated_images)
 
-    # Create an embed with the first image
-    embed = discord.Embed(
-        title=name,
-        description=(f"{owner_text}\n\n{description}\n\nSide Note: {side_note}\n\nStatus: {status}\n{death_text}"),
-        color=discord.Color.blue()
-    )
-    embed.set_image(url=validated_images[current_index])
-    embed.set_footer(text=f"Image {current_index + 1}/{total_images}")
+    # Build one embed per image up front so each page turn is a single edit
+    embeds = []
+    for index, image in enumerate(validated_images):
+        embed = discord.Embed(
+            title=name,
+            description=(f"{owner_text}\n\n{description}\n\nSide Note: {side_note}\n\nStatus: {status}\n{death_text}"),
+            color=discord.Color.blue()
+        )
+        embed.set_image(url=image)
+        embed.set_footer(text=f"Image {index + 1}/{total_images}")
+        embeds.append(embed)
 
     # Prepare local files to be sent as attachments (used for embed)
-    files = [discord.File(path, filename=file_name) for file_name, path in local_files.items()]
+    files = [discord.File(path, filename=file_name) for file_name, (digest, path) in local_files.items()]
+
+    # Navigation buttons only if there are multiple images (anyone can use them)
+    view = CarouselView(embeds) if total_images > 1 else discord.utils.MISSING
 
     # Send the embed with attachments only if there are local files; otherwise, just the embed
     if files:
-        await interaction.response.send_message(embed=embed, files=files)  # Send both embed and files
-    else:
-        await interaction.response.send_message(embed=embed)  # Send only embed
+        await interaction.response.send_message(embed=embeds[0], files=files, view=view)  # Send both embed and files
 
-    message = await interaction.original_response()
+        # Remember where Discord put the files so the next /view or spawn can link them
+        message = await interaction.original_response()
+        for attachment in message.attachments:
+            if attachment.filename in local_files:
+                image_mirror.remember_cdn_url(local_files[attachment.filename][0], attachment.url)
+    else:
+        await interaction.response.send_message(embed=embeds[0], view=view)  # Send only embed
 
-    # Add reactions for navigation if there are multiple images
     if total_images > 1:
-        await message.add_reaction("⬅️")
-        await message.add_reaction("➡️")
-
-        def check(reaction, user):
-            # Allow anyone to react (not just the user who invoked /view)
-            return (
-                user != bot.user and
-                str(reaction.emoji) in ["⬅️", "➡️"] and
-                reaction.message.id == message.id
-            )
-
-        try:
-            while True:
-                reaction, user = await bot.wait_for("reaction_add", check=check, timeout=60.0)
+        message = await interaction.original_response()
 
-                if str(reaction.emoji) == "⬅️":
-                    current_index = (current_index - 1) % total_images
-                elif str(reaction.emoji) == "➡️":
-                    current_index = (current_index + 1) % total_images
+        async def expire():
+            try:
+                await interaction.edit_original_response(view=None)
+            except discord.HTTPException:
+                pass
 
-                # Update the embed with the new image
-                embed.set_image(url=validated_images[current_index])
-                embed.set_footer(text=f"Image {current_index + 1}/{total_images}")
-                await message.edit(embed=embed)
-
-                # Remove the user's reaction to allow further input
-                await message.remove_reaction(reaction.emoji, user)
-        except asyncio.TimeoutError:
-            await message.clear_reactions()
-
-
-@view_character.autocomplete("name")
-async def view_character_autocomplete(interaction: discord.Interaction, current: str):
-    """
-    Autocomplete function to suggest character names based on user input.
-    """
-    # List all character names that start with the current input (case-insensitive)
-    suggestions = [name for name in characters if name.lower().startswith(current.lower())]
-    # Send the suggestions to the autocomplete menu
-    return [app_commands.Choice(name=char_name, value=char_name) for char_name in suggestions]
+        message_router.register(message.id, view, expires_at=time.time() + VIEW_TIMEOUT, on_expire=expire)
 
 
 
@@ -746,6 +1169,7 @@ async def view_character_autocomplete(interaction: discord.Interaction, current:
 
 @bot.tree.command(name="release", description="Release ownership of a claimed character.")
 @check_admin_lock("release")
+@app_commands.autocomplete(character_name=character_name_autocomplete)
 async def release_character(interaction: discord.Interaction, character_name: str):
     """Release ownership of a claimed character."""
     # Defer the response to avoid timeout
@@ -761,7 +1185,7 @@ async def release_character(interaction: discord.Interaction, character_name: st
         return
 
     # Check if the character is claimed
-    if not character.get("owner"):
+    if not character.owner:
         await interaction.followup.send(
             f"The character '{character_name}' is not currently claimed by anyone.",
             ephemeral=True
@@ -769,16 +1193,21 @@ async def release_character(interaction: discord.Interaction, character_name: st
         return
 
     # Check if the user is the owner
-    if character["owner"] != interaction.user.id:
+    if character.owner != interaction.user.id:
         await interaction.followup.send(
             f"You do not own '{character_name}', so you cannot release it.",
             ephemeral=True
         )
         return
 
+    busy = character_busy(character_name)
+    if busy:
+        await interaction.followup.send(busy, ephemeral=True)
+        return
+
     # Release ownership
-    character["owner"] = None
-    save_characters()  # Save changes to file
+    character.owner = None
+    save_character(character_name)  # Save changes to the database
     await interaction.followup.send(
         f"You have successfully released ownership of '{character_name}'.",
         ephemeral=False
@@ -813,16 +1242,28 @@ async def guide(interaction: discord.Interaction):
 
     **Ownership Commands:**
     - `/release`: Release ownership of a claimed character.
+    - `/sell`: Put a character up for sale (`/unlist` takes it down).
+    - `/market`: Browse the characters for sale.
+    - `/buy`: Buy a character that is for sale.
+    - `/auction`: Auction a character off to the highest bidder (`/auctions` lists them, `/bid` bids).
+    - `/trade`: Offer another user characters and/or gold for theirs (`/trades` lists your open offers).
+    - `/givechar`: Give a character to another user (they accept it with a button).
 
     **Utility Commands:**
     - `/roll`: Roll a dice (default 6 sides).
     - `/pick`: Randomly pick an option from a list.
     - `/list_commands`: List all available commands.
+    - `/leaderboard`: See who has the most gold or the biggest roster.
 
     **Admin Commands:**
     - `/adminlock`: Lock a command for admin use only.
     - `/adminunlock`: Unlock a command for everyone.
     - `/adminlist`: View admins and lock statuses.
+    - `/persiststats`: View how many saves have been batched together.
+    - `/claimstats`: View claim outcomes and latency.
+    - `/botstats`: View startup, command, gateway and background task timings.
+    - `/cache`: Inspect or purge the Wikipedia and image search caches.
+    - `/imagehealth`: Check character image links and remove dead ones.
 
     **Last Updated on 19 November 2024**
     """
@@ -838,10 +1279,9 @@ async def add_gold(interaction: discord.Interaction, amount: int):
         return
 
     user_id = str(interaction.user.id)
-    gold_data[user_id] = gold_data.get(user_id, 0) + amount
-    save_gold_data()
+    await ledger.credit(user_id, amount, kind="addgold", key=f"addgold:{interaction.id}")
 
-    await interaction.response.send_message(f"💰 {amount} gold has been added to your balance. Total: {gold_data[user_id]} gold.")
+    await interaction.response.send_message(f"💰 {amount} gold has been added to your balance. Total: {ledger.balance(user_id)} gold.")
 
 @bot.tree.command(name="deletegold", description="Delete gold from your balance.")
 @check_admin_lock("deletegold")
@@ -852,22 +1292,19 @@ async def delete_gold(interaction: discord.Interaction, amount: int):
         return
 
     user_id = str(interaction.user.id)
-    current_balance = gold_data.get(user_id, 0)
-
-    if current_balance < amount:
-        await interaction.response.send_message(f"You don't have enough gold! Current balance: {current_balance} gold.", ephemeral=True)
+    try:
+        await ledger.debit(user_id, amount, kind="deletegold", key=f"deletegold:{interaction.id}")
+    except InsufficientFunds as e:
+        await interaction.response.send_message(f"You don't have enough gold! Current balance: {e.balance} gold.", ephemeral=True)
         return
 
-    gold_data[user_id] -= amount
-    save_gold_data()
-
-    await interaction.response.send_message(f"❌ {amount} gold has been removed from your balance. Remaining: {gold_data[user_id]} gold.")
+    await interaction.response.send_message(f"❌ {amount} gold has been removed from your balance. Remaining: {ledger.balance(user_id)} gold.")
 
 @bot.tree.command(name="balance", description="Check your gold balance.")
 async def check_balance(interaction: discord.Interaction):
     """Check the user's gold balance."""
     user_id = str(interaction.user.id)
-    balance = gold_data.get(user_id, 0)
+    balance = ledger.balance(user_id)
 
     await interaction.response.send_message(f"💰 You currently have {balance} gold.")
 @bot.tree.command(name="givegold", description="Give gold to another user.")
@@ -885,19 +1322,70 @@ async def give_gold(interaction: discord.Interaction, recipient: discord.Member,
         await interaction.response.send_message("You cannot give gold to yourself.", ephemeral=True)
         return
 
-    sender_balance = gold_data.get(sender_id, 0)
-
-    if sender_balance < amount:
-        await interaction.response.send_message(f"You don't have enough gold to give! Current balance: {sender_balance} gold.", ephemeral=True)
+    try:
+        await ledger.transfer(sender_id, recipient_id, amount, kind="givegold", key=f"givegold:{interaction.id}")
+    except InsufficientFunds as e:
+        await interaction.response.send_message(f"You don't have enough gold to give! Current balance: {e.balance} gold.", ephemeral=True)
         return
 
-    # Transfer gold
-    gold_data[sender_id] = sender_balance - amount
-    gold_data[recipient_id] = gold_data.get(recipient_id, 0) + amount
-    save_gold_data()
-
-    await interaction.response.send_message(f"✅ You have given {amount} gold to {recipient.mention}. Remaining balance: {gold_data[sender_id]} gold.")
+    await interaction.response.send_message(f"✅ You have given {amount} gold to {recipient.mention}. Remaining balance: {ledger.balance(sender_id)} gold.")
     
+#-----------------------LEADERBOARDS--------------------------#
+
+LEADERBOARD_PAGE_SIZE = 10
+
+# board -> (leaderboard, title, unit, member ID from a Discord user ID)
+LEADERBOARDS = {
+    "gold": (gold_board, "💰 Gold Leaderboard", "gold", str),
+    "roster": (roster_board, "📜 Roster Leaderboard", "characters", int),
+}
+
+def build_leaderboard_view(board_name):
+    """Page buttons over a leaderboard; each page reads only its own ten ranks."""
+    board, title, unit, member_id = LEADERBOARDS[board_name]
+
+    def page_count():
+        return max(1, -(-len(board) // LEADERBOARD_PAGE_SIZE))
+
+    def render(page, user):
+        rows = board.page(page * LEADERBOARD_PAGE_SIZE, LEADERBOARD_PAGE_SIZE)
+        lines = [f"**#{rank}** <@{member}> — {score:,} {unit}" for rank, member, score in rows]
+        embed = discord.Embed(
+            title=title,
+            description="\n".join(lines) or "Nobody is on this leaderboard yet.",
+            color=discord.Color.gold()
+        )
+        rank = board.rank(member_id(user.id))
+        mine = f"Your rank: #{rank} of {len(board)}" if rank else "You're not ranked yet"
+        embed.set_footer(text=f"Page {page + 1}/{page_count()} · {mine}")
+        return embed
+
+    def locate(user):
+        rank = board.rank(member_id(user.id))
+        return None if rank is None else (rank - 1) // LEADERBOARD_PAGE_SIZE
+
+    return PagedView(render, page_count, locate=locate)
+
+@bot.tree.command(name="leaderboard", description="See who has the most gold or the biggest roster.")
+@app_commands.choices(
+    board=[
+        app_commands.Choice(name="gold", value="gold"),
+        app_commands.Choice(name="roster", value="roster"),
+    ]
+)
+async def leaderboard(interaction: discord.Interaction, board: str = "gold", page: int = 1):
+    """
+    Show a leaderboard page.
+
+    Args:
+        interaction: The interaction object from Discord.
+        board: "gold" for balances, "roster" for the number of characters owned.
+        page: The page to open on (ten ranks per page).
+    """
+    view = build_leaderboard_view(board)
+    view.page = page - 1
+    await interaction.response.send_message(embed=view.embed(interaction.user), view=view)
+
 #--------Graveyard command and Graveyard Related ---------#
 
 @bot.tree.command(name="setgraveyard", description="Set a channel to display deceased characters.")
@@ -909,52 +1397,82 @@ async def set_graveyard(interaction: discord.Interaction, channel: discord.TextC
     if guild_id not in channel_settings:
         channel_settings[guild_id] = {}
 
-    # Save the graveyard channel ID
+    # Save the graveyard channel ID (new channel means new posts)
     channel_settings[guild_id]["graveyard_channel"] = channel.id
-    save_channel_settings()
+    channel_settings[guild_id]["graveyard_messages"] = []
+    save_channel_settings(guild_id)
+
+    graveyard_publishers.pop(guild_id, None)
 
     await interaction.response.send_message(f"✅ The graveyard channel has been set to {channel.mention}.", ephemeral=True)
+    await publish_graveyards()
 
-    
-async def update_graveyard():
-    """Periodic task to update the graveyard channel."""
-    await bot.wait_until_ready()
-    while not bot.is_closed():
-        for guild_id, channels in channel_settings.items():
-            graveyard_channel_id = channels.get("graveyard_channel")
-            if graveyard_channel_id:
-                channel = bot.get_channel(graveyard_channel_id)
 
-                if channel:
-                    # Collect all deceased characters
-                    deceased_characters = sorted(
-                        [name for name, char in characters.items() if char.get("status") == "Deceased 💀"]
-                    )
-                    if deceased_characters:
-                        character_list = "\n".join([f"💀 {name}" for name in deceased_characters])
-                        content = f"**Graveyard of Deceased Characters:**\n{character_list}"
-                    else:
-                        content = "**Graveyard of Deceased Characters:**\nNo deceased characters yet."
+# Like the character list: one shared renderer, one publisher per guild
+graveyard_renderer = GraveyardRenderer(character_index)
+graveyard_publishers = {}  # Format: {guild_id: ChunkedPublisher}
 
-                    # Find the latest bot message in the channel to edit
-                    async for message in channel.history(limit=10):
-                        if message.author == bot.user and message.content.startswith("**Graveyard"):
-                            await message.edit(content=content)
-                            break
-                    else:
-                        # No message found; send a new one
-                        await channel.send(content)
 
-        await asyncio.sleep(7)  # Update every 2 seconds
+async def get_graveyard_publisher(guild_id):
+    """Return the guild's graveyard publisher, creating it from the saved settings if needed."""
+    channels = channel_settings.get(guild_id, {})
+    channel = bot.get_channel(channels.get("graveyard_channel"))
+    if not channel:
+        return None
+
+    publisher = graveyard_publishers.get(guild_id)
+    if publisher is not None and publisher.channel.id == channel.id:
+        return publisher
+
+    message_ids = channels.get("graveyard_messages")
+    if message_ids is None:
+        # Settings from before message IDs were saved: adopt the old graveyard post once
+        message_ids = []
+        async for message in channel.history(limit=10):
+            if message.author == bot.user and message.content.startswith("**Graveyard"):
+                message_ids = [message.id]
+                break
 
+    publisher = ChunkedPublisher(channel, message_ids)
+    graveyard_publishers[guild_id] = publisher
+    return publisher
 
 
+async def publish_graveyards():
+    """Render the graveyard and edit only the messages whose text changed."""
+    pages = graveyard_renderer.render()
+    for guild_id in list(channel_settings):
+        try:
+            publisher = await get_graveyard_publisher(guild_id)
+            if publisher is None:
+                continue
+            if await publisher.publish(pages) or "graveyard_messages" not in channel_settings[guild_id]:
+                channel_settings[guild_id]["graveyard_messages"] = publisher.message_ids
+                save_channel_settings(guild_id)
+        except discord.HTTPException as e:
+            print(f"Failed to update the graveyard for guild {guild_id}: {e}")
+
+
+graveyard_refresh = CoalescingTask(publish_graveyards, on_run=lambda seconds, ok: record_task_run("graveyards", seconds, ok))
+
+def on_graveyard_change(name):
+    """Event handler: update the graveyards when a kill, revive or delete changes who is in them."""
+    if graveyard_renderer.is_affected(name):
+        graveyard_refresh.trigger()
+
+events.subscribe("character_changed", on_graveyard_change)
+
 
 
 #-----------------------Character List Settings Command-------------#
 
-# Global variable to track message IDs for live updates
-character_list_messages = {}  # Format: {guild_id: [message_id_1, message_id_2, ...]}
+# The list is rendered once and shared by every guild; each guild gets its own
+# publisher that remembers its messages and what it last sent.
+character_list_renderer = CharacterListRenderer(characters, name_index)
+character_list_publishers = {}  # Format: {guild_id: ChunkedPublisher}
+
+# Wait this long after a change before editing, so bursts become one update
+CHARACTER_LIST_DEBOUNCE = 3
 
 @bot.tree.command(name="setcharacterlist", description="Set a channel to display all characters with their statuses.")
 @commands.has_permissions(administrator=True)
@@ -967,99 +1485,126 @@ async def set_characterlist(interaction: discord.Interaction, channel: discord.T
     if guild_id not in channel_settings:
         channel_settings[guild_id] = {}
 
-    # Save the character list channel ID
+    # Save the character list channel ID (new channel means new posts)
     channel_settings[guild_id]["characterlist_channel"] = channel.id
-    save_channel_settings()
+    channel_settings[guild_id]["characterlist_messages"] = []
+    save_channel_settings(guild_id)
 
-    # Reset tracked messages for this guild (new channel means new posts)
-    character_list_messages[guild_id] = []
+    character_list_publishers.pop(guild_id, None)
 
     await interaction.response.send_message(f"✅ The character list channel has been set to {channel.mention}.", ephemeral=True)
+    await publish_character_lists()
 
 
-async def update_character_list():
-    """
-    Periodic task to update the character list channel with messages split into chunks of 50 characters.
-    """
-    await bot.wait_until_ready()
-
-    while not bot.is_closed():
-        for guild_id, channels in channel_settings.items():
-            characterlist_channel_id = channels.get("characterlist_channel")
-            if characterlist_channel_id:
-                channel = bot.get_channel(characterlist_channel_id)
-
-                if channel:
-                    # Build the character list in chunks of 50
-                    sorted_characters = sorted(characters.items(), key=lambda x: x[0].lower())
-                    chunks = []
-                    chunk = []
-                    for i, (name, char) in enumerate(sorted_characters, start=1):
-                        status = char.get("status", "Alive")
-                        owner_id = char.get("owner")
-                        owner_text = f" (Owned by <@{owner_id}>)" if owner_id else ""
-                        if status == "Deceased 💀":
-                            chunk.append(f"{i}. 💀 {name}")
-                        elif owner_id:
-                            chunk.append(f"{i}. 🔒 {name}{owner_text}")
-                        else:
-                            chunk.append(f"{i}. 🌿 {name}")
-
-                        # Split into a new chunk every 50 characters
-                        if len(chunk) >= 50:
-                            chunks.append("\n".join(chunk))
-                            chunk = []
-
-                    # Add any remaining characters in the last chunk
-                    if chunk:
-                        chunks.append("\n".join(chunk))
-
-                    # Retrieve or initialize message tracking for the guild
-                    if guild_id not in character_list_messages:
-                        character_list_messages[guild_id] = []
-
-                    # Update or create messages for each chunk
-                    for i, chunk_content in enumerate(chunks):
-                        if i < len(character_list_messages[guild_id]):
-                            # Edit existing messages
-                            message_id = character_list_messages[guild_id][i]
-                            try:
-                                message = await channel.fetch_message(message_id)
-                                await message.edit(content=f"**All Characters (Part {i+1}):**\n{chunk_content}")
-                            except discord.NotFound:
-                                # If the message was deleted, create a new one
-                                message = await channel.send(f"**All Characters (Part {i+1}):**\n{chunk_content}")
-                                character_list_messages[guild_id][i] = message.id
-                        else:
-                            # Create new messages if needed
-                            message = await channel.send(f"**All Characters (Part {i+1}):**\n{chunk_content}")
-                            character_list_messages[guild_id].append(message.id)
-
-                    # Remove extra messages if chunks decreased
-                    while len(character_list_messages[guild_id]) > len(chunks):
-                        message_id = character_list_messages[guild_id].pop()
-                        try:
-                            message = await channel.fetch_message(message_id)
-                            await message.delete()
-                        except discord.NotFound:
-                            # Message was already deleted; ignore
-                            pass
-
-        await asyncio.sleep(10)  # Update every 10 seconds
+def get_character_list_publisher(guild_id):
+    """Return the guild's list publisher, creating it from the saved settings if needed."""
+    channels = channel_settings.get(guild_id, {})
+    channel = bot.get_channel(channels.get("characterlist_channel"))
+    if not channel:
+        return None
+
+    publisher = character_list_publishers.get(guild_id)
+    if publisher is None or publisher.channel.id != channel.id:
+        publisher = ChunkedPublisher(channel, channels.get("characterlist_messages", []))
+        character_list_publishers[guild_id] = publisher
+    return publisher
+
+
+async def publish_character_lists():
+    """Re-render the changed parts of the list and edit only the messages whose text changed."""
+    chunks = character_list_renderer.render()
+    for guild_id in list(channel_settings):
+        publisher = get_character_list_publisher(guild_id)
+        if publisher is None:
+            continue
+        try:
+            if await publisher.publish(chunks):
+                channel_settings[guild_id]["characterlist_messages"] = publisher.message_ids
+                save_channel_settings(guild_id)
+        except discord.HTTPException as e:
+            print(f"Failed to update the character list for guild {guild_id}: {e}")
+
+
+character_list_refresh = CoalescingTask(
+    publish_character_lists,
+    delay=CHARACTER_LIST_DEBOUNCE,
+    on_run=lambda seconds, ok: record_task_run("character_lists", seconds, ok)
+)
+
+def on_character_list_change(name):
+    """Event handler: queue a debounced character list update."""
+    character_list_renderer.invalidate(name)
+    character_list_refresh.trigger()
+
+events.subscribe("character_changed", on_character_list_change)
 
 
 @bot.event
 async def on_ready():
     """
-    Start all periodic tasks when the bot is ready.
+    Start the timers, restore saved spawns, listings, auctions and trade offers, schedule the hunting grounds and
+    image checks and publish the channel views once the bot is ready. This runs again after every reconnect, so everything in
+    here must be safe to repeat.
     """
-    bot.loop.create_task(update_character_list())
+    metrics.inc("ready_total")
+    timers.start()
+    loop_lag.start()
+    restore_spawns()
+    restore_listings()
+    restore_auctions()
+    restore_trades()
+    start_hunting_grounds()
+    start_image_health_checks()
+    await publish_character_lists()
+    await publish_graveyards()
     print(f"Logged in as {bot.user}")
 
+    if startup.ready is None:
+        startup.lap("connect")  # Gateway login and everything above
+        print(f"Ready in {startup.mark_ready():.2f}s ({startup.summary()})")
+
 
 
 #------------------Setting a Hunting Ground-------------------------#
 
+# Hunting grounds use the shared timers: one task for every hunting ground in
+# every guild, sleeping until the earliest next spawn instead of polling.
+
+def schedule_hunting_ground(guild_id, channel_id):
+    """(Re)schedule a hunting ground's next spawn from its last spawn and interval."""
+    key = ("hunt", guild_id, channel_id)
+    hunting_ground = channel_settings.get(guild_id, {}).get("hunting_grounds", {}).get(channel_id)
+    if not hunting_ground:
+        timers.cancel(key)
+        return
+
+    last_spawn = hunting_ground.get("last_spawn")
+    if last_spawn:
+        due = last_spawn.timestamp() + hunting_ground["interval"]
+    else:
+        due = datetime.now(timezone.utc).timestamp()  # Never spawned: spawn right away
+
+    async def spawn():
+        try:
+            await post_character_to_channel(int(channel_id))
+        finally:
+            # last_spawn goes through the write-behind queue with everything else
+            if hunting_ground is channel_settings.get(guild_id, {}).get("hunting_grounds", {}).get(channel_id):
+                hunting_ground["last_spawn"] = datetime.now(timezone.utc)
+                save_channel_settings(guild_id)
+                schedule_hunting_ground(guild_id, channel_id)
+
+    timers.schedule(key, due, spawn)
+
+
+def start_hunting_grounds():
+    """Schedule every saved hunting ground (safe to call on every reconnect)."""
+    for guild_id, settings in channel_settings.items():
+        for channel_id in settings.get("hunting_grounds", {}):
+            if ("hunt", guild_id, channel_id) not in timers:
+                schedule_hunting_ground(guild_id, channel_id)
+
+
 @bot.tree.command(
     name="sethuntingground",
     description=
@@ -1069,52 +1614,50 @@ async def set_hunting_ground(interaction: discord.Interaction,
                              channel: discord.TextChannel, interval: int):
     """
     Set a hunting ground in the specified channel with the given interval in seconds.
+    A guild can have several hunting grounds; setting one again changes its interval.
     """
+    if interval < 1:
+        await interaction.response.send_message("The interval must be at least 1 second.", ephemeral=True)
+        return
+
     guild_id = str(interaction.guild_id)
+    channel_id = str(channel.id)
 
     # Ensure the guild has an entry in channel_settings
     if guild_id not in channel_settings:
         channel_settings[guild_id] = {}
 
-    # Save the hunting ground details
-    channel_settings[guild_id]["hunting_ground"] = {
-        "channel_id": channel.id,
-        "interval": interval
-    }
-    save_channel_settings()  # Save to the file
+    # Save the hunting ground details, keeping the last spawn time if it already existed
+    hunting_grounds = channel_settings[guild_id].setdefault("hunting_grounds", {})
+    hunting_ground = hunting_grounds.setdefault(channel_id, {})
+    hunting_ground["interval"] = interval
+    save_channel_settings(guild_id)  # Save to the database
+
+    # Takes effect immediately: the scheduler wakes up if this is now the earliest spawn
+    schedule_hunting_ground(guild_id, channel_id)
 
     await interaction.response.send_message(
         f"✅ Hunting ground set in {channel.mention} with an interval of {interval} seconds.",
         ephemeral=True)
 
 
-async def update_hunting_grounds():
-    """Continuously post characters to hunting ground channels at their specified intervals."""
-    await bot.wait_until_ready()
-
-    while not bot.is_closed():
-        now = datetime.now(timezone.utc)  # Current time
-
-        for guild_id, settings in channel_settings.items():
-            hunting_ground = settings.get("hunting_ground")
-            if not hunting_ground:
-                continue
-
-            # Extract details
-            channel_id = hunting_ground["channel_id"]
-            interval = hunting_ground["interval"]
-            last_spawn = hunting_ground.get("last_spawn",
-                                            now - timedelta(seconds=interval))
+@bot.tree.command(name="removehuntingground", description="Stop spawning characters in a hunting ground channel.")
+@commands.has_permissions(administrator=True)
+async def remove_hunting_ground(interaction: discord.Interaction, channel: discord.TextChannel):
+    """Remove the hunting ground in the specified channel."""
+    guild_id = str(interaction.guild_id)
+    channel_id = str(channel.id)
 
-            # Check if it's time to post
-            if (now - last_spawn).total_seconds() >= interval:
-                await post_character_to_channel(channel_id)
+    hunting_grounds = channel_settings.get(guild_id, {}).get("hunting_grounds", {})
+    if channel_id not in hunting_grounds:
+        await interaction.response.send_message(f"{channel.mention} is not a hunting ground.", ephemeral=True)
+        return
 
-                # Update the last_spawn time in memory and save
-                hunting_ground["last_spawn"] = now
-                save_channel_settings()  # Persist this update to the file
+    del hunting_grounds[channel_id]
+    save_channel_settings(guild_id)
+    schedule_hunting_ground(guild_id, channel_id)  # Cancels the pending spawn
 
-        await asyncio.sleep(1)  # Check every second
+    await interaction.response.send_message(f"✅ {channel.mention} is no longer a hunting ground.", ephemeral=True)
 
 
 async def post_character_to_channel(channel_id):
@@ -1123,86 +1666,24 @@ async def post_character_to_channel(channel_id):
     if not channel:
         return  # Channel no longer exists, skip it
 
-    # Filter unclaimed, alive characters
-    unclaimed_characters = {
-        name: char
-        for name, char in characters.items()
-        if ("owner" not in char or char["owner"] is None)
-        and char.get("status") == "Alive"
-    }
-
-    if not unclaimed_characters:
+    # Choose a random unclaimed, alive character straight from the index
+    name = character_index.random_unclaimed()
+    if name is None:
         await channel.send("No unclaimed alive characters are available!")
         return
 
-    # Choose a random unclaimed character
-    name, character = random.choice(list(unclaimed_characters.items()))
-    description = character.get("description", "No description available.")
-    images = character.get("images", [])
-    images = ' '.join(images).split() 
-    side_note = character.get("side_note", "No side note provided.")
-
-    # Create an embed for the character
-    embed = discord.Embed(title=name,
-                          description=f"{description}\n\n{side_note}",
-                          color=discord.Color.green())
-    if images:
-        embed.set_image(url=images[0])  # Show the first image if available
-        embed.set_footer(text=f"Image 1/{len(images)}")
-
-    # Send the embed to the channel
-    message = await channel.send(embed=embed)
-
-    # Add reactions for interaction
-    await message.add_reaction("⬅️")
-    await message.add_reaction("➡️")
-    await message.add_reaction("✨")  # Reaction for claiming
-
-    # Handle reactions in a separate task
-    bot.loop.create_task(handle_reactions(message, name, character, images))
-
-
-async def handle_reactions(message, name, character, images):
-    """Handle reactions for navigating images or claiming the character."""
-    current_index = 0
-    total_images = len(images)
-
-    def check(reaction, user):
-        return (user != bot.user and str(reaction.emoji) in ["⬅️", "➡️", "✨"]
-                and reaction.message.id == message.id)
+    record = {
+        "channel_id": channel.id,
+        "name": name,
+        "kind": "hunt",
+        "index": 0,
+        "expires_at": time.time() + HUNT_SPAWN_TIMEOUT
+    }
 
-    try:
-        while True:
-            reaction, user = await bot.wait_for("reaction_add",
-                                                check=check,
-                                                timeout=60000.0)
-
-            if str(reaction.emoji) == "⬅️" and images:
-                current_index = (current_index - 1) % total_images
-            elif str(reaction.emoji) == "➡️" and images:
-                current_index = (current_index + 1) % total_images
-            elif str(reaction.emoji) == "✨" and ("owner" not in character or
-                                                 character["owner"] is None):
-                # Mark as claimed and save
-                character["owner"] = user.id
-                save_characters()
-                await message.channel.send(
-                    f"{name} is now claimed by <@{user.id}>!")
-                break  # Exit after claiming
-
-            # Update embed with new image
-            if images:
-                embed = message.embeds[0]
-                embed.set_image(url=images[current_index])
-                embed.set_footer(
-                    text=f"Image {current_index + 1}/{total_images}")
-                await message.edit(embed=embed)
-
-            # Remove user's reaction
-            await message.remove_reaction(reaction.emoji, user)
-
-    except asyncio.TimeoutError:
-        await message.clear_reactions()
+    # Send the embed to the channel with the claim/navigation buttons
+    view = build_spawn_view(record)
+    message = await channel.send(embed=view.embed, view=view)
+    track_spawn(message, record, view)
         
 #--------------------Quick Upload0-----------------#
 
@@ -1217,6 +1698,7 @@ async def handle_reactions(message, name, character, images):
 #-------------------------ADD PIC COMMAND FOR CONVINENICEN ADDPIC--------------------#
 
 @bot.tree.command(name="addpic", description="Add specific images to a character using a search query.")
+@app_commands.autocomplete(character=character_name_autocomplete)
 async def add_pic(interaction: discord.Interaction, character: str, query: str, number: int = 1):
     """
     Add specific images to a character using SerpAPI image search.
@@ -1224,8 +1706,9 @@ async def add_pic(interaction: discord.Interaction, character: str, query: str,
     Args:
         interaction: The Discord interaction object.
         character (str): The name of the character to add images to.
-        query (str): Search query for the images.
-        number (int): The number of images to add (default is 1).
+        query (str): Search query for the images. Separate several queries
+            with "|" to run them all at once (up to 5).
+        number (int): The number of images to add per query (default is 1).
     """
     # Validate number of images
     if number < 1 or number > 10:
@@ -1242,49 +1725,173 @@ async def add_pic(interaction: discord.Interaction, character: str, query: str,
         )
         return
 
-    # Use SerpAPI to fetch images
-    search_url = "https://google.serper.dev/images"
-    payload = {"q": query}
-    headers = {
-        "X-API-KEY": os.getenv("SERPAPI_API_KEY"),
-        "Content-Type": "application/json",
-    }
+    queries = list(dict.fromkeys(q.strip() for q in query.split("|") if q.strip()))
+    if not queries or len(queries) > 5:
+        await interaction.response.send_message(
+            "Please give between 1 and 5 queries, separated by '|'.", ephemeral=True
+        )
+        return
 
-    try:
-        response = requests.post(search_url, headers=headers, json=payload)
-        if response.status_code == 200:
-            data = response.json()
-            images = data.get("images", [])
-            image_urls = [
-                img["imageUrl"]
-                for img in images
-                if img["imageUrl"].endswith((".png", ".jpg", ".jpeg"))
-            ]
-
-            if image_urls:
-                # Add the images to the character
-                selected_urls = random.sample(image_urls, min(number, len(image_urls)))
-                char_data.setdefault("images", []).extend(selected_urls)
-                save_characters()  # Save the updated character data
-
-                await interaction.response.send_message(
-                    f"Added {len(selected_urls)} image(s) to '{character}' from query '{query}'.\n" +
-                    "\n".join(selected_urls)
-                )
-            else:
-                await interaction.response.send_message("No valid image URLs found.")
+    # Searches can take a while: defer so the interaction doesn't time out
+    await interaction.response.defer()
+
+    results = await image_search.search_many(queries)
+
+    selected_urls = []
+    report = []
+    for q, result in results.items():
+        if isinstance(result, ImageSearchError):
+            report.append(f"'{q}': failed to fetch images ({result}).")
+        elif isinstance(result, Exception):
+            report.append(f"'{q}': an error occurred while fetching images: {result}")
+        elif not result:
+            report.append(f"'{q}': no valid image URLs found.")
         else:
-            await interaction.response.send_message(
-                f"Failed to fetch images. Status code: {response.status_code}.",
-                ephemeral=True,
-            )
-    except Exception as e:
+            picked = random.sample(result, min(number, len(result)))
+            selected_urls.extend(picked)
+            report.append(f"'{q}': added {len(picked)} image(s).")
+
+    if selected_urls:
+        # Add the images to the character, downloaded into the mirror
+        char_data["images"] = char_data.images + tuple(await mirror_image_urls(selected_urls))
+        save_character(character)  # Save the updated character data
+
+    await interaction.followup.send(
+        f"Added {len(selected_urls)} image(s) to '{character}'.\n" +
+        "\n".join(report) +
+        ("\n" + "\n".join(selected_urls) if selected_urls else "")
+    )
+
+#-------------------IMAGE HEALTH CHECKS-----------------------------------#
+
+# Every image URL is checked in the background once per IMAGE_CHECK_INTERVAL
+# seconds (0 turns it off); URLs checked within the last week are skipped.
+# Dead images are only removed automatically with IMAGE_AUTO_PRUNE=1,
+# otherwise an admin removes them with /imagehealth prune.
+IMAGE_CHECK_INTERVAL = int(os.getenv("IMAGE_CHECK_INTERVAL", "86400"))
+IMAGE_AUTO_PRUNE = os.getenv("IMAGE_AUTO_PRUNE", "").lower() in ("1", "true", "yes")
+
+image_health = ImageHealthChecker(
+    http_client,
+    concurrency=int(os.getenv("IMAGE_CHECK_CONCURRENCY", "8")),
+    per_host=2,
+    host_interval=0.5
+)
+
+if os.path.exists(IMAGE_HEALTH_FILE):
+    with open(IMAGE_HEALTH_FILE, "r", encoding="utf-8") as f:
+        image_health.load(loads(f.read()))
+
+persistence.register(
+    "image_health",
+    snapshot=lambda keys: json.dumps(image_health.dump()),
+    write=lambda data: atomic_write_json(IMAGE_HEALTH_FILE, data)
+)
+
+def prune_dead_images():
+    """Remove every image whose URL was found dead. Returns {name: URLs removed}."""
+    pruned = prune_images(characters, image_health.dead_urls(character_image_urls(characters)))
+    if pruned:
+        save_character(*pruned)
+    return pruned
+
+async def run_image_health_check(force=False):
+    result = await image_health.check_many(character_image_urls(characters), force=force)
+    persistence.mark_dirty("image_health")
+    if IMAGE_AUTO_PRUNE:
+        result["pruned"] = prune_dead_images()
+    return result
+
+def schedule_image_health_check(delay):
+    async def run():
+        try:
+            await run_image_health_check()
+        finally:
+            schedule_image_health_check(IMAGE_CHECK_INTERVAL)
+
+    timers.schedule(("image_health",), time.time() + delay, run)
+
+def start_image_health_checks():
+    """Schedule the first background check a few minutes after startup (safe to repeat)."""
+    if IMAGE_CHECK_INTERVAL > 0 and ("image_health",) not in timers:
+        schedule_image_health_check(300)
+
+
+@bot.tree.command(name="imagehealth", description="Check character image links and remove dead ones.")
+@app_commands.choices(action=[
+    app_commands.Choice(name="report", value="report"),
+    app_commands.Choice(name="check", value="check"),
+    app_commands.Choice(name="prune", value="prune"),
+])
+async def image_health_command(interaction: discord.Interaction, action: str):
+    """
+    Show the image link report, run a check now, or remove dead images.
+
+    Args:
+        interaction: The interaction object from Discord.
+        action: "report", "check" (re-checks every URL) or "prune".
+    """
+    if not is_admin(interaction.user.id):
+        await interaction.response.send_message("You are not authorized to manage image links.", ephemeral=True)
+        return
+
+    if action == "prune":
+        pruned = prune_dead_images()
         await interaction.response.send_message(
-            f"An error occurred while fetching images: {e}", ephemeral=True
+            f"Removed {sum(pruned.values())} dead image(s) from {len(pruned)} character(s).", ephemeral=True
         )
+        return
+
+    await interaction.response.defer(ephemeral=True)
+    header = ""
+    if action == "check":
+        if image_health.running:
+            await interaction.followup.send("An image check is already running.", ephemeral=True)
+            return
+        result = await run_image_health_check(force=True)
+        header = f"Checked {result['checked']} URL(s) in {result['elapsed']:.0f}s.\n"
+
+    urls = character_image_urls(characters)
+    counts = image_health.summary(urls)
+    lines = []
+    for url in urls:
+        record = image_health.results.get(url)
+        if record and record["state"] in (DEAD, ERROR):
+            status = record["status"] or record.get("error")
+            lines.append(f"- {record['state']} ({status}): {', '.join(sorted(urls[url]))} <{url}>")
+    report = (
+        header +
+        "**🖼️ Image Links:**\n"
+        f"- OK: {counts['ok']}, dead: {counts['dead']}, errors: {counts['error']}, not checked yet: {counts['unchecked']}\n" +
+        "\n".join(lines)
+    )
+    await interaction.followup.send(report[:2000], ephemeral=True)
 
 #-------------------WIKIPEDIA COMMAND-----------------------------------#
-import aiohttp
+
+# Shared by /wikipedia and /autoadd
+async def fetch_wikipedia_description(name: str):
+    """Return the lead paragraph of the Wikipedia article for `name`, or None."""
+    cached = wikipedia_cache.get(name)
+    if cached is not MISSING:
+        return cached
+
+    try:
+        status, text = await fetch_lead_paragraph(http_client, name)
+    except Exception:
+        return None
+    if status == 404:
+        wikipedia_cache.set_negative(name)
+        return None
+    if status != 200:
+        return None
+
+    if not text or is_disambiguation(text):
+        wikipedia_cache.set_negative(name)
+        return None
+    wikipedia_cache.set(name, text)
+    return text
+
 
 @bot.tree.command(name="wikipedia", description="Fetch a brief description from Wikipedia.")
 async def wikipedia_description(interaction: discord.Interaction, name: str):
@@ -1297,41 +1904,7 @@ async def wikipedia_description(interaction: discord.Interaction, name: str):
     """
     await interaction.response.defer()  # Defer response to avoid timeout
 
-    async def get_description(name: str):
-        try:
-            async with aiohttp.ClientSession(headers={'User-Agent': 'Mozilla/5.0 (Windows NT 6.1; rv:52.0) Gecko/20100101 Firefox/52.0'}) as session:
-                async with session.get('https://en.wikipedia.org/wiki/' + name.replace(' ', '_')) as resp:
-                    if resp.status != 200:
-                        return None
-                    data = await resp.text()
-                    data = data[data.find('<p>'):]
-                    data = data[:data.find('</p>')]
-                    data = data.replace('&#91;', '[').replace('&#93;', ']')
-                    text = ''
-                    waiting_on = None
-                    for c in data:
-                        if not waiting_on:
-                            if c == '<':
-                                waiting_on = '>'
-                            elif c == '&':
-                                waiting_on = ';'
-                            elif c == '(':
-                                text = text.strip()
-                                waiting_on = ')'
-                            elif c == '[':
-                                waiting_on = ']'
-                            else:
-                                text += c
-                        elif c == waiting_on:
-                            waiting_on = None
-                    text = ' '.join(text.split())
-                    if text.endswith(' may refer to:'):
-                        return None
-                    return text
-        except Exception:
-            return None
-
-    description = await get_description(name)
+    description = await fetch_wikipedia_description(name)
     if description:
         await interaction.followup.send(f"**Wikipedia Summary for {name}:**\n{description}")
     else:
@@ -1362,86 +1935,41 @@ async def autoadd_character(interaction: discord.Interaction,
         await interaction.followup.send("Please specify a number between 1 and 10 for the number of images.", ephemeral=True)
         return
 
-    # Ensure the character doesn't already exist
-    if name.lower() in [char.lower() for char in characters]:
+    # Ensure the character doesn't already exist (case-insensitive)
+    if name in name_index:
         await interaction.followup.send(f"A character named '{name}' already exists!", ephemeral=True)
         return
 
-    # Function to fetch description from Wikipedia
-    async def fetch_description(wiki_name: str):
-        try:
-            async with aiohttp.ClientSession(headers={'User-Agent': 'Mozilla/5.0'}) as session:
-                async with session.get(f'https://en.wikipedia.org/wiki/{wiki_name.replace(" ", "_")}') as resp:
-                    if resp.status != 200:
-                        return None
-                    data = await resp.text()
-                    data = data[data.find('<p>'):]
-                    data = data[:data.find('</p>')]
-                    data = data.replace('&#91;', '[').replace('&#93;', ']')
-                    text = ''
-                    waiting_on = None
-                    for c in data:
-                        if not waiting_on:
-                            if c == '<':
-                                waiting_on = '>'
-                            elif c == '&':
-                                waiting_on = ';'
-                            elif c == '(':
-                                text = text.strip()
-                                waiting_on = ')'
-                            elif c == '[':
-                                waiting_on = ']'
-                            else:
-                                text += c
-                        elif c == waiting_on:
-                            waiting_on = None
-                    text = ' '.join(text.split())
-                    if text.endswith(' may refer to:'):
-                        return None
-                    return text
-        except Exception:
-            return None
-
     # Fetch description from Wikipedia
-    description = await fetch_description(name)
+    description = await fetch_wikipedia_description(name)
     if not description:
         await interaction.followup.send(f"Could not fetch a description for '{name}' from Wikipedia.", ephemeral=True)
         return
 
     # Fetch images using SerpAPI
-    async def fetch_images(query: str, max_images: int):
-        search_url = "https://google.serper.dev/images"
-        payload = {"q": query}
-        headers = {
-            "X-API-KEY": os.getenv("SERPAPI_API_KEY"),
-            "Content-Type": "application/json",
-        }
-        try:
-            response = requests.post(search_url, headers=headers, json=payload)
-            if response.status_code == 200:
-                data = response.json()
-                images = data.get("images", [])
-                image_urls = [img["imageUrl"] for img in images if img["imageUrl"].endswith((".png", ".jpg", ".jpeg"))]
-                return random.sample(image_urls, min(max_images, len(image_urls)))
-        except Exception:
-            return []
-        return []
-
-    # Fetch images
-    images = await fetch_images(imagequery, number)
-    if not images:
+    try:
+        image_urls = await image_search.search(imagequery)
+    except Exception:
+        image_urls = []
+    image_urls = random.sample(image_urls, min(number, len(image_urls)))
+    if not image_urls:
         await interaction.followup.send(f"No images found for query '{imagequery}'.", ephemeral=True)
         return
+    images = await mirror_image_urls(image_urls)
+
+    if name in name_index:  # Added by someone else while this one was being fetched
+        await interaction.followup.send(f"A character named '{name}' already exists!", ephemeral=True)
+        return
 
     # Add the character to the data
-    characters[name] = {
-        "description": description,
-        "side_note": sidenote,
-        "images": images,
-        "status": "Alive",
-        "owner": None
-    }
-    save_characters()  # Save to the JSON file
+    characters[name] = Character(
+        description=description,
+        side_note=sidenote,
+        images=images,
+        status=ALIVE,
+        owner=None
+    )
+    save_character(name)  # Save to the database
 
     # Build confirmation message
     embed = discord.Embed(
@@ -1449,8 +1977,7 @@ async def autoadd_character(interaction: discord.Interaction,
         description=f"**Description:** {description}\n\n**Side Note:** {sidenote}\n\n**Images:** {len(images)} image(s) added.",
         color=discord.Color.green()
     )
-    if images:
-        embed.set_image(url=images[0])
+    embed.set_image(url=image_urls[0])
 
     await interaction.followup.send(embed=embed)
     
@@ -1459,10 +1986,7 @@ async def autoadd_character(interaction: discord.Interaction,
 @bot.tree.command(name="ownlist", description="List all characters you own.")
 async def ownlist(interaction: discord.Interaction):
     """List all characters owned by the user."""
-    user_id = str(interaction.user.id)
-    owned_characters = [
-        name for name, char in characters.items() if char.get("owner") == interaction.user.id
-    ]
+    owned_characters = sorted(character_index.owned_by(interaction.user.id))
     
     if not owned_characters:
         await interaction.response.send_message("You do not own any characters.", ephemeral=True)
@@ -1542,7 +2066,7 @@ class ChallengeView(discord.ui.View):
                 return await self.prompt_character_choice(channel)
 
             # Check if the character is owned by the user
-            owner_id = character.get("owner")
+            owner_id = character.owner
             if owner_id != msg.author.id:
                 await channel.send(
                     f"{character_name} is not owned by you! Please select a character you own."
@@ -1551,7 +2075,8 @@ class ChallengeView(discord.ui.View):
 
             # If all checks pass, assign the character
             self.chosen_characters[msg.author] = character_name
-            self.character_images[msg.author] = character["images"][0].split()[0] if character["images"] else None
+            images = spawn_images(character_name)  # Local images as their CDN or source URL
+            self.character_images[msg.author] = images[0] if images else None
 
         await self.start_challenge(channel)
 
@@ -1653,105 +2178,741 @@ class ChallengeView(discord.ui.View):
 
 
 
-#------------------------Give Character--------------------#
-@bot.tree.command(name="givechar", description="Transfer ownership of a character to another user.")
-async def give_character(interaction: discord.Interaction, character_name: str):
-    """Transfer ownership of a character."""
-    character = characters.get(character_name)
-    
-    # Check if the character exists
-    if not character:
-        await interaction.response.send_message(f"Character '{character_name}' not found.", ephemeral=True)
+#---------------------------------MARKETPLACE--------------------------#
+
+# /sell lists a character at a fixed price until the listing expires
+# (MARKET_LISTING_HOURS, default 48). Listings are saved with their message,
+# so the Buy buttons keep working after a restart, and sales are settled by
+# the marketplace in one step through the ledger (see market.py).
+MARKET_LISTING_HOURS = int(os.getenv("MARKET_LISTING_HOURS", "48"))
+MARKET_PAGE_SIZE = 10
+
+# Live listing views by listing ID
+listing_views = {}
+
+def on_listing_closed(listing, reason):
+    """Marketplace callback: save a sold character and take the buttons off the listing message."""
+    if reason == SOLD:
+        save_character(listing["name"])
+    view = listing_views.pop(listing["id"], None)
+    if view is not None:
+        view.stop()
+    if listing["message_id"]:
+        asyncio.get_running_loop().create_task(close_listing_message(listing, reason))
+
+saved_listings = store.load_listings()
+market = Marketplace(
+    characters,
+    ledger,
+    timers,
+    on_change=lambda listing_id: persistence.mark_dirty("listings", listing_id),
+    on_closed=on_listing_closed,
+    next_id=IdSequence(store, "listing", existing=saved_listings, ledger_prefix="listing:")
+)
+market.load(saved_listings)
+
+persistence.register(
+    "listings",
+    snapshot=lambda keys: {k: encode(market.listings[k]) if k in market.listings else None for k in keys},
+    write=store.write_listings
+)
+
+# Older sales only set "sale_price" on the character: turn them into listings once
+for name, character in characters.items():
+    if "sale_price" in character:
+        if character.owner is not None and market.listing_for(name) is None:
+            market.create(name, character.owner, character["sale_price"], MARKET_LISTING_HOURS * 3600)
+        del character["sale_price"]
+        persistence.mark_dirty("characters", name)
+
+# The character changing hands some other way (a trade, an admin delete) takes it off the market
+events.subscribe("character_changed", market.revalidate)
+
+def listing_embed(listing, status=None):
+    embed = discord.Embed(
+        title=f"{listing['name']} is for sale!",
+        description=(
+            f"Price: {listing['price']:,} gold\n"
+            f"Seller: <@{listing['seller']}>\n"
+            f"Listing ends <t:{int(listing['expires_at'])}:R>\n\n"
+            "Click the button below to purchase."
+        ),
+        color=discord.Color.gold()
+    )
+    if status:
+        embed.title = f"{listing['name']}: {status}"
+        embed.description = f"Price: {listing['price']:,} gold\nSeller: <@{listing['seller']}>"
+        embed.color = discord.Color.dark_grey()
+    embed.set_footer(text=f"Listing #{listing['id']}")
+    return embed
+
+async def close_listing_message(listing, reason):
+    statuses = {
+        SOLD: f"sold to <@{listing['buyer']}>" if listing.get("buyer") else "sold",
+        EXPIRED: "listing expired",
+        CANCELLED: "taken off the market",
+        INVALID: "no longer for sale",
+    }
+    channel = bot.get_channel(listing["channel_id"])
+    if channel is None:
         return
-    
-    # Check if the user owns the character
-    if character.get("owner") != interaction.user.id:
-        await interaction.response.send_message(f"You do not own the character '{character_name}'.", ephemeral=True)
+    try:
+        await channel.get_partial_message(listing["message_id"]).edit(
+            embed=listing_embed(listing, statuses.get(reason, reason)), view=None
+        )
+    except discord.HTTPException:
+        pass
+
+class ListingView(discord.ui.View):
+    """Buy / Cancel buttons on a listing. Persistent: custom IDs carry the listing ID."""
+
+    def __init__(self, listing_id):
+        super().__init__(timeout=None)
+        self.listing_id = listing_id
+        self.buy.custom_id = f"market:buy:{listing_id}"
+        self.unlist.custom_id = f"market:cancel:{listing_id}"
+
+    @discord.ui.button(label="Buy", style=discord.ButtonStyle.green)
+    async def buy(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await buy_listing(interaction, self.listing_id)
+
+    @discord.ui.button(label="Cancel", style=discord.ButtonStyle.secondary)
+    async def unlist(self, interaction: discord.Interaction, button: discord.ui.Button):
+        try:
+            listing = market.cancel(self.listing_id, interaction.user.id)
+        except MarketError as e:
+            await interaction.response.send_message(str(e), ephemeral=True)
+            return
+        await interaction.response.send_message(f"'{listing['name']}' has been taken off the market.", ephemeral=True)
+
+async def buy_listing(interaction: discord.Interaction, listing_id):
+    try:
+        listing = await market.buy(listing_id, interaction.user.id)
+    except InsufficientFunds:
+        await interaction.response.send_message("You do not have enough gold to buy this character.", ephemeral=True)
         return
+    except MarketError as e:
+        await interaction.response.send_message(str(e), ephemeral=True)
+        return
+    await interaction.response.send_message(f"Congratulations! You have purchased '{listing['name']}'.")
+
+def track_listing(listing_id, message_id):
+    view = ListingView(listing_id)
+    bot.add_view(view, message_id=message_id)
+    listing_views[listing_id] = view
+
+def restore_listings():
+    """Finish interrupted sales, schedule expiry and re-attach listing buttons (safe to repeat)."""
+    market.recover()
+    for listing_id, listing in list(market.listings.items()):
+        if ("listing", listing_id) not in timers:
+            market.schedule(listing_id)
+        if listing["message_id"] and listing_id not in listing_views:
+            track_listing(listing_id, listing["message_id"])
+
+async def listed_character_autocomplete(interaction: discord.Interaction, current: str):
+    current = current.lower()
+    names = [listing["name"] for listing in market.listings.values() if current in listing["name"].lower()]
+    return [app_commands.Choice(name=name, value=name) for name in names[:25]]
 
-    await interaction.response.send_message("Who do you want to give this character to? Mention the user.")
+@bot.tree.command(name="sell", description="Put a character up for sale.")
+@app_commands.autocomplete(character_name=character_name_autocomplete)
+async def sell_character(interaction: discord.Interaction, character_name: str, amount: int, hours: int = None):
+    """
+    List a character on the market.
 
-    def check(msg):
-        return msg.author == interaction.user and msg.mentions
+    Args:
+        interaction: The interaction object from Discord.
+        character_name: The character to sell.
+        amount: The price in gold.
+        hours: How long the listing stays up (MARKET_LISTING_HOURS by default, at most two weeks).
+    """
+    hours = MARKET_LISTING_HOURS if hours is None else hours
+    if not 1 <= hours <= 336:
+        await interaction.response.send_message("A listing can last from 1 to 336 hours.", ephemeral=True)
+        return
+    busy = character_busy(character_name)
+    if busy:
+        await interaction.response.send_message(busy, ephemeral=True)
+        return
 
     try:
-        msg = await bot.wait_for("message", check=check, timeout=30)
-        recipient = msg.mentions[0]
-        
-        # Update ownership
-        character["owner"] = recipient.id
-        save_characters()
+        listing = market.create(character_name, interaction.user.id, amount, hours * 3600)
+    except MarketError as e:
+        await interaction.response.send_message(str(e), ephemeral=True)
+        return
 
-        await interaction.followup.send(f"Character '{character_name}' has been given to {recipient.mention}.")
-    except asyncio.TimeoutError:
-        await interaction.followup.send("No response received. Transfer cancelled.", ephemeral=True)
+    view = ListingView(listing["id"])
+    await interaction.response.send_message(embed=listing_embed(listing), view=view)
+    message = await interaction.original_response()
+    market.attach_message(listing["id"], message.channel.id, message.id)
+    listing_views[listing["id"]] = view
+
+@bot.tree.command(name="unlist", description="Take one of your characters off the market.")
+@app_commands.autocomplete(character_name=listed_character_autocomplete)
+async def unlist_character(interaction: discord.Interaction, character_name: str):
+    listing = market.listing_for(character_name)
+    if listing is None:
+        await interaction.response.send_message(f"'{character_name}' is not for sale.", ephemeral=True)
+        return
+    try:
+        market.cancel(listing["id"], interaction.user.id)
+    except MarketError as e:
+        await interaction.response.send_message(str(e), ephemeral=True)
+        return
+    await interaction.response.send_message(f"'{character_name}' has been taken off the market.", ephemeral=True)
+
+@bot.tree.command(name="buy", description="Buy a character that is for sale.")
+@app_commands.autocomplete(character_name=listed_character_autocomplete)
+async def buy_character(interaction: discord.Interaction, character_name: str):
+    listing = market.listing_for(character_name)
+    if listing is None:
+        await interaction.response.send_message(f"'{character_name}' is not for sale.", ephemeral=True)
+        return
+    await buy_listing(interaction, listing["id"])
 
-#---------------------------------SELL CHARACTER--------------------------#
+@bot.tree.command(name="market", description="Browse the characters for sale.")
+@app_commands.choices(
+    sort=[
+        app_commands.Choice(name="cheapest first", value="price"),
+        app_commands.Choice(name="newest first", value="newest"),
+    ]
+)
+async def browse_market(interaction: discord.Interaction, sort: str = "price", page: int = 1):
+    """
+    Browse the market, ten listings per page.
 
-@bot.tree.command(name="sell", description="Put a character up for sale.")
-async def sell_character(interaction: discord.Interaction, character_name: str, amount: int):
-    """Put a character for sale."""
-    if amount <= 0:
-        await interaction.response.send_message("Sale amount must be greater than 0.", ephemeral=True)
+    Args:
+        interaction: The interaction object from Discord.
+        sort: "price" (cheapest first) or "newest".
+        page: The page to open on.
+    """
+    def page_count():
+        return max(1, -(-len(market) // MARKET_PAGE_SIZE))
+
+    def render(page, user):
+        listings = market.page(sort, page * MARKET_PAGE_SIZE, MARKET_PAGE_SIZE)
+        lines = [
+            f"**{listing['name']}** — {listing['price']:,} gold · <@{listing['seller']}> · ends <t:{int(listing['expires_at'])}:R>"
+            for listing in listings
+        ]
+        embed = discord.Embed(
+            title="🛒 Market",
+            description="\n".join(lines) or "Nothing is for sale right now.",
+            color=discord.Color.gold()
+        )
+        embed.set_footer(text=f"Page {page + 1}/{page_count()} · {len(market)} listings · Buy with /buy")
+        return embed
+
+    view = PagedView(render, page_count, page=page - 1)
+    await interaction.response.send_message(embed=view.embed(interaction.user), view=view)
+
+#---------------------------------AUCTIONS--------------------------#
+
+# /auction puts a character up for bids until a deadline, with an optional
+# reserve price. Every bid is escrowed in the ledger as it is placed and the
+# shared timer heap settles each auction at its deadline (see auctions.py).
+# Auctions are saved with their message so the Bid button survives a restart;
+# the message is refreshed at most every AUCTION_REFRESH_SECONDS while bids come in.
+AUCTION_MAX_HOURS = 168
+AUCTION_PAGE_SIZE = 10
+AUCTION_REFRESH_SECONDS = 2
+
+# Live auction views and message refreshers by auction ID
+auction_views = {}
+auction_refreshes = {}
+
+def on_auction_closed(auction, result):
+    """Auction house callback: save a sold character and show the result on the auction message."""
+    if result == AUCTION_SOLD:
+        save_character(auction["name"])
+    view = auction_views.pop(auction["id"], None)
+    if view is not None:
+        view.stop()
+    auction_refreshes.pop(auction["id"], None)
+    if auction["message_id"]:
+        asyncio.get_running_loop().create_task(edit_auction_message(auction))
+
+def on_auction_bid(auction):
+    """Auction house callback: refresh the auction message, coalescing bursts of bids into one edit."""
+    if not auction["message_id"]:
         return
+    refresh = auction_refreshes.get(auction["id"])
+    if refresh is None:
+        async def refresh_auction_message():
+            await edit_auction_message(auction)
+        refresh = auction_refreshes[auction["id"]] = CoalescingTask(refresh_auction_message, delay=AUCTION_REFRESH_SECONDS)
+    refresh.trigger()
+
+saved_auctions = store.load_auctions()
+auction_house = AuctionHouse(
+    characters,
+    ledger,
+    timers,
+    on_change=lambda auction_id: persistence.mark_dirty("auctions", auction_id),
+    on_closed=on_auction_closed,
+    on_bid=on_auction_bid,
+    next_id=IdSequence(store, "auction", existing=saved_auctions, ledger_prefix="auction:")
+)
+auction_house.load(saved_auctions)
+
+# Registered after "ledger", so a flush writes the escrow entries before the auctions that refer to them
+persistence.register(
+    "auctions",
+    snapshot=lambda keys: {k: encode(auction_house.auctions[k]) if k in auction_house.auctions else None for k in keys},
+    write=store.write_auctions
+)
+
+# The character changing hands some other way (a trade, an admin delete) cancels the auction and refunds the high bidder
+events.subscribe("character_changed", auction_house.revalidate)
+
+def auction_embed(auction):
+    if auction["high_bidder"] is not None:
+        high = f"{auction['high_bid']:,} gold by <@{auction['high_bidder']}>"
+    else:
+        high = "no bids yet"
+    reserve = "met" if (auction["high_bid"] or 0) >= auction["reserve"] else "not met yet"
+    result = auction.get("result")
+    if result is None:
+        embed = discord.Embed(
+            title=f"{auction['name']} is up for auction!",
+            description=(
+                f"Seller: <@{auction['seller']}>\n"
+                f"High bid: {high}\n"
+                f"Next bid: at least {minimum_bid(auction):,} gold\n"
+                f"Reserve: {reserve}\n"
+                f"Ends <t:{int(auction['ends_at'])}:R>\n\n"
+                "Click the button to bid the minimum, or use /bid for more."
+            ),
+            color=discord.Color.purple()
+        )
+    else:
+        if result == AUCTION_SOLD:
+            status = f"sold to <@{auction['high_bidder']}> for {auction['high_bid']:,} gold"
+        elif result == AUCTION_CANCELLED:
+            status = "auction cancelled"
+        else:
+            status = "not sold" + (" (reserve not met)" if auction["high_bidder"] is not None else "")
+        embed = discord.Embed(
+            title=f"{auction['name']}: auction over",
+            description=f"Seller: <@{auction['seller']}>\nResult: {status}",
+            color=discord.Color.dark_grey()
+        )
+    embed.set_footer(text=f"Auction #{auction['id']} · {auction['bids']} bids")
+    return embed
 
-    character = characters.get(character_name)
-    
-    # Check if the character exists
-    if not character:
-        await interaction.response.send_message(f"Character '{character_name}' not found.", ephemeral=True)
+async def edit_auction_message(auction):
+    channel = bot.get_channel(auction["channel_id"])
+    if channel is None:
         return
-    
-    # Check if the user owns the character
-    if character.get("owner") != interaction.user.id:
-        await interaction.response.send_message(f"You do not own the character '{character_name}'.", ephemeral=True)
+    view = auction_views.get(auction["id"])
+    try:
+        await channel.get_partial_message(auction["message_id"]).edit(embed=auction_embed(auction), view=view)
+    except discord.HTTPException:
+        pass
+
+class AuctionView(discord.ui.View):
+    """Bid button on an auction. Persistent: the custom ID carries the auction ID."""
+
+    def __init__(self, auction_id):
+        super().__init__(timeout=None)
+        self.auction_id = auction_id
+        self.bid.custom_id = f"auction:bid:{auction_id}"
+
+    @discord.ui.button(label="Bid minimum", style=discord.ButtonStyle.green)
+    async def bid(self, interaction: discord.Interaction, button: discord.ui.Button):
+        auction = auction_house.auctions.get(self.auction_id)
+        if auction is None:
+            await interaction.response.send_message("This auction has ended.", ephemeral=True)
+            return
+        await place_bid(interaction, self.auction_id, minimum_bid(auction))
+
+async def place_bid(interaction: discord.Interaction, auction_id, amount):
+    try:
+        auction = await auction_house.bid(auction_id, interaction.user.id, amount)
+    except InsufficientFunds:
+        await interaction.response.send_message(f"You do not have enough gold to bid {amount:,}.", ephemeral=True)
+        return
+    except AuctionError as e:
+        await interaction.response.send_message(str(e), ephemeral=True)
         return
+    await interaction.response.send_message(
+        f"You are the high bidder on '{auction['name']}' with {amount:,} gold. "
+        "It stays in escrow until you're outbid or the auction ends.",
+        ephemeral=True
+    )
 
-    # Store sale information
-    character["sale_price"] = amount
-    save_characters()
+def track_auction(auction_id, message_id):
+    view = AuctionView(auction_id)
+    bot.add_view(view, message_id=message_id)
+    auction_views[auction_id] = view
+
+def restore_auctions():
+    """Replay bids and settlements from the ledger, reschedule deadlines and re-attach Bid buttons (safe to repeat)."""
+    auction_house.recover()
+    for auction_id, auction in list(auction_house.auctions.items()):
+        if ("auction", auction_id) not in timers:
+            auction_house.schedule(auction_id)
+        if auction["message_id"] and auction_id not in auction_views:
+            track_auction(auction_id, auction["message_id"])
+
+async def auctioned_character_autocomplete(interaction: discord.Interaction, current: str):
+    current = current.lower()
+    names = [auction["name"] for auction in auction_house.auctions.values() if current in auction["name"].lower()]
+    return [app_commands.Choice(name=name, value=name) for name in names[:25]]
+
+@bot.tree.command(name="auction", description="Auction a character off to the highest bidder.")
+@app_commands.autocomplete(character_name=character_name_autocomplete)
+async def start_auction(interaction: discord.Interaction, character_name: str, hours: int = 24, reserve: int = 0,
+                        starting_bid: int = 1):
+    """
+    Start an auction.
 
+    Args:
+        interaction: The interaction object from Discord.
+        character_name: The character to auction.
+        hours: How long bidding stays open (at most a week).
+        reserve: The lowest price you'll sell for; below it the high bidder is refunded.
+        starting_bid: The lowest first bid.
+    """
+    if not 1 <= hours <= AUCTION_MAX_HOURS:
+        await interaction.response.send_message(f"An auction can last from 1 to {AUCTION_MAX_HOURS} hours.", ephemeral=True)
+        return
+    busy = character_busy(character_name)
+    if busy:
+        await interaction.response.send_message(busy, ephemeral=True)
+        return
+
+    try:
+        auction = auction_house.create(character_name, interaction.user.id, reserve, hours * 3600, start_price=starting_bid)
+    except AuctionError as e:
+        await interaction.response.send_message(str(e), ephemeral=True)
+        return
+
+    view = AuctionView(auction["id"])
+    auction_views[auction["id"]] = view
+    await interaction.response.send_message(embed=auction_embed(auction), view=view)
+    message = await interaction.original_response()
+    auction_house.attach_message(auction["id"], message.channel.id, message.id)
+
+@bot.tree.command(name="bid", description="Bid on a character that is up for auction.")
+@app_commands.autocomplete(character_name=auctioned_character_autocomplete)
+async def bid_on_auction(interaction: discord.Interaction, character_name: str, amount: int = None):
+    """
+    Bid on an auction.
+
+    Args:
+        interaction: The interaction object from Discord.
+        character_name: The character being auctioned.
+        amount: Your bid in gold (the minimum next bid if left out).
+    """
+    auction = auction_house.auction_for(character_name)
+    if auction is None:
+        await interaction.response.send_message(f"'{character_name}' is not up for auction.", ephemeral=True)
+        return
+    await place_bid(interaction, auction["id"], minimum_bid(auction) if amount is None else amount)
+
+@bot.tree.command(name="auctions", description="Browse the running auctions.")
+async def browse_auctions(interaction: discord.Interaction, page: int = 1):
+    """Browse the running auctions, ending soonest first."""
+    def page_count():
+        return max(1, -(-len(auction_house) // AUCTION_PAGE_SIZE))
+
+    def render(page, user):
+        auctions = auction_house.page(page * AUCTION_PAGE_SIZE, AUCTION_PAGE_SIZE)
+        lines = []
+        for auction in auctions:
+            high = f"{auction['high_bid']:,} gold" if auction["high_bidder"] is not None else "no bids"
+            lines.append(f"**{auction['name']}** — {high} · <@{auction['seller']}> · ends <t:{int(auction['ends_at'])}:R>")
+        embed = discord.Embed(
+            title="🔨 Auctions",
+            description="\n".join(lines) or "Nothing is being auctioned right now.",
+            color=discord.Color.purple()
+        )
+        embed.set_footer(text=f"Page {page + 1}/{page_count()} · {len(auction_house)} auctions · Bid with /bid")
+        return embed
+
+    view = PagedView(render, page_count, page=page - 1)
+    await interaction.response.send_message(embed=view.embed(interaction.user), view=view)
+
+#---------------------------------TRADES--------------------------#
+
+# /trade offers characters and/or gold for someone else's; /givechar is a
+# one-sided offer. The proposer's side goes into escrow as soon as they
+# confirm, the recipient accepts or declines with buttons on the offer
+# message, and the swap commits in one step (see trades.py). Unanswered
+# offers expire after TRADE_OFFER_HOURS and are refunded. Offers are saved
+# with their message, so the buttons keep working after a restart.
+TRADE_OFFER_HOURS = int(os.getenv("TRADE_OFFER_HOURS", "24"))
+
+# Live offer views by offer ID
+trade_views = {}
+
+def on_trade_closed(offer, result):
+    """Trade desk callback: save swapped characters and show the outcome on the offer message."""
+    if result in (ACCEPTED, TRADE_INVALID):  # recover() may have swapped an invalid offer's characters back
+        save_character(*offer["give"]["characters"], *offer["want"]["characters"])
+    view = trade_views.pop(offer["id"], None)
+    if view is not None:
+        view.stop()
+    if offer["message_id"]:
+        asyncio.get_running_loop().create_task(close_trade_message(offer))
+
+saved_trades = store.load_trades()
+trade_desk = TradeDesk(
+    characters,
+    ledger,
+    timers,
+    on_change=lambda offer_id: persistence.mark_dirty("trades", offer_id),
+    on_closed=on_trade_closed,
+    next_id=IdSequence(store, "trade", existing=saved_trades, ledger_prefix="trade:")
+)
+trade_desk.load(saved_trades)
+
+persistence.register(
+    "trades",
+    snapshot=lambda keys: {k: encode(trade_desk.offers[k]) if k in trade_desk.offers else None for k in keys},
+    write=store.write_trades
+)
+
+# A character held in an offer that changes owner some other way calls the offer off
+events.subscribe("character_changed", trade_desk.revalidate)
+
+def character_busy(name):
+    """Why `name` can't be sold, auctioned, released or traded right now, or None."""
+    if market.listing_for(name) is not None:
+        return f"'{name}' is for sale on the market. Use /unlist first."
+    if auction_house.auction_for(name) is not None:
+        return f"'{name}' is being auctioned."
+    if trade_desk.offer_holding(name) is not None:
+        return f"'{name}' is held for a pending trade offer."
+    return None
+
+def describe_side(side):
+    items = [f"**{name}**" for name in side["characters"]]
+    if side["gold"]:
+        items.append(f"{side['gold']:,} gold")
+    return ", ".join(items) or "nothing"
+
+def trade_embed(offer, status=None):
     embed = discord.Embed(
-        title=f"{character_name} is for sale!",
-        description=f"Price: {amount} gold\n\nClick the button below to purchase.",
-        color=discord.Color.gold()
+        title=f"Trade offer #{offer['id']}" + (f": {status}" if status else ""),
+        description=(
+            f"<@{offer['proposer']}> offers <@{offer['recipient']}> a trade."
+            + ("" if status else f"\nThe offer expires <t:{int(offer['expires_at'])}:R>.")
+        ),
+        color=discord.Color.dark_grey() if status else discord.Color.teal()
     )
-    message = await interaction.response.send_message(embed=embed, view=BuyView(character_name))
+    embed.add_field(name="They give", value=describe_side(offer["give"]), inline=False)
+    embed.add_field(name="They want", value=describe_side(offer["want"]), inline=False)
+    return embed
+
+async def close_trade_message(offer):
+    statuses = {
+        ACCEPTED: "accepted",
+        DECLINED: "declined",
+        TRADE_CANCELLED: "cancelled",
+        TRADE_EXPIRED: "expired",
+    }
+    channel = bot.get_channel(offer["channel_id"])
+    if channel is None:
+        return
+    try:
+        await channel.get_partial_message(offer["message_id"]).edit(
+            embed=trade_embed(offer, statuses.get(offer["result"], "called off")), view=None
+        )
+    except discord.HTTPException:
+        pass
 
-class BuyView(discord.ui.View):
-    def __init__(self, character_name):
-        super().__init__()
-        self.character_name = character_name
+class TradeOfferView(discord.ui.View):
+    """Accept / Decline / Cancel buttons on an offer. Persistent: custom IDs carry the offer ID."""
 
-    @discord.ui.button(label="Buy", style=discord.ButtonStyle.green)
-    async def buy(self, interaction: discord.Interaction, button: discord.ui.Button):
-        user_id = str(interaction.user.id)
-        character = characters.get(self.character_name)
+    def __init__(self, offer_id):
+        super().__init__(timeout=None)
+        self.offer_id = offer_id
+        self.accept.custom_id = f"trade:accept:{offer_id}"
+        self.decline.custom_id = f"trade:decline:{offer_id}"
+        self.withdraw.custom_id = f"trade:cancel:{offer_id}"
 
-        # Check if the character is still for sale
-        if not character or "sale_price" not in character:
-            await interaction.response.send_message("This character is no longer for sale.", ephemeral=True)
+    @discord.ui.button(label="Accept", style=discord.ButtonStyle.green)
+    async def accept(self, interaction: discord.Interaction, button: discord.ui.Button):
+        try:
+            offer = await trade_desk.accept(self.offer_id, interaction.user.id)
+        except InsufficientFunds:
+            await interaction.response.send_message("You do not have enough gold for this trade.", ephemeral=True)
+            return
+        except TradeError as e:
+            await interaction.response.send_message(str(e), ephemeral=True)
             return
+        await interaction.response.send_message(
+            f"Trade #{offer['id']} done: <@{offer['recipient']}> got {describe_side(offer['give'])} and "
+            f"<@{offer['proposer']}> got {describe_side(offer['want'])}."
+        )
+
+    @discord.ui.button(label="Decline", style=discord.ButtonStyle.red)
+    async def decline(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await call_off_trade(interaction, self.offer_id, DECLINED)
+
+    @discord.ui.button(label="Cancel", style=discord.ButtonStyle.secondary)
+    async def withdraw(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await call_off_trade(interaction, self.offer_id, TRADE_CANCELLED)
+
+async def call_off_trade(interaction: discord.Interaction, offer_id, result):
+    try:
+        await trade_desk.call_off(offer_id, result, interaction.user.id)
+    except TradeError as e:
+        await interaction.response.send_message(str(e), ephemeral=True)
+        return
+    verb = "declined" if result == DECLINED else "cancelled"
+    await interaction.response.send_message(f"Trade offer #{offer_id} {verb}. Any escrowed gold was returned.",
+                                            ephemeral=True)
+
+class TradeConfirmView(discord.ui.View):
+    """The proposer's own confirmation, shown only to them before anything goes into escrow."""
+
+    def __init__(self, proposer, recipient, give_characters, give_gold, want_characters, want_gold):
+        super().__init__(timeout=120)
+        self.proposal = dict(
+            proposer=proposer, recipient=recipient, give_characters=give_characters, give_gold=give_gold,
+            want_characters=want_characters, want_gold=want_gold
+        )
 
-        # Check if the user has enough gold
-        sale_price = character["sale_price"]
-        if gold_data.get(user_id, 0) < sale_price:
-            await interaction.response.send_message("You do not have enough gold to buy this character.", ephemeral=True)
+    @discord.ui.button(label="Send offer", style=discord.ButtonStyle.green)
+    async def confirm(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.stop()
+        await interaction.response.edit_message(content="Offer sent.", view=None)
+        await send_trade_offer(interaction, **self.proposal)
+
+    @discord.ui.button(label="Never mind", style=discord.ButtonStyle.secondary)
+    async def abandon(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.stop()
+        await interaction.response.edit_message(content="Offer discarded.", embed=None, view=None)
+
+async def send_trade_offer(interaction: discord.Interaction, **proposal):
+    """Escrow the proposer's side and post the offer for the recipient (the interaction must already be answered)."""
+    for name in proposal["give_characters"]:
+        busy = character_busy(name)
+        if busy:
+            await interaction.followup.send(busy, ephemeral=True)
             return
+    try:
+        offer = await trade_desk.propose(duration=TRADE_OFFER_HOURS * 3600, **proposal)
+    except InsufficientFunds:
+        await interaction.followup.send("You do not have enough gold for this offer.", ephemeral=True)
+        return
+    except TradeError as e:
+        await interaction.followup.send(str(e), ephemeral=True)
+        return
 
-        # Deduct gold from buyer and transfer ownership
-        seller_id = character["owner"]
-        gold_data[user_id] -= sale_price
-        gold_data[seller_id] = gold_data.get(seller_id, 0) + sale_price
+    view = TradeOfferView(offer["id"])
+    trade_views[offer["id"]] = view
+    message = await interaction.followup.send(
+        content=f"<@{offer['recipient']}>, you have a trade offer!", embed=trade_embed(offer), view=view, wait=True
+    )
+    trade_desk.attach_message(offer["id"], message.channel.id, message.id)
+
+def track_trade(offer_id, message_id):
+    view = TradeOfferView(offer_id)
+    bot.add_view(view, message_id=message_id)
+    trade_views[offer_id] = view
+
+def restore_trades():
+    """Finish interrupted swaps and refunds, schedule expiry and re-attach offer buttons (safe to repeat)."""
+    trade_desk.recover()
+    for offer_id, offer in list(trade_desk.offers.items()):
+        if ("trade", offer_id) not in timers:
+            trade_desk.schedule(offer_id)
+        if offer["message_id"] and offer_id not in trade_views:
+            track_trade(offer_id, offer["message_id"])
+
+def parse_character_list(text):
+    return [name.strip() for name in (text or "").split(",") if name.strip()]
+
+@bot.tree.command(name="trade", description="Offer another user characters and/or gold for theirs.")
+async def trade(interaction: discord.Interaction, user: discord.User, give: str = None, give_gold: int = 0,
+                want: str = None, want_gold: int = 0):
+    """
+    Propose a trade. You confirm it first; then it waits for the other user to accept.
 
-        character["owner"] = interaction.user.id
-        del character["sale_price"]  # Remove sale status
-        save_characters()
-        save_gold_data()
+    Args:
+        interaction: The interaction object from Discord.
+        user: Who you want to trade with.
+        give: Your characters to trade away, separated by commas.
+        give_gold: Gold you add to your side.
+        want: Their characters you want, separated by commas.
+        want_gold: Gold you want from them.
+    """
+    proposal = dict(
+        proposer=interaction.user.id, recipient=user.id, give_characters=parse_character_list(give),
+        give_gold=give_gold, want_characters=parse_character_list(want), want_gold=want_gold
+    )
+    if user.bot:
+        await interaction.response.send_message("Bots don't trade.", ephemeral=True)
+        return
+    # Run the checks now, so mistakes show up before the confirmation
+    try:
+        trade_desk.validate(**proposal)
+    except TradeError as e:
+        await interaction.response.send_message(str(e), ephemeral=True)
+        return
+    for name in proposal["give_characters"]:
+        busy = character_busy(name)
+        if busy:
+            await interaction.response.send_message(busy, ephemeral=True)
+            return
+
+    preview = {
+        "id": "?",
+        "proposer": interaction.user.id,
+        "recipient": user.id,
+        "expires_at": time.time() + TRADE_OFFER_HOURS * 3600,
+        "give": {"characters": proposal["give_characters"], "gold": give_gold},
+        "want": {"characters": proposal["want_characters"], "gold": want_gold},
+    }
+
+    await interaction.response.send_message(
+        "Send this offer? Your side goes into escrow until it is accepted, declined or expires.",
+        embed=trade_embed(preview), view=TradeConfirmView(**proposal), ephemeral=True
+    )
+
+@bot.tree.command(name="givechar", description="Give a character to another user.")
+@app_commands.autocomplete(character_name=character_name_autocomplete)
+async def give_character(interaction: discord.Interaction, character_name: str, recipient: discord.User):
+    """Offer a character to another user as a gift; it's theirs once they accept."""
+    character = characters.get(character_name)
+
+    # Check if the character exists
+    if not character:
+        await interaction.response.send_message(f"Character '{character_name}' not found.", ephemeral=True)
+        return
 
-        await interaction.response.send_message(f"Congratulations! You have purchased '{self.character_name}'.")
+    # Check if the user owns the character
+    if character.owner != interaction.user.id:
+        await interaction.response.send_message(f"You do not own the character '{character_name}'.", ephemeral=True)
+        return
 
+    await interaction.response.send_message(f"Offering '{character_name}' to {recipient.mention}.", ephemeral=True)
+    await send_trade_offer(
+        interaction, proposer=interaction.user.id, recipient=recipient.id, give_characters=[character_name],
+        give_gold=0, want_characters=[], want_gold=0
+    )
 
+@bot.tree.command(name="trades", description="List your open trade offers.")
+async def list_trades(interaction: discord.Interaction):
+    offers = trade_desk.offers_for(interaction.user.id)
+    lines = [
+        f"**#{offer['id']}** <@{offer['proposer']}> → <@{offer['recipient']}>: gives {describe_side(offer['give'])}, "
+        f"wants {describe_side(offer['want'])} · expires <t:{int(offer['expires_at'])}:R>"
+        for offer in offers[:15]
+    ]
+    embed = discord.Embed(
+        title="🤝 Your Trade Offers",
+        description="\n".join(lines) or "You have no open trade offers.",
+        color=discord.Color.teal()
+    )
+    if len(offers) > 15:
+        embed.set_footer(text=f"Showing 15 of {len(offers)}")
+    await interaction.response.send_message(embed=embed, ephemeral=True)
 
 
 
@@ -1765,11 +2926,35 @@ class BuyView(discord.ui.View):
 
 # Some syncing stuft idk what its for tbh
 async def setup_hook():
-    await bot.tree.sync()
+    global metrics_server
+    startup.lap("commands")
+    await http_client.start()
+    with startup.phase("command sync"), metrics.timer("command_sync_seconds"):
+        await bot.tree.sync()
     print("Command tree synced.")
+    if METRICS_PORT and metrics_server is None:
+        metrics_server = await start_metrics_server(metrics, METRICS_HOST, METRICS_PORT)
+        print(f"Serving metrics on http://{METRICS_HOST}:{METRICS_PORT}/metrics")
 
 bot.setup_hook = setup_hook
 
+# Close the shared HTTP client along with the bot
+bot_close = bot.close
+
+async def close():
+    loop_lag.stop()
+    timers.stop()
+    if metrics_server is not None:
+        await metrics_server.cleanup()
+    await http_client.close()
+    await bot_close()
+
+bot.close = close
+
 
 # Start the bot with your token from the environment variable
 bot.run(DISCORD_TOKEN)
+
+# bot.run() returns once the bot has shut down: write anything still queued
+persistence.flush_sync()
+store.close()
@@ -0,0 +1,119 @@
+"""
+Bounded in-memory LRU cache with per-entry expiry.
+
+Used for Wikipedia summaries and image search results, keyed by the
+normalized query. Misses that are known to be final ("may refer to" pages,
+404s, searches with no results) are cached as negative entries with a
+shorter TTL, so they don't hit the network again either. A cache can be
+dumped to and restored from a JSON-compatible list for persistence.
+"""
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+
+def normalize_key(query):
+    """Case- and whitespace-insensitive cache key."""
+    return " ".join(query.casefold().split())
+
+
+class TTLCache:
+    def __init__(self, maxsize=512, ttl=86400, negative_ttl=3600, on_change=None):
+        """
+        Args:
+            maxsize: Entries kept before the least recently used one is evicted.
+            ttl: Seconds a result is kept.
+            negative_ttl: Seconds a "no result" entry is kept.
+            on_change: Called after every set or purge (used to queue a save).
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.on_change = on_change
+        self._entries = OrderedDict()  # key -> (expires_at, value); value None = negative entry
+
+        # Stats
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, query):
+        """
+        Return the cached value, None for a negative entry, or MISSING.
+        """
+        key = normalize_key(query)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return MISSING
+        if entry[0] <= time.time():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return MISSING
+        self._entries.move_to_end(key)
+        if entry[1] is None:
+            self.negative_hits += 1
+        else:
+            self.hits += 1
+        return entry[1]
+
+    def set(self, query, value, ttl=None):
+        key = normalize_key(query)
+        self._entries[key] = (time.time() + (ttl or self.ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        if self.on_change is not None:
+            self.on_change()
+
+    def set_negative(self, query):
+        """Remember that `query` has no result."""
+        self.set(query, None, ttl=self.negative_ttl)
+
+    def purge(self, query=None):
+        """Drop one entry, or everything when no query is given. Returns how many were dropped."""
+        if query is None:
+            count = len(self._entries)
+            self._entries.clear()
+        else:
+            count = 1 if self._entries.pop(normalize_key(query), None) is not None else 0
+        if count and self.on_change is not None:
+            self.on_change()
+        return count
+
+    def keys(self):
+        """Keys from most to least recently used."""
+        return list(reversed(self._entries))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def dump(self):
+        now = time.time()
+        return [[key, expires_at, value] for key, (expires_at, value) in self._entries.items() if expires_at > now]
+
+    def load(self, entries):
+        now = time.time()
+        for key, expires_at, value in entries:
+            if expires_at > now:
+                self._entries[key] = (expires_at, value)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.negative_hits) / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -0,0 +1,56 @@
+"""
+Button-based image carousel shared by /view, /spawn and hunting ground posts.
+
+Every embed is built up front, so a ⬅️/➡️ press is answered with a single
+interaction.response.edit_message() call. With reactions each step cost an
+edit plus a remove_reaction, and setup cost two or three add_reaction calls.
+
+The view never times out by itself and all of its buttons have fixed custom
+IDs, so it can be re-attached to a message with bot.add_view(view,
+message_id=...) after a restart. Expiry is handled by the bot's timers.
+"""
+import discord
+
+
+class CarouselView(discord.ui.View):
+    def __init__(self, embeds, index=0, on_claim=None, on_navigate=None):
+        """
+        Args:
+            embeds: One embed per image (or a single embed if there are none).
+            index: The embed to start on.
+            on_claim: Coroutine `on_claim(interaction, view)`; adds a ✨ Claim button.
+            on_navigate: Called as `on_navigate(interaction, index)` after each page turn.
+        """
+        super().__init__(timeout=None)
+        self.embeds = embeds
+        self.index = index % len(embeds)
+        self.on_claim = on_claim
+        self.on_navigate = on_navigate
+
+        if len(embeds) < 2:
+            self.remove_item(self.previous)
+            self.remove_item(self.next)
+        if on_claim is None:
+            self.remove_item(self.claim)
+
+    @property
+    def embed(self):
+        return self.embeds[self.index]
+
+    async def _turn(self, interaction, step):
+        self.index = (self.index + step) % len(self.embeds)
+        if self.on_navigate is not None:
+            self.on_navigate(interaction, self.index)
+        await interaction.response.edit_message(embed=self.embed)
+
+    @discord.ui.button(emoji="⬅️", style=discord.ButtonStyle.secondary, custom_id="carousel:previous")
+    async def previous(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._turn(interaction, -1)
+
+    @discord.ui.button(emoji="➡️", style=discord.ButtonStyle.secondary, custom_id="carousel:next")
+    async def next(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._turn(interaction, 1)
+
+    @discord.ui.button(emoji="✨", label="Claim", style=discord.ButtonStyle.green, custom_id="carousel:claim")
+    async def claim(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.on_claim(interaction, self)
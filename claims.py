@@ -0,0 +1,103 @@
+"""
+Claim arbitration for spawned characters.
+
+A character can be on screen in several spawns at once (a /spawn and a
+hunting ground post, say) and many people can press ✨ at the same moment.
+ClaimService makes every claim a compare-and-set on the owner, so exactly one
+claim wins. The check and the set never await, so on the single-threaded
+event loop no other claim can run in between and no lock is needed. Once a
+character is claimed, every other open spawn of it is resolved and later
+presses on those spawns are rejected.
+"""
+from collections import namedtuple
+
+from indexes import ALIVE
+
+# ok: whether this claim won. reason: "claimed", "already_claimed",
+# "resolved", "missing" or "dead". resolved_spawns: other spawns of the same
+# character that this claim closed (the caller should remove their buttons).
+ClaimResult = namedtuple("ClaimResult", "ok reason owner resolved_spawns")
+
+
+class ClaimService:
+    def __init__(self, characters, on_claimed):
+        """
+        Args:
+            characters: The characters dict.
+            on_claimed: Called with the character name after a successful claim
+                (used to save the character).
+        """
+        self.characters = characters
+        self.on_claimed = on_claimed
+        self._open_spawns = {}  # spawn_id -> name
+        self._spawns_by_name = {}  # name -> set of spawn_ids
+
+        # Stats
+        self.attempts = 0
+        self.wins = 0
+        self.rejections = {}
+
+    #---------------- open spawns ----------------#
+
+    def open_spawn(self, spawn_id, name):
+        self._open_spawns[spawn_id] = name
+        self._spawns_by_name.setdefault(name, set()).add(spawn_id)
+
+    def close_spawn(self, spawn_id):
+        name = self._open_spawns.pop(spawn_id, None)
+        if name is None:
+            return
+        spawn_ids = self._spawns_by_name.get(name)
+        if spawn_ids is not None:
+            spawn_ids.discard(spawn_id)
+            if not spawn_ids:
+                del self._spawns_by_name[name]
+
+    def is_open(self, spawn_id):
+        return spawn_id in self._open_spawns
+
+    #---------------- claiming ----------------#
+
+    def claim(self, name, user_id, spawn_id=None):
+        """
+        Try to make `user_id` the owner of `name`. Returns a ClaimResult.
+
+        Synchronous on purpose: keep awaits out of it so the compare-and-set
+        stays atomic.
+        """
+        self.attempts += 1
+        result = self._compare_and_set(name, user_id, spawn_id)
+        if result.ok:
+            self.wins += 1
+        else:
+            self.rejections[result.reason] = self.rejections.get(result.reason, 0) + 1
+        return result
+
+    def _compare_and_set(self, name, user_id, spawn_id):
+        character = self.characters.get(name)
+        if spawn_id is not None and not self.is_open(spawn_id):
+            owner = character.owner if character else None
+            return ClaimResult(False, "resolved", owner, [])
+        if character is None:
+            return ClaimResult(False, "missing", None, [])
+        if character.owner is not None:
+            return ClaimResult(False, "already_claimed", character.owner, [])
+        if character.status is not ALIVE:
+            return ClaimResult(False, "dead", None, [])
+
+        character.owner = user_id
+        self.on_claimed(name)
+
+        # Every spawn of this character is now resolved, this one included
+        resolved = [other for other in self._spawns_by_name.get(name, ()) if other != spawn_id]
+        for other in list(self._spawns_by_name.get(name, ())):
+            self.close_spawn(other)
+        return ClaimResult(True, "claimed", user_id, resolved)
+
+    def stats(self):
+        return {
+            "attempts": self.attempts,
+            "wins": self.wins,
+            "rejections": dict(self.rejections),
+            "open_spawns": len(self._open_spawns),
+        }
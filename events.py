@@ -0,0 +1,61 @@
+"""
+A tiny synchronous publish/subscribe hub.
+
+Mutations publish events (for example "character_changed" with the
+character's name) and the channel views subscribe to them instead of
+polling every character on a timer.
+"""
+import asyncio
+import time
+
+
+class EventBus:
+    def __init__(self):
+        self._subscribers = {}
+
+    def subscribe(self, event, callback):
+        self._subscribers.setdefault(event, []).append(callback)
+
+    def publish(self, event, *args):
+        for callback in self._subscribers.get(event, ()):
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"Error in '{event}' subscriber {callback.__name__}: {e}")
+
+
+class CoalescingTask:
+    """
+    Run an async job shortly after trigger() is called.
+
+    Triggers that arrive while the job is waiting are absorbed into that run;
+    triggers that arrive while it is running cause exactly one more run, so
+    no change is ever left unpublished.
+    """
+
+    def __init__(self, job, delay=0, on_run=None):
+        """on_run: optional `on_run(seconds, ok)` called after each run of the job."""
+        self.job = job
+        self.delay = delay
+        self.on_run = on_run
+        self._pending = False
+        self._task = None
+
+    def trigger(self):
+        self._pending = True
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while self._pending:
+            await asyncio.sleep(self.delay)
+            self._pending = False
+            start = time.perf_counter()
+            ok = False
+            try:
+                await self.job()
+                ok = True
+            except Exception as e:
+                print(f"Error in {self.job.__name__}: {e}")
+            if self.on_run is not None:
+                self.on_run(time.perf_counter() - start, ok)
@@ -0,0 +1,106 @@
+"""
+One pooled HTTP client for every outbound call the bot makes.
+
+A single aiohttp ClientSession lives for the lifetime of the bot, so
+Wikipedia and image-search calls reuse kept-alive connections instead of
+paying a new TCP + TLS handshake per command. The connector caps total and
+per-host concurrency; every request has a timeout and is retried with
+exponential backoff on connection errors and retryable status codes.
+"""
+import asyncio
+import random
+from collections import namedtuple
+from contextlib import asynccontextmanager
+
+import aiohttp
+
+HttpResponse = namedtuple("HttpResponse", "status headers data")
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class HttpClient:
+    def __init__(self, limit=100, limit_per_host=8, timeout=15, retries=3, backoff=0.5, headers=None):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = aiohttp.ClientTimeout(total=timeout, sock_connect=min(timeout, 5))
+        self.retries = retries
+        self.backoff = backoff
+        self.headers = headers or {}
+        self.session = None
+
+    async def start(self):
+        """Create the session (call from setup_hook). Safe to call more than once."""
+        if self.session is not None and not self.session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=60,
+            ttl_dns_cache=300,
+        )
+        self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout, headers=self.headers)
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    def _delay(self, attempt, response=None):
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return float(retry_after)
+        return self.backoff * (2 ** attempt) * (0.5 + random.random())
+
+    @asynccontextmanager
+    async def open(self, method, url, **kwargs):
+        """
+        Open a request and yield the live aiohttp response, e.g. to stream the body.
+
+        Connection errors, timeouts and retryable statuses before the body is
+        read are retried; the final response is yielded whatever its status.
+        """
+        if self.session is None:
+            await self.start()
+        attempt = 0
+        while True:
+            try:
+                response = await self.session.request(method, url, **kwargs)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt >= self.retries:
+                    raise
+                await asyncio.sleep(self._delay(attempt))
+                attempt += 1
+                continue
+
+            if response.status in RETRY_STATUSES and attempt < self.retries:
+                delay = self._delay(attempt, response)
+                response.release()
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+
+            try:
+                yield response
+            finally:
+                response.release()
+            return
+
+    async def fetch(self, method, url, read="text", **kwargs):
+        """
+        Make a request and read the whole body.
+
+        Args:
+            read: "text", "json" or "bytes".
+        Returns:
+            HttpResponse(status, headers, data).
+        """
+        async with self.open(method, url, **kwargs) as response:
+            if read == "json":
+                data = await response.json(content_type=None)
+            elif read == "bytes":
+                data = await response.read()
+            else:
+                data = await response.text()
+            return HttpResponse(response.status, response.headers, data)
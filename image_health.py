@@ -0,0 +1,296 @@
+"""
+Health checks for the image URLs stored on characters.
+
+Every URL gets a HEAD request (or a one-byte ranged GET when the host doesn't
+answer HEAD properly), with bounded total concurrency and a per-host limit
+on parallel requests and request rate. The result is recorded per URL
+(status, content type, size, when it was checked) and URLs checked recently
+are skipped on the next run. Only URLs that are definitely gone (404/410,
+or an HTML page where an image should be) count as dead; timeouts, 403s
+and server errors are recorded but never pruned.
+
+Can also be run on its own, e.g. against a local mock server:
+
+    python image_health.py characters.json --base-url http://127.0.0.1:8080 --report
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from indexes import normalize_images
+
+OK = "ok"
+DEAD = "dead"
+ERROR = "error"
+
+DEAD_STATUSES = frozenset({404, 410})
+# Hosts that answer HEAD with these are asked again with a ranged GET
+HEAD_FALLBACK_STATUSES = frozenset({400, 403, 405, 501})
+
+
+def character_image_urls(characters):
+    """Map every http(s) image URL to the names of the characters that use it."""
+    urls = {}
+    for name, char in characters.items():
+        for url in normalize_images(char.get("images", [])):
+            if url.startswith("http"):
+                urls.setdefault(url, set()).add(name)
+    return urls
+
+
+def prune_images(characters, dead_urls):
+    """
+    Remove dead URLs from the characters' image lists, one image ref each
+    (the lists are normalized first, as the bot stores them).
+
+    Returns {name: number of URLs removed} for every character that changed.
+    """
+    dead_urls = set(dead_urls)
+    pruned = {}
+    for name, char in characters.items():
+        images = normalize_images(char.get("images", []))
+        kept = [ref for ref in images if ref not in dead_urls]
+        if len(kept) < len(images):
+            char["images"] = kept
+            pruned[name] = len(images) - len(kept)
+    return pruned
+
+
+class _HostLimiter:
+    """At most `concurrency` requests in flight to a host, started at least `interval` seconds apart."""
+
+    def __init__(self, concurrency, interval):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.interval = interval
+        self.next_start = 0.0
+
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+        now = asyncio.get_running_loop().time()
+        wait = self.next_start - now
+        self.next_start = max(now, self.next_start) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def __aexit__(self, *exc_info):
+        self.semaphore.release()
+
+
+class ImageHealthChecker:
+    def __init__(self, http, concurrency=16, per_host=2, host_interval=0.25, recheck_after=7 * 86400,
+                 timeout=10, base_url=None):
+        """
+        Args:
+            http: The shared HttpClient.
+            concurrency: Requests in flight across all hosts.
+            per_host: Requests in flight to one host.
+            host_interval: Minimum seconds between two requests to one host.
+            recheck_after: URLs checked more recently than this are skipped.
+            base_url: Send every request to `base_url/<host>/<path>` instead
+                (for testing against a mock server).
+        """
+        self.http = http
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.host_interval = host_interval
+        self.recheck_after = recheck_after
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.base_url = base_url.rstrip("/") if base_url else None
+        self.results = {}  # url -> record
+        self.running = False
+        self.last_run = None
+
+    def _target(self, url):
+        if self.base_url is None:
+            return url
+        parts = urlsplit(url)
+        return f"{self.base_url}/{parts.netloc}{parts.path or '/'}" + (f"?{parts.query}" if parts.query else "")
+
+    async def _probe(self, url):
+        target = self._target(url)
+        async with self.http.open("HEAD", target, allow_redirects=True, timeout=self.timeout) as response:
+            if response.status not in HEAD_FALLBACK_STATUSES and response.headers.get("Content-Type"):
+                return response.status, response.headers
+        async with self.http.open(
+            "GET", target, allow_redirects=True, timeout=self.timeout, headers={"Range": "bytes=0-0"}
+        ) as response:
+            return response.status, response.headers
+
+    async def check(self, url):
+        """Check one URL now and record the result."""
+        record = {"status": None, "content_type": None, "size": None, "checked_at": time.time()}
+        try:
+            status, headers = await self._probe(url)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            record.update(state=ERROR, error=type(e).__name__)
+            self.results[url] = record
+            return record
+
+        content_type = (headers.get("Content-Type") or "").split(";")[0].strip().lower() or None
+        size = headers.get("Content-Length")
+        content_range = headers.get("Content-Range", "")
+        if "/" in content_range and content_range.rsplit("/", 1)[1].isdigit():
+            size = content_range.rsplit("/", 1)[1]  # "bytes 0-0/12345": the full size
+
+        if status in DEAD_STATUSES or (status in (200, 206) and content_type and content_type.startswith("text/")):
+            state = DEAD
+        elif status in (200, 206):
+            state = OK
+        else:
+            state = ERROR
+        record.update(
+            status=status,
+            content_type=content_type,
+            size=int(size) if size and str(size).isdigit() else None,
+            state=state,
+        )
+        self.results[url] = record
+        return record
+
+    def is_fresh(self, url, now=None):
+        record = self.results.get(url)
+        return record is not None and (now or time.time()) - record["checked_at"] < self.recheck_after
+
+    async def check_many(self, urls, force=False):
+        """
+        Check every URL that wasn't checked recently (all of them if `force`).
+
+        Returns {"checked", "skipped", "elapsed"}.
+        """
+        start = time.perf_counter()
+        now = time.time()
+        urls = list(dict.fromkeys(urls))
+        pending = urls if force else [url for url in urls if not self.is_fresh(url, now)]
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        hosts = {}
+
+        async def run(url):
+            host = urlsplit(url).netloc
+            limiter = hosts.get(host)
+            if limiter is None:
+                limiter = hosts[host] = _HostLimiter(self.per_host, self.host_interval)
+            async with limiter:
+                async with semaphore:
+                    await self.check(url)
+
+        self.running = True
+        try:
+            await asyncio.gather(*(run(url) for url in pending))
+        finally:
+            self.running = False
+            self.last_run = time.time()
+        return {"checked": len(pending), "skipped": len(urls) - len(pending), "elapsed": time.perf_counter() - start}
+
+    def dead_urls(self, urls=None):
+        urls = self.results if urls is None else urls
+        return [url for url in urls if self.results.get(url, {}).get("state") == DEAD]
+
+    def summary(self, urls=None):
+        """Count the recorded results by state (only for `urls` if given)."""
+        counts = {OK: 0, DEAD: 0, ERROR: 0, "unchecked": 0}
+        for url in (self.results if urls is None else urls):
+            record = self.results.get(url)
+            counts[record["state"] if record else "unchecked"] += 1
+        return counts
+
+    def dump(self):
+        return self.results
+
+    def load(self, results):
+        self.results.update(results)
+
+
+#---------------- command line ----------------#
+
+def _load_characters(path):
+    if path.endswith(".db"):
+        from storage import Store
+        store = Store(path)
+        return store, store.load_characters()
+    with open(path, "r", encoding="utf-8") as f:
+        return None, json.load(f)
+
+
+def _save_characters(path, store, characters, names):
+    from persistence import atomic_write_json
+    from storage import encode
+    if store is not None:
+        store.write_characters({name: encode(characters[name]) for name in names})
+    else:
+        atomic_write_json(path, json.dumps(characters, indent=4))
+
+
+async def _main(args):
+    from http_client import HttpClient
+
+    store, characters = _load_characters(args.source)
+    urls = character_image_urls(characters)
+    if args.limit:
+        urls = dict(list(urls.items())[:args.limit])
+
+    http = HttpClient(limit=args.concurrency, limit_per_host=args.per_host, retries=1, timeout=args.timeout)
+    checker = ImageHealthChecker(
+        http,
+        concurrency=args.concurrency,
+        per_host=args.per_host,
+        host_interval=args.host_interval,
+        recheck_after=args.recheck_hours * 3600,
+        timeout=args.timeout,
+        base_url=args.base_url,
+    )
+    if os.path.exists(args.results):
+        with open(args.results, "r", encoding="utf-8") as f:
+            checker.load(json.load(f))
+
+    await http.start()
+    try:
+        run = await checker.check_many(urls, force=args.force)
+    finally:
+        await http.close()
+
+    from persistence import atomic_write_json
+    atomic_write_json(args.results, json.dumps(checker.dump()))
+
+    counts = checker.summary(urls)
+    print(f"Checked {run['checked']} URL(s) in {run['elapsed']:.1f}s, skipped {run['skipped']} checked recently.")
+    print(", ".join(f"{state}: {count}" for state, count in counts.items()))
+
+    dead = checker.dead_urls(urls)
+    if args.report:
+        for url in dead:
+            record = checker.results[url]
+            print(f"DEAD {record['status']} {record['content_type'] or '-'} {url} ({', '.join(sorted(urls[url]))})")
+
+    if args.prune and dead:
+        pruned = prune_images(characters, dead)
+        _save_characters(args.source, store, characters, pruned)
+        print(f"Pruned {sum(pruned.values())} dead URL(s) from {len(pruned)} character(s).")
+    if store is not None:
+        store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the image URLs stored on characters.")
+    parser.add_argument("source", help="characters.json or the bot's .db file")
+    parser.add_argument("--results", default="image_health.json", help="Where check results are kept between runs")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--per-host", type=int, default=2)
+    parser.add_argument("--host-interval", type=float, default=0.25, help="Seconds between requests to one host")
+    parser.add_argument("--recheck-hours", type=float, default=168, help="Skip URLs checked more recently than this")
+    parser.add_argument("--timeout", type=float, default=10)
+    parser.add_argument("--force", action="store_true", help="Check every URL, even recently checked ones")
+    parser.add_argument("--limit", type=int, help="Only check the first N URLs")
+    parser.add_argument("--base-url", help="Send requests to BASE_URL/<host>/<path> (e.g. a local mock server)")
+    parser.add_argument("--report", action="store_true", help="List every dead URL")
+    parser.add_argument("--prune", action="store_true", help="Remove dead URLs from the characters")
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""
+Content-addressed local image store.
+
+Image bytes are stored once under images/objects/, named by their SHA-256,
+so the same picture uploaded twice or referenced by several characters is
+kept once. The index remembers which source (URL or old local path) maps to
+which object, so nothing is downloaded or hashed twice. Images referenced
+by URL are downloaded into the mirror too, so they survive the link going
+away; until such an image has a CDN URL of its own, embeds that can't attach
+anything fall back to the URL it was downloaded from.
+
+Local images have to be attached to a message to be shown. After the first
+upload the Discord CDN URL of the attachment is remembered and later embeds
+point at it instead of re-uploading the bytes. Discord CDN URLs are signed
+and expire (the `ex` query parameter), so an expired one is replaced on the
+next upload. Originals over THUMBNAIL_OVER bytes are attached as a
+size-limited JPEG thumbnail when Pillow is installed. Pillow is only
+imported the first time a thumbnail is needed.
+
+Hashing, file reads and writes and thumbnails run in a worker thread so a
+large image doesn't stall the event loop; the index itself is only changed
+on the loop.
+"""
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import aiohttp
+
+MAX_DOWNLOAD_BYTES = 16 * 2**20
+THUMBNAIL_SIZE = (1280, 1280)
+THUMBNAIL_OVER = 2 * 2**20
+CDN_EXPIRY_MARGIN = 3600  # Don't hand out a CDN URL that expires within the hour
+
+SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"GIF87a", ".gif"),
+    (b"GIF89a", ".gif"),
+)
+
+
+class MirrorError(Exception):
+    pass
+
+
+_pillow = None
+
+
+def _load_pillow():
+    """PIL.Image, or None if Pillow isn't installed (thumbnails are optional)."""
+    global _pillow
+    if _pillow is None:
+        try:
+            from PIL import Image
+        except ImportError:
+            Image = False
+        _pillow = Image
+    return _pillow or None
+
+
+def image_extension(data):
+    """File extension for the image format of `data`, or None if it isn't an image."""
+    for signature, ext in SIGNATURES:
+        if data.startswith(signature):
+            return ext
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return ".webp"
+    return None
+
+
+def cdn_url_expiry(url):
+    """Expiry timestamp of a signed Discord CDN URL (None if it doesn't expire)."""
+    ex = parse_qs(urlsplit(url).query).get("ex")
+    try:
+        return int(ex[0], 16) if ex else None
+    except ValueError:
+        return None
+
+
+class ImageMirror:
+    def __init__(self, root, http=None, on_change=None):
+        """
+        Args:
+            root: Folder the objects, thumbnails and index live in.
+            http: The shared HttpClient (needed for add_url).
+            on_change: Called whenever the index changes (used to queue a save).
+        """
+        self.root = root
+        self.http = http
+        self.on_change = on_change
+        self.index_path = os.path.join(root, "index.json")
+        self.sources = {}  # source URL or path -> digest
+        self.objects = {}  # digest -> {"ext", "size", "cdn_url", "cdn_expires", "url" (if downloaded)}
+
+        # Stats
+        self.cdn_hits = 0
+        self.uploads = 0
+        self.downloads = 0
+
+    #---------------- storing ----------------#
+
+    def object_path(self, digest):
+        return os.path.join(self.root, "objects", digest[:2], digest + self.objects[digest]["ext"])
+
+    def thumbnail_path(self, digest):
+        return os.path.join(self.root, "thumbnails", digest[:2], digest + ".jpg")
+
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change()
+
+    def _write_object(self, data):
+        """
+        Hash image bytes and write them to their object file unless it exists.
+        Returns (digest, ext). Doesn't touch the index, so it can run in a
+        worker thread.
+        """
+        ext = image_extension(data)
+        if ext is None:
+            raise MirrorError("Not a PNG, JPEG, GIF or WebP image.")
+        digest = hashlib.sha256(data).hexdigest()
+        path = os.path.join(self.root, "objects", digest[:2], digest + ext)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return digest, ext
+
+    def _read_object(self, path):
+        with open(path, "rb") as f:
+            return self._write_object(f.read())
+
+    def _index_object(self, digest, ext, size, source=None):
+        if digest not in self.objects:
+            self.objects[digest] = {"ext": ext, "size": size, "cdn_url": None, "cdn_expires": None}
+        if source is not None:
+            self.sources[source] = digest
+        self._changed()
+        return digest
+
+    async def add_bytes(self, data, source=None):
+        """Store image bytes (once) and return their digest."""
+        digest, ext = await asyncio.to_thread(self._write_object, data)
+        return self._index_object(digest, ext, len(data), source)
+
+    async def add_url(self, url):
+        """
+        Download `url` into the mirror (only the first time it's seen) and return the digest.
+
+        Raises MirrorError if the download fails or isn't an image.
+        """
+        digest = self.sources.get(url)
+        if digest is not None and digest in self.objects:
+            return digest
+
+        try:
+            async with self.http.open("GET", url) as response:
+                if response.status != 200:
+                    raise MirrorError(f"Download failed with status code {response.status}.")
+                if (response.content_length or 0) > MAX_DOWNLOAD_BYTES:
+                    raise MirrorError("Image is too large.")
+                data = bytearray()
+                async for chunk in response.content.iter_chunked(65536):
+                    data += chunk
+                    if len(data) > MAX_DOWNLOAD_BYTES:
+                        raise MirrorError("Image is too large.")
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            raise MirrorError(f"Download failed ({type(e).__name__}).") from e
+        self.downloads += 1
+        digest = await self.add_bytes(bytes(data), source=url)
+        self.objects[digest].setdefault("url", url)
+        return digest
+
+    async def add_attachment(self, attachment):
+        """Store a discord.Attachment and remember its CDN URL. Returns the digest."""
+        if attachment.size > MAX_DOWNLOAD_BYTES:
+            raise MirrorError("Image is too large.")
+        digest = await self.add_bytes(await attachment.read(), source=attachment.url)
+        self.remember_cdn_url(digest, attachment.url)
+        return digest
+
+    def digest_for(self, ref):
+        """
+        Digest of a stored image reference (mirror path or old local file), or
+        None if it isn't in the mirror (yet: see add_file and import_file).
+        """
+        digest = self.sources.get(ref)
+        if digest is not None and digest in self.objects:
+            return digest
+        stem = os.path.splitext(os.path.basename(ref))[0]
+        return stem if stem in self.objects else None
+
+    async def add_file(self, ref):
+        """Digest of `ref`, adding an old local file to the mirror on first sight. None if it isn't an image."""
+        digest = self.digest_for(ref)
+        if digest is not None or not os.path.isfile(ref):
+            return digest
+        try:
+            digest, ext = await asyncio.to_thread(self._read_object, ref)
+        except (MirrorError, OSError):
+            return None
+        return self._index_object(digest, ext, os.path.getsize(ref), ref)
+
+    def import_file(self, ref):
+        """add_file for startup, before the event loop runs."""
+        digest = self.digest_for(ref)
+        if digest is not None or not os.path.isfile(ref):
+            return digest
+        try:
+            digest, ext = self._read_object(ref)
+        except (MirrorError, OSError):
+            return None
+        return self._index_object(digest, ext, os.path.getsize(ref), ref)
+
+    #---------------- showing ----------------#
+
+    def cdn_url(self, digest):
+        """The remembered CDN URL for an object, if it's still valid."""
+        entry = self.objects.get(digest)
+        if not entry or not entry["cdn_url"]:
+            return None
+        if entry["cdn_expires"] is not None and entry["cdn_expires"] - CDN_EXPIRY_MARGIN <= time.time():
+            return None
+        self.cdn_hits += 1
+        return entry["cdn_url"]
+
+    def remember_cdn_url(self, digest, url):
+        entry = self.objects.get(digest)
+        if entry is None:
+            return
+        entry["cdn_url"] = url
+        entry["cdn_expires"] = cdn_url_expiry(url)
+        self._changed()
+
+    def embed_url(self, ref):
+        """A URL an embed can show for `ref` without attaching anything, or None."""
+        if ref.startswith("http"):
+            return ref
+        digest = self.digest_for(ref)
+        return self.cdn_url(digest) if digest else None
+
+    def source_url(self, ref):
+        """The URL a mirrored image was downloaded from, or None."""
+        digest = self.digest_for(ref)
+        return self.objects[digest].get("url") if digest else None
+
+    async def attachment(self, digest):
+        """
+        (path, file name) to attach for an object: a thumbnail if the
+        original is large and Pillow is available, otherwise the original.
+        """
+        self.uploads += 1
+        entry = self.objects[digest]
+        if entry["size"] > THUMBNAIL_OVER and _load_pillow() is not None:
+            path = self.thumbnail_path(digest)
+            if os.path.exists(path) or await asyncio.to_thread(self._make_thumbnail, digest, path):
+                return path, digest[:16] + ".jpg"
+        return self.object_path(digest), digest[:16] + entry["ext"]
+
+    def _make_thumbnail(self, digest, path):
+        try:
+            with _load_pillow().open(self.object_path(digest)) as image:
+                image.thumbnail(THUMBNAIL_SIZE)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                image.convert("RGB").save(path, "JPEG", quality=85, optimize=True)
+            return True
+        except (OSError, ValueError):
+            return False
+
+    #---------------- persistence ----------------#
+
+    def dump(self):
+        return {"sources": self.sources, "objects": self.objects}
+
+    def load(self, data):
+        self.sources.update(data.get("sources", {}))
+        self.objects.update(data.get("objects", {}))
+
+    def stats(self):
+        return {
+            "objects": len(self.objects),
+            "sources": len(self.sources),
+            "bytes": sum(entry["size"] for entry in self.objects.values()),
+            "cdn_urls": sum(1 for entry in self.objects.values() if entry["cdn_url"]),
+            "cdn_hits": self.cdn_hits,
+            "uploads": self.uploads,
+            "downloads": self.downloads,
+        }
@@ -0,0 +1,81 @@
+"""
+Async client for the Serper image search API (google.serper.dev).
+
+Runs on the bot's shared HttpClient so a search never blocks the event
+loop. search_many() runs several queries at once with bounded parallelism.
+The endpoint URL is configurable so the client can be pointed at a local
+stub server. Results can be cached in a TTLCache; a query with no usable
+images is cached as a negative entry.
+"""
+import asyncio
+
+import aiohttp
+
+from cache import MISSING
+
+SERPER_IMAGES_URL = "https://google.serper.dev/images"
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+
+class ImageSearchError(Exception):
+    def __init__(self, status, message=None):
+        super().__init__(message or f"Image search failed with status code {status}.")
+        self.status = status
+
+
+class ImageSearch:
+    def __init__(self, http, api_key, url=SERPER_IMAGES_URL, concurrency=4, timeout=10, cache=None):
+        self.http = http
+        self.api_key = api_key
+        self.url = url
+        self.concurrency = concurrency
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.cache = cache
+
+    async def search(self, query):
+        """Return the image URLs (png/jpg only) found for `query`."""
+        if self.cache is not None:
+            cached = self.cache.get(query)
+            if cached is not MISSING:
+                return list(cached or [])
+
+        headers = {
+            "X-API-KEY": self.api_key or "",
+            "Content-Type": "application/json",
+        }
+        try:
+            response = await self.http.fetch(
+                "POST", self.url, read="json", json={"q": query}, headers=headers, timeout=self.timeout
+            )
+        except asyncio.TimeoutError:
+            raise ImageSearchError(None, "Image search timed out.")
+        if response.status != 200:
+            raise ImageSearchError(response.status)
+
+        images = (response.data or {}).get("images", [])
+        urls = [
+            img["imageUrl"]
+            for img in images
+            if img.get("imageUrl", "").endswith(IMAGE_EXTENSIONS)
+        ]
+        if self.cache is not None:
+            if urls:
+                self.cache.set(query, urls)
+            else:
+                self.cache.set_negative(query)
+        return list(urls)
+
+    async def search_many(self, queries):
+        """
+        Run several searches concurrently, at most `concurrency` at a time.
+
+        Returns {query: list of URLs or the exception that query raised}.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(query):
+            async with semaphore:
+                return await self.search(query)
+
+        results = await asyncio.gather(*(run(query) for query in queries), return_exceptions=True)
+        return dict(zip(queries, results))
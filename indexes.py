@@ -0,0 +1,267 @@
+"""
+In-memory secondary indexes over the characters dict.
+
+The indexes are updated incrementally whenever a character is saved, so
+spawning, /ownlist, the graveyard and name autocomplete never have to scan
+every character.
+"""
+import bisect
+import heapq
+import itertools
+import random
+
+from models import Status
+
+ALIVE = Status.ALIVE
+DECEASED = Status.DECEASED
+
+
+class RandomPool:
+    """A set that also supports O(1) random choice (list + position map)."""
+
+    def __init__(self):
+        self._items = []
+        self._positions = {}
+
+    def add(self, item):
+        if item in self._positions:
+            return
+        self._positions[item] = len(self._items)
+        self._items.append(item)
+
+    def discard(self, item):
+        position = self._positions.pop(item, None)
+        if position is None:
+            return
+        # Move the last item into the hole so removal stays O(1)
+        last = self._items.pop()
+        if position < len(self._items):
+            self._items[position] = last
+            self._positions[last] = position
+
+    def choice(self):
+        return random.choice(self._items) if self._items else None
+
+    def __contains__(self, item):
+        return item in self._positions
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+
+class CharacterIndex:
+    """owner -> names, status -> names and a random-sampleable unclaimed-alive pool."""
+
+    def __init__(self, on_owner_change=None):
+        """on_owner_change: optional `on_owner_change(owner)`, called when an owner gains or loses a character."""
+        self.by_owner = {}
+        self.by_status = {}
+        self.unclaimed_alive = RandomPool()
+        self.on_owner_change = on_owner_change
+        self._indexed = {}  # name -> (owner, status) as currently indexed
+
+    def build(self, characters):
+        for name, char in characters.items():
+            self.reindex(name, char)
+
+    def reindex(self, name, char):
+        """Bring the indexes in line with the character's current owner and status."""
+        owner = char.owner
+        status = char.status
+        previous = self._indexed.get(name)
+        if previous == (owner, status):
+            return
+        if previous is not None:
+            self._unlink(name, *previous)
+
+        self._indexed[name] = (owner, status)
+        if owner is not None:
+            self.by_owner.setdefault(owner, set()).add(name)
+        self.by_status.setdefault(status, set()).add(name)
+        if owner is None and status == ALIVE:
+            self.unclaimed_alive.add(name)
+
+        previous_owner = previous[0] if previous is not None else None
+        if self.on_owner_change is not None and previous_owner != owner:
+            for changed in (previous_owner, owner):
+                if changed is not None:
+                    self.on_owner_change(changed)
+
+    def discard(self, name):
+        """Forget a deleted (or renamed-away) character."""
+        previous = self._indexed.pop(name, None)
+        if previous is not None:
+            self._unlink(name, *previous)
+            if self.on_owner_change is not None and previous[0] is not None:
+                self.on_owner_change(previous[0])
+
+    def _unlink(self, name, owner, status):
+        if owner is not None:
+            owned = self.by_owner.get(owner)
+            if owned is not None:
+                owned.discard(name)
+                if not owned:
+                    del self.by_owner[owner]
+        names = self.by_status.get(status)
+        if names is not None:
+            names.discard(name)
+        self.unclaimed_alive.discard(name)
+
+    def owned_by(self, owner):
+        return self.by_owner.get(owner, set())
+
+    def with_status(self, status):
+        return self.by_status.get(status, set())
+
+    def random_unclaimed(self):
+        """Name of a random unclaimed, alive character, or None."""
+        return self.unclaimed_alive.choice()
+
+
+def normalize_images(entries):
+    """Split entries holding several space-separated URLs; drop blanks and duplicates, keeping order."""
+    return list(dict.fromkeys(ref for entry in entries for ref in entry.split()))
+
+
+class ImageIndex:
+    """name -> the character's image refs, and which characters have local (non-URL) images."""
+
+    def __init__(self):
+        self.refs = {}
+        self.with_local = set()
+
+    def build(self, characters):
+        for name, char in characters.items():
+            self.reindex(name, char)
+
+    def reindex(self, name, char):
+        refs = tuple(char.get("images", ()))
+        self.refs[name] = refs
+        if any(not ref.startswith("http") for ref in refs):
+            self.with_local.add(name)
+        else:
+            self.with_local.discard(name)
+
+    def discard(self, name):
+        self.refs.pop(name, None)
+        self.with_local.discard(name)
+
+    def get(self, name):
+        return self.refs.get(name, ())
+
+    def has_local(self, name):
+        return name in self.with_local
+
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    """
+    Case-insensitive name lookup plus prefix and typo-tolerant search.
+
+    Keeps a lowercase -> name map, a sorted list of lowercase names for
+    bisect-based prefix search and a trigram index for fuzzy matches.
+    """
+
+    def __init__(self):
+        self._by_lower = {}
+        self._sorted = []
+        self._trigrams = {}
+
+    def build(self, names):
+        """Add many names at once (one sort instead of an insort per name)."""
+        for name in names:
+            lower = name.lower()
+            if lower not in self._by_lower:
+                for gram in _trigrams(lower):
+                    self._trigrams.setdefault(gram, set()).add(lower)
+            self._by_lower[lower] = name
+        self._sorted = sorted(self._by_lower)
+
+    def add(self, name):
+        lower = name.lower()
+        if self._by_lower.get(lower) == name:
+            return
+        if lower not in self._by_lower:
+            bisect.insort(self._sorted, lower)
+            for gram in _trigrams(lower):
+                self._trigrams.setdefault(gram, set()).add(lower)
+        self._by_lower[lower] = name
+
+    def remove(self, name):
+        lower = name.lower()
+        if self._by_lower.get(lower) != name:
+            return
+        del self._by_lower[lower]
+        position = bisect.bisect_left(self._sorted, lower)
+        if position < len(self._sorted) and self._sorted[position] == lower:
+            del self._sorted[position]
+        for gram in _trigrams(lower):
+            names = self._trigrams.get(gram)
+            if names is not None:
+                names.discard(lower)
+                if not names:
+                    del self._trigrams[gram]
+
+    def get(self, name):
+        """The stored spelling of `name` (any case), or None."""
+        return self._by_lower.get(name.lower())
+
+    def __contains__(self, name):
+        return name.lower() in self._by_lower
+
+    def prefix(self, query, limit=25):
+        """Names starting with `query`, alphabetically."""
+        lower = query.lower()
+        start = bisect.bisect_left(self._sorted, lower)
+        results = []
+        for key in itertools.islice(self._sorted, start, None):
+            if not key.startswith(lower) or len(results) >= limit:
+                break
+            results.append(self._by_lower[key])
+        return results
+
+    def fuzzy(self, query, limit=25, threshold=0.3):
+        """Names sharing enough trigrams with `query`, best match first."""
+        grams = _trigrams(query.lower())
+        shared = {}
+        for gram in grams:
+            for key in self._trigrams.get(gram, ()):
+                shared[key] = shared.get(key, 0) + 1
+        scored = []
+        for key, count in shared.items():
+            score = count / (len(grams) + len(_trigrams(key)) - count)
+            if score >= threshold:
+                scored.append((-score, key))
+        return [self._by_lower[key] for _, key in heapq.nsmallest(limit, scored)]
+
+    def suggest(self, query, limit=25):
+        """Autocomplete choices: prefix matches first, topped up with fuzzy matches."""
+        if not query:
+            return [self._by_lower[key] for key in self._sorted[:limit]]
+        results = self.prefix(query, limit)
+        if len(results) < limit:
+            seen = set(results)
+            for name in self.fuzzy(query, limit):
+                if name not in seen:
+                    results.append(name)
+                    if len(results) >= limit:
+                        break
+        return results
+
+    def __len__(self):
+        return len(self._sorted)
+
+    def position(self, name):
+        """Where `name` sits (or would sit) in case-insensitive alphabetical order."""
+        return bisect.bisect_left(self._sorted, name.lower())
+
+    def ordered_slice(self, start, stop):
+        """Names from `start` to `stop` in case-insensitive alphabetical order."""
+        return [self._by_lower[key] for key in self._sorted[start:stop]]
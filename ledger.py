@@ -0,0 +1,263 @@
+"""
+Append-only gold ledger.
+
+Every change to a balance is a ledger entry: a sequence number, an optional
+idempotency key, a kind ("givegold", "sale", ...) and its legs, the
+(user_id, delta) pairs it applies. A transfer's legs sum to zero; minting
+and burning gold are single legs. Balances are the sum of all entries, kept
+up to date in memory as entries are posted.
+
+Entries are appended to the database through the write-behind queue. Every
+`snapshot_every` entries the balances of the accounts touched since the last
+snapshot are written to the gold table together with the entries, tagged
+with the last sequence number they include. Startup loads the snapshot and
+replays only the entries after it.
+
+Posting the same idempotency key twice applies it once; the second call
+returns the original entry. Posting is synchronous, so a single post is
+always atomic on the event loop. Callers that have to await between checking
+balances and posting (a purchase that also edits a message, say) hold
+`locked()` on the accounts involved for the whole step.
+"""
+import asyncio
+import json
+import time
+from collections import namedtuple
+from contextlib import asynccontextmanager
+
+# legs: ((user_id, delta), ...) with str user IDs
+LedgerEntry = namedtuple("LedgerEntry", "seq key kind legs memo created_at")
+
+
+class LedgerError(Exception):
+    pass
+
+
+class InsufficientFunds(LedgerError):
+    def __init__(self, user_id, balance, needed):
+        super().__init__(f"{user_id} has {balance} gold but needs {needed}.")
+        self.user_id = user_id
+        self.balance = balance
+        self.needed = needed
+
+
+def _entry_from_row(row):
+    seq, key, kind, legs, memo, created_at = row
+    legs = json.loads(legs) if isinstance(legs, str) else legs
+    return LedgerEntry(seq, key, kind, tuple((user_id, delta) for user_id, delta in legs), memo, created_at)
+
+
+class GoldLedger:
+    def __init__(self, balances=None, next_seq=1, snapshot_seq=0, lookup=None, on_append=None, on_balance=None,
+                 snapshot_every=500):
+        """
+        Args:
+            balances: Balances as of `snapshot_seq` (user_id -> int). Kept and updated in place.
+            next_seq: Sequence number for the next entry.
+            snapshot_seq: Last entry included in `balances`.
+            lookup: lookup(key) -> stored ledger row or None, for idempotency
+                keys of entries older than the ones kept in memory.
+            on_append: Called with the sequence number of every new entry (used to queue a save).
+            on_balance: Called as `on_balance(user_id, balance)` for every balance an entry changes.
+            snapshot_every: Write a balance snapshot after this many entries.
+        """
+        self.balances = balances if balances is not None else {}
+        self.next_seq = next_seq
+        self.snapshot_seq = snapshot_seq
+        self.lookup = lookup
+        self.on_append = on_append
+        self.on_balance = on_balance
+        self.snapshot_every = snapshot_every
+
+        self._by_key = {}  # idempotency key -> entry, for entries since the snapshot before last
+        self._unwritten = {}  # seq -> entry, not yet handed to the writer
+        self._touched = set()  # accounts changed since the last snapshot
+        self._since_snapshot = 0
+        self._locks = {}
+
+        # Stats
+        self.posted = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.replayed = 0
+
+    @classmethod
+    def load(cls, store, **kwargs):
+        """Load the last snapshot from `store` and replay the entries after it."""
+        snapshot_seq = store.ledger_snapshot_seq()
+        ledger = cls(
+            balances=store.load_gold(),
+            next_seq=max(snapshot_seq, store.last_ledger_seq()) + 1,
+            snapshot_seq=snapshot_seq,
+            lookup=store.find_ledger_entry,
+            **kwargs
+        )
+        ledger.replay(_entry_from_row(row) for row in store.load_ledger(after_seq=snapshot_seq))
+        return ledger
+
+    def replay(self, entries):
+        """Apply already-validated entries (the tail after a snapshot) without checks."""
+        for entry in entries:
+            self._apply(entry.legs)
+            if entry.key is not None:
+                self._by_key[entry.key] = entry
+            self.next_seq = max(self.next_seq, entry.seq + 1)
+            self._since_snapshot += 1
+            self.replayed += 1
+
+    #---------------- reading ----------------#
+
+    def balance(self, user_id):
+        return self.balances.get(str(user_id), 0)
+
+    def find(self, key):
+        """The entry posted under idempotency key `key`, or None."""
+        entry = self._by_key.get(key)
+        if entry is None and self.lookup is not None:
+            row = self.lookup(key)
+            entry = _entry_from_row(row) if row else None
+        return entry
+
+    #---------------- posting ----------------#
+
+    @asynccontextmanager
+    async def locked(self, *user_ids):
+        """
+        Hold the given accounts across awaits. Locks are taken in sorted order
+        so two multi-account steps can't deadlock. Inside the block, post()
+        directly (transfer() and friends would wait on the same locks).
+        """
+        locks = []
+        for user_id in sorted({str(user_id) for user_id in user_ids}):
+            lock = self._locks.get(user_id)
+            if lock is None:
+                lock = self._locks[user_id] = asyncio.Lock()
+            locks.append(lock)
+        acquired = []
+        try:
+            for lock in locks:
+                await lock.acquire()
+                acquired.append(lock)
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
+
+    def post(self, legs, kind, key=None, memo=None):
+        """
+        Apply one entry atomically and return it.
+
+        Raises InsufficientFunds if any account would go below zero and
+        LedgerError for empty or non-integer legs. A key that was already
+        posted returns the original entry without applying anything.
+        """
+        if key is not None:
+            existing = self.find(key)
+            if existing is not None:
+                self.duplicates += 1
+                return existing
+
+        # Merge legs per account so a user on both sides nets out
+        merged = {}
+        for user_id, delta in legs:
+            if not isinstance(delta, int) or isinstance(delta, bool):
+                raise LedgerError(f"Gold amounts must be whole numbers, got {delta!r}.")
+            user_id = str(user_id)
+            merged[user_id] = merged.get(user_id, 0) + delta
+        legs = tuple((user_id, delta) for user_id, delta in merged.items() if delta)
+        if not legs:
+            raise LedgerError("A ledger entry has to change at least one balance.")
+
+        for user_id, delta in legs:
+            balance = self.balances.get(user_id, 0)
+            if balance + delta < 0:
+                self.rejected += 1
+                raise InsufficientFunds(user_id, balance, -delta)
+
+        entry = LedgerEntry(self.next_seq, key, kind, legs, memo, time.time())
+        self.next_seq += 1
+        self._apply(legs)
+        if key is not None:
+            self._by_key[key] = entry
+        self._unwritten[entry.seq] = entry
+        self.posted += 1
+        if self.on_append is not None:
+            self.on_append(entry.seq)
+        return entry
+
+    def _apply(self, legs):
+        for user_id, delta in legs:
+            balance = self.balances[user_id] = self.balances.get(user_id, 0) + delta
+            self._touched.add(user_id)
+            if self.on_balance is not None:
+                self.on_balance(user_id, balance)
+
+    async def transfer(self, sender, recipient, amount, kind="transfer", key=None, memo=None):
+        """Move `amount` gold from `sender` to `recipient`."""
+        if amount <= 0:
+            raise LedgerError("Amount must be greater than 0.")
+        async with self.locked(sender, recipient):
+            return self.post(((sender, -amount), (recipient, amount)), kind, key, memo)
+
+    async def credit(self, user_id, amount, kind="credit", key=None, memo=None):
+        """Create `amount` gold in `user_id`'s balance."""
+        if amount <= 0:
+            raise LedgerError("Amount must be greater than 0.")
+        async with self.locked(user_id):
+            return self.post(((user_id, amount),), kind, key, memo)
+
+    async def debit(self, user_id, amount, kind="debit", key=None, memo=None):
+        """Remove `amount` gold from `user_id`'s balance."""
+        if amount <= 0:
+            raise LedgerError("Amount must be greater than 0.")
+        async with self.locked(user_id):
+            return self.post(((user_id, -amount),), kind, key, memo)
+
+    #---------------- persistence ----------------#
+
+    def persist_batch(self, seqs):
+        """
+        Persistence snapshot callback: the dirty entries, plus a balance
+        snapshot when one is due. Returns (entries, snapshot) where snapshot is
+        None or (seq, {user_id: balance}).
+        """
+        entries = [self._unwritten.pop(seq) for seq in sorted(seqs) if seq in self._unwritten]
+        self._since_snapshot += len(entries)
+        snapshot = None
+        if self._since_snapshot >= self.snapshot_every and not self._unwritten:
+            seq = self.next_seq - 1
+            snapshot = (seq, {user_id: self.balances.get(user_id, 0) for user_id in self._touched})
+            # Keys up to the previous snapshot are in the database by now;
+            # newer ones stay in memory until this write has certainly landed
+            previous = self.snapshot_seq
+            self._by_key = {key: entry for key, entry in self._by_key.items() if entry.seq > previous}
+            self.snapshot_seq = seq
+            self._touched = set()
+            self._since_snapshot = 0
+        return entries, snapshot
+
+    def requeue(self, entries, snapshot=None):
+        """
+        Take back a batch from persist_batch() whose write failed, so the
+        next one writes it again. The accounts of a failed snapshot count as
+        touched again, and the entries' keys stay in memory until they land.
+        """
+        for entry in entries:
+            self._unwritten[entry.seq] = entry
+            if entry.key is not None:
+                self._by_key[entry.key] = entry
+        if snapshot is not None:
+            self._touched.update(snapshot[1])
+            self._since_snapshot = max(self._since_snapshot, self.snapshot_every)
+
+    def stats(self):
+        return {
+            "accounts": len(self.balances),
+            "total_gold": sum(self.balances.values()),
+            "last_seq": self.next_seq - 1,
+            "snapshot_seq": self.snapshot_seq,
+            "posted": self.posted,
+            "duplicates": self.duplicates,
+            "rejected": self.rejected,
+            "replayed": self.replayed,
+        }
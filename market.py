@@ -0,0 +1,261 @@
+"""
+Character marketplace: listings, browse indexes, expiry and settlement.
+
+A listing offers one character at a fixed price until it expires. Listings
+are indexed by price and by listing time (RankedList, so any browse page is
+O(log n) to reach) and by character name. Expiry deadlines go into the
+shared DeadlineScheduler.
+
+Settlement is one step that can't interleave with anything else touching
+the same accounts: the buyer's and seller's ledger locks are held, the
+listing and the seller's ownership are re-checked, the price is posted to
+the ledger under the listing's idempotency key and the character changes
+owner, all without an await in between. A listing can only ever be paid for
+once. If the bot stops after the payment was written but before the new
+owner was saved, the ledger entry still names the buyer, so recover() (or the
+next buy attempt) completes the sale for them instead of selling it again.
+"""
+import itertools
+import time
+
+from rankings import RankedList
+
+# How a listing ended
+SOLD = "sold"
+EXPIRED = "expired"
+CANCELLED = "cancelled"
+INVALID = "invalid"  # The seller no longer owns the character
+
+
+class MarketError(Exception):
+    pass
+
+
+def settlement_key(listing_id):
+    return f"listing:{listing_id}"
+
+
+def _payer(entry):
+    return next(user_id for user_id, delta in entry.legs if delta < 0)
+
+
+class Marketplace:
+    def __init__(self, characters, ledger, scheduler, on_change=None, on_closed=None, next_id=None):
+        """
+        Args:
+            characters: The characters dict.
+            ledger: The GoldLedger that settles sales.
+            scheduler: The shared DeadlineScheduler (listing expiry).
+            on_change: Called with a listing ID whenever a listing is created,
+                changed or removed (used to queue a save).
+            on_closed: Called as `on_closed(listing, reason)` after a listing
+                is sold, expired, cancelled or found invalid.
+            next_id: `next_id()` -> a listing ID that has never been used
+                (storage.IdSequence). IDs name ledger keys, so they must not
+                repeat across restarts; the default counter is for tests only.
+        """
+        self.characters = characters
+        self.ledger = ledger
+        self.scheduler = scheduler
+        self.on_change = on_change
+        self.on_closed = on_closed
+        # listing ID -> {"id", "name", "seller", "price", "created_at", "expires_at",
+        #                "channel_id", "message_id", "buyer"}
+        self.listings = {}
+        self._by_name = {}
+        self._by_price = RankedList()  # (price, created_at, id): cheapest first
+        self._by_time = RankedList()  # (-created_at, id): newest first
+        if next_id is None:
+            counter = itertools.count(1)
+            next_id = lambda: str(next(counter))
+        self.next_id = next_id
+
+        # Stats
+        self.sold = 0
+        self.volume = 0
+        self.expired = 0
+        self.cancelled = 0
+        self.lost_races = 0
+
+    def __len__(self):
+        return len(self.listings)
+
+    def _changed(self, listing_id):
+        if self.on_change is not None:
+            self.on_change(listing_id)
+
+    def _index(self, listing):
+        self.listings[listing["id"]] = listing
+        self._by_name[listing["name"]] = listing["id"]
+        self._by_price.insert((listing["price"], listing["created_at"], listing["id"]))
+        self._by_time.insert((-listing["created_at"], listing["id"]))
+
+    def _unindex(self, listing):
+        self.listings.pop(listing["id"], None)
+        if self._by_name.get(listing["name"]) == listing["id"]:
+            del self._by_name[listing["name"]]
+        self._by_price.remove((listing["price"], listing["created_at"], listing["id"]))
+        self._by_time.remove((-listing["created_at"], listing["id"]))
+
+    def load(self, listings):
+        """Index saved listings (call recover() once the bot is running)."""
+        for listing in listings.values():
+            self._index(listing)
+
+    def recover(self):
+        """Finish any sale that was paid for but not completed before a restart."""
+        for listing_id in list(self.listings):
+            entry = self.ledger.find(settlement_key(listing_id))
+            if entry is not None:
+                self._complete(self.listings[listing_id], _payer(entry))
+
+    def schedule(self, listing_id):
+        """(Re)schedule a listing's expiry; overdue listings expire right away."""
+        listing = self.listings.get(listing_id)
+        if listing is not None:
+            self.scheduler.schedule(("listing", listing_id), listing["expires_at"], lambda: self._expire(listing_id))
+
+    async def _expire(self, listing_id):
+        self.close(listing_id, EXPIRED)
+
+    #---------------- listing ----------------#
+
+    def listing_for(self, name):
+        listing_id = self._by_name.get(name)
+        return self.listings.get(listing_id) if listing_id else None
+
+    def create(self, name, seller, price, duration, now=None):
+        """List `name` for `price` gold for `duration` seconds. Returns the listing."""
+        character = self.characters.get(name)
+        if character is None:
+            raise MarketError(f"Character '{name}' not found.")
+        if character.owner != seller:
+            raise MarketError(f"You do not own the character '{name}'.")
+        if not isinstance(price, int) or price <= 0:
+            raise MarketError("Sale amount must be greater than 0.")
+        if name in self._by_name:
+            raise MarketError(f"'{name}' is already listed. Use /unlist first to change the price.")
+
+        now = time.time() if now is None else now
+        listing = {
+            "id": self.next_id(),
+            "name": name,
+            "seller": seller,
+            "price": price,
+            "created_at": now,
+            "expires_at": now + duration,
+            "channel_id": None,
+            "message_id": None,
+            "buyer": None,
+        }
+        self._index(listing)
+        self.schedule(listing["id"])
+        self._changed(listing["id"])
+        return listing
+
+    def attach_message(self, listing_id, channel_id, message_id):
+        """Remember where a listing was posted, so its buttons can be restored after a restart."""
+        listing = self.listings.get(listing_id)
+        if listing is not None:
+            listing["channel_id"] = channel_id
+            listing["message_id"] = message_id
+            self._changed(listing_id)
+
+    def close(self, listing_id, reason):
+        """Take a listing off the market. Returns it, or None if it was already gone."""
+        listing = self.listings.get(listing_id)
+        if listing is None:
+            return None
+        self._unindex(listing)
+        self.scheduler.cancel(("listing", listing_id))
+        if reason == EXPIRED:
+            self.expired += 1
+        elif reason == CANCELLED:
+            self.cancelled += 1
+        self._changed(listing_id)
+        if self.on_closed is not None:
+            self.on_closed(listing, reason)
+        return listing
+
+    def cancel(self, listing_id, user_id):
+        listing = self.listings.get(listing_id)
+        if listing is None:
+            raise MarketError("This listing is no longer active.")
+        if listing["seller"] != user_id:
+            raise MarketError("Only the seller can take this listing down.")
+        return self.close(listing_id, CANCELLED)
+
+    def revalidate(self, name):
+        """Drop the listing for `name` if the character is gone or changed owner outside the market."""
+        listing = self.listing_for(name)
+        if listing is None:
+            return
+        character = self.characters.get(name)
+        if character is None or character.owner != listing["seller"]:
+            self.close(listing["id"], INVALID)
+
+    #---------------- settlement ----------------#
+
+    def _complete(self, listing, buyer):
+        """Hand the character to whoever paid for it and close the listing as sold."""
+        character = self.characters.get(listing["name"])
+        if character is not None:
+            character.owner = int(buyer)
+        listing["buyer"] = int(buyer)
+        self.sold += 1
+        self.volume += listing["price"]
+        self.close(listing["id"], SOLD)
+
+    async def buy(self, listing_id, buyer):
+        """
+        Buy a listing for `buyer` (a user ID). Returns the closed listing.
+
+        Raises MarketError if the listing is gone or invalid and
+        InsufficientFunds (from the ledger) if the buyer can't pay.
+        """
+        listing = self.listings.get(listing_id)
+        if listing is None:
+            raise MarketError("This character is no longer for sale.")
+        if listing["seller"] == buyer:
+            raise MarketError("You can't buy your own listing.")
+
+        async with self.ledger.locked(buyer, listing["seller"]):
+            # Someone else may have bought it while we waited for the locks
+            if self.listings.get(listing_id) is not listing:
+                self.lost_races += 1
+                raise MarketError("This character is no longer for sale.")
+            character = self.characters.get(listing["name"])
+            if character is None or character.owner != listing["seller"]:
+                self.close(listing_id, INVALID)
+                raise MarketError("This character is no longer for sale.")
+
+            entry = self.ledger.post(
+                ((buyer, -listing["price"]), (listing["seller"], listing["price"])),
+                kind="sale", key=settlement_key(listing_id), memo=listing["name"]
+            )
+            # A replayed key means an earlier attempt already paid: finish that sale instead
+            payer = _payer(entry)
+            self._complete(listing, payer)
+            if payer != str(buyer):
+                raise MarketError("This character is no longer for sale.")
+        return listing
+
+    #---------------- browsing ----------------#
+
+    def page(self, sort, offset, count):
+        """Listings `offset` to `offset + count` by "price" (cheapest first) or "newest"."""
+        if sort == "price":
+            keys = self._by_price.slice(offset, count)
+            return [self.listings[listing_id] for _, _, listing_id in keys]
+        keys = self._by_time.slice(offset, count)
+        return [self.listings[listing_id] for _, listing_id in keys]
+
+    def stats(self):
+        return {
+            "active": len(self.listings),
+            "sold": self.sold,
+            "volume": self.volume,
+            "expired": self.expired,
+            "cancelled": self.cancelled,
+            "lost_races": self.lost_races,
+        }
@@ -0,0 +1,201 @@
+"""
+In-process metrics: counters, gauges and latency summaries.
+
+MetricsRegistry keeps every series in memory, keyed by metric name and
+labels. Latencies go into a Summary, which keeps the last `window` samples
+for p50/p95/p99 plus a running count, sum and max. Values that already live
+elsewhere (gateway latency, persistence stats, startup timings) are read by
+collectors when a snapshot is taken instead of being copied on every change.
+
+render_prometheus() produces the Prometheus text format and
+start_metrics_server() serves it on /metrics, for when the bot is scraped.
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from aiohttp import web
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Summary:
+    def __init__(self, window=1024):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def quantiles(self, qs=QUANTILES):
+        """Nearest-rank quantiles over the recent samples (0.0 when there are none)."""
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {q: 0.0 for q in qs}
+        return {q: ordered[min(int(q * len(ordered)), len(ordered) - 1)] for q in qs}
+
+    def stats(self):
+        p50, p95, p99 = (self.quantiles()[q] for q in QUANTILES)
+        return {
+            "count": self.count,
+            "avg": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+            "p50": p50,
+            "p95": p95,
+            "p99": p99,
+        }
+
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(label_key, extra=()):
+    pairs = list(label_key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+class MetricsRegistry:
+    def __init__(self, prefix="botty", window=1024):
+        self.prefix = prefix
+        self.window = window
+        self._counters = {}  # name -> {label_key: value}
+        self._gauges = {}  # name -> {label_key: value}
+        self._summaries = {}  # name -> {label_key: Summary}
+        self._collectors = []
+
+    #---------------- recording ----------------#
+
+    def inc(self, name, amount=1, **labels):
+        series = self._counters.setdefault(name, {})
+        key = _label_key(labels)
+        series[key] = series.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        self._gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def observe(self, name, value, **labels):
+        series = self._summaries.setdefault(name, {})
+        key = _label_key(labels)
+        summary = series.get(key)
+        if summary is None:
+            summary = series[key] = Summary(self.window)
+        summary.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observe how long the block takes, in seconds (also when it raises)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def collector(self, func):
+        """
+        Register `func() -> iterable of (name, labels, value)`, read as gauges
+        whenever a snapshot is taken. Usable as a decorator.
+        """
+        self._collectors.append(func)
+        return func
+
+    #---------------- reading ----------------#
+
+    def counters(self, name):
+        """{label_key: value} for a counter (label_key is a sorted tuple of (label, value))."""
+        return dict(self._counters.get(name, {}))
+
+    def summaries(self, name):
+        return dict(self._summaries.get(name, {}))
+
+    def gauges(self):
+        """Every gauge, collectors included: {name: {label_key: value}}."""
+        gauges = {name: dict(series) for name, series in self._gauges.items()}
+        for collect in self._collectors:
+            try:
+                for name, labels, value in collect():
+                    if value is not None:
+                        gauges.setdefault(name, {})[_label_key(labels)] = value
+            except Exception as e:
+                print(f"Metrics collector {getattr(collect, '__name__', collect)} failed: {e}")
+        return gauges
+
+    def render_prometheus(self):
+        lines = []
+        for name, series in sorted(self._counters.items()):
+            lines.append(f"# TYPE {self.prefix}_{name} counter")
+            for key, value in series.items():
+                lines.append(f"{self.prefix}_{name}{_format_labels(key)} {value}")
+        for name, series in sorted(self.gauges().items()):
+            lines.append(f"# TYPE {self.prefix}_{name} gauge")
+            for key, value in series.items():
+                lines.append(f"{self.prefix}_{name}{_format_labels(key)} {float(value)}")
+        for name, series in sorted(self._summaries.items()):
+            lines.append(f"# TYPE {self.prefix}_{name} summary")
+            for key, summary in series.items():
+                for q, value in summary.quantiles().items():
+                    lines.append(f"{self.prefix}_{name}{_format_labels(key, [('quantile', q)])} {value}")
+                lines.append(f"{self.prefix}_{name}_sum{_format_labels(key)} {summary.total}")
+                lines.append(f"{self.prefix}_{name}_count{_format_labels(key)} {summary.count}")
+        return "\n".join(lines) + "\n"
+
+
+class LoopLagMonitor:
+    """
+    Measures event loop lag: how much later than asked a short sleep wakes up.
+    A blocked loop (slow sync code in a handler) shows up as lag.
+    """
+
+    def __init__(self, registry, interval=0.5, name="event_loop_lag_seconds"):
+        self.registry = registry
+        self.interval = interval
+        self.name = name
+        self.last = 0.0
+        self._task = None
+
+    def start(self):
+        """Start measuring; calling it again while running does nothing."""
+        if self._task is not None and not self._task.done():
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.last = max(loop.time() - start - self.interval, 0.0)
+            self.registry.observe(self.name, self.last)
+
+
+async def start_metrics_server(registry, host, port):
+    """Serve registry.render_prometheus() on http://host:port/metrics. Returns the runner (cleanup() stops it)."""
+    async def handle(request):
+        return web.Response(
+            text=registry.render_prometheus(),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,146 @@
+"""
+Compact in-memory record for a character.
+
+Characters used to be the nested dicts straight out of JSON. A Character
+keeps the same fields in __slots__, so there is no per-character __dict__
+or key table. The status is a Status member and the owner an int, so status
+and owner checks are attribute comparisons. Images are a tuple, and the
+repeated text fields are interned. Side notes such as "No side note
+provided." are shared by hundreds of characters.
+
+Commands that still use dict-style access (character["owner"],
+character.get("side_note", ...)) keep working. from_dict() and to_dict()
+convert to and from the stored JSON.
+"""
+import sys
+from enum import Enum
+
+
+class Status(str, Enum):
+    ALIVE = "Alive"
+    DECEASED = "Deceased 💀"
+
+    # Format and print as the plain value, like the strings they replace
+    __str__ = str.__str__
+    __format__ = str.__format__
+
+
+FIELDS = ("description", "side_note", "images", "status", "owner", "cause_of_death", "sale_price", "name")
+_FIELD_SET = frozenset(FIELDS)
+_INTERNED = frozenset({"description", "side_note", "cause_of_death", "name"})
+_MISSING = object()
+
+
+def _coerce(field, value):
+    if value is None:
+        return None
+    if field == "status":
+        try:
+            return Status(value)
+        except ValueError:
+            return sys.intern(value)
+    if field == "owner":
+        return int(value)
+    if field == "images":
+        return tuple(value)
+    if field in _INTERNED and type(value) is str:
+        return sys.intern(value)
+    return value
+
+
+class Character:
+    # Any key outside FIELDS goes into `extra` (created only when needed)
+    __slots__ = FIELDS + ("extra",)
+
+    def __init__(self, description="", images=(), status=Status.ALIVE, owner=None, **fields):
+        self["description"] = description
+        self["images"] = images
+        self["status"] = status
+        self["owner"] = owner
+        for key, value in fields.items():
+            self[key] = value
+
+    @classmethod
+    def from_dict(cls, data):
+        character = cls.__new__(cls)
+        character.images = ()
+        character.status = Status.ALIVE
+        character.owner = None
+        for key, value in data.items():
+            character[key] = value
+        return character
+
+    def to_dict(self):
+        data = {}
+        for field in FIELDS:
+            value = getattr(self, field, _MISSING)
+            if value is _MISSING:
+                continue
+            if field == "images":
+                value = list(value)
+            elif field == "status" and isinstance(value, Status):
+                value = value.value
+            data[field] = value
+        data.update(getattr(self, "extra", None) or {})
+        return data
+
+    #---------------- dict-style access ----------------#
+
+    def __getitem__(self, key):
+        if key in _FIELD_SET:
+            value = getattr(self, key, _MISSING)
+        else:
+            value = (getattr(self, "extra", None) or {}).get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key in _FIELD_SET:
+            object.__setattr__(self, key, _coerce(key, value))
+        else:
+            if getattr(self, "extra", None) is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __delitem__(self, key):
+        try:
+            if key in _FIELD_SET:
+                delattr(self, key)
+            else:
+                del self.extra[key]
+        except (AttributeError, KeyError, TypeError):
+            raise KeyError(key) from None
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def setdefault(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            self[key] = default
+            return self[key]
+
+    def pop(self, key, *default):
+        try:
+            value = self[key]
+        except KeyError:
+            if default:
+                return default[0]
+            raise
+        del self[key]
+        return value
+
+    def __repr__(self):
+        return f"Character({self.to_dict()!r})"
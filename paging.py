@@ -0,0 +1,60 @@
+"""
+Page buttons for listings that change while they are on screen.
+
+Unlike the image carousel, the pages aren't built up front: every press asks
+the listing for the page it lands on, so a leaderboard or the market always
+shows current data. Rendering a page should only touch that page's rows.
+"""
+import discord
+
+
+class PagedView(discord.ui.View):
+    def __init__(self, render, page_count, page=0, locate=None, timeout=300):
+        """
+        Args:
+            render: `render(page, user)` -> embed for a 0-based page, as seen by `user`.
+            page_count: `page_count()` -> current number of pages.
+            page: The page to start on.
+            locate: Optional `locate(user)` -> the page `user` is on, or None;
+                adds a 📍 button that jumps there.
+            timeout: Seconds without a press before the buttons stop working.
+        """
+        super().__init__(timeout=timeout)
+        self.render = render
+        self.page_count = page_count
+        self.page = page
+        self.locate = locate
+        if locate is None:
+            self.remove_item(self.mine)
+
+    def embed(self, user):
+        self.page = max(0, min(self.page, self.page_count() - 1))
+        return self.render(self.page, user)
+
+    async def _show(self, interaction, page):
+        self.page = page
+        await interaction.response.edit_message(embed=self.embed(interaction.user), view=self)
+
+    @discord.ui.button(emoji="⏮️", style=discord.ButtonStyle.secondary)
+    async def first(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, 0)
+
+    @discord.ui.button(emoji="⬅️", style=discord.ButtonStyle.secondary)
+    async def previous(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page - 1 if self.page > 0 else self.page_count() - 1)
+
+    @discord.ui.button(emoji="➡️", style=discord.ButtonStyle.secondary)
+    async def next(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page + 1 if self.page + 1 < self.page_count() else 0)
+
+    @discord.ui.button(emoji="⏭️", style=discord.ButtonStyle.secondary)
+    async def last(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page_count() - 1)
+
+    @discord.ui.button(emoji="📍", style=discord.ButtonStyle.primary)
+    async def mine(self, interaction: discord.Interaction, button: discord.ui.Button):
+        page = self.locate(interaction.user)
+        if page is None:
+            await interaction.response.send_message("You're not on this list yet.", ephemeral=True)
+            return
+        await self._show(interaction, page)
@@ -0,0 +1,196 @@
+"""
+Write-behind persistence for the bot's stores.
+
+Commands only mark a record dirty. Dirty records are collected for a short
+window and then written in one batch on a background thread, so a burst of
+claims or spawns costs a single write and never blocks the event loop.
+A batch that fails to write goes back to being dirty and is retried on the
+next window, so a locked or full database delays saves instead of losing them.
+"""
+import asyncio
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def atomic_write_json(path, data):
+    """Write JSON to a temp file next to `path` and rename it into place."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(data if isinstance(data, str) else json.dumps(data, indent=4))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class _RegisteredStore:
+    def __init__(self, snapshot, write, requeue):
+        self.snapshot = snapshot
+        self.write = write
+        self.requeue = requeue
+        self.dirty = set()
+        self.whole = False  # True when the store has no per-record keys
+
+
+class PersistenceScheduler:
+    """
+    Coalesce store mutations into one off-loop flush per window.
+
+    Each store is registered with two callables:
+      snapshot(keys) -- runs on the event loop and copies the dirty records
+                        (keys is None for whole-file stores)
+      write(payload) -- runs on the writer thread with that copy
+    and optionally
+      requeue(payload) -- takes back the payload of a failed write, for stores
+                          whose snapshot consumes state (the ledger's entries)
+    A single writer thread keeps flushes in order.
+    """
+
+    def __init__(self, window=2.0, on_flush=None):
+        """on_flush: optional `on_flush(seconds, ok)` called after each flush (used for metrics)."""
+        self.window = window
+        self.on_flush = on_flush
+        self._stores = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="persistence")
+        self._timer = None
+        self._inflight = None  # (future, batch) of the write on the writer thread, until it resolves
+
+        # Stats
+        self.marks = 0
+        self.flushes = 0
+        self.failures = 0
+        self.records_written = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    def register(self, name, snapshot, write, requeue=None):
+        self._stores[name] = _RegisteredStore(snapshot, write, requeue)
+
+    def mark_dirty(self, name, *keys):
+        """Mark records (or the whole store when no keys are given) as needing a write."""
+        store = self._stores[name]
+        if keys:
+            store.dirty.update(keys)
+        else:
+            store.whole = True
+        self.marks += 1
+        self._schedule()
+
+    def _schedule(self):
+        if self._timer is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # Not running yet; picked up by the next mark or flush_sync()
+        self._timer = loop.call_later(self.window, self._start_flush)
+
+    def _start_flush(self):
+        asyncio.get_running_loop().create_task(self.flush())
+
+    def _collect(self):
+        """Snapshot every dirty store on the calling (loop) thread."""
+        batch = []
+        for store in self._stores.values():
+            if store.whole:
+                store.whole = False
+                store.dirty.clear()
+                batch.append((store, store.snapshot(None), None))
+            elif store.dirty:
+                keys, store.dirty = store.dirty, set()
+                batch.append((store, store.snapshot(keys), keys))
+        return batch
+
+    def _restore(self, batch):
+        """Mark a failed batch dirty again (on the loop thread) so the next flush retries it."""
+        for store, payload, keys in batch:
+            if store.requeue is not None:
+                store.requeue(payload)
+            if keys is None:
+                store.whole = True
+            else:
+                store.dirty.update(keys)
+
+    def _write(self, batch):
+        start = time.perf_counter()
+        for store, payload, _ in batch:
+            store.write(payload)
+        return (time.perf_counter() - start) * 1000
+
+    def _record(self, batch, elapsed_ms):
+        self.flushes += 1
+        self.records_written += sum(1 if keys is None else len(keys) for _, _, keys in batch)
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        self.total_flush_ms += elapsed_ms
+
+    async def flush(self):
+        """Write everything that is dirty now, on the writer thread."""
+        self._timer = None
+        batch = self._collect()
+        if not batch:
+            return
+        start = time.perf_counter()
+        future = self._executor.submit(self._write, batch)
+        self._inflight = (future, batch)
+        # Cancelled at shutdown: the write may still be running, so _inflight
+        # stays set for flush_sync() to wait on and settle
+        try:
+            elapsed_ms = await asyncio.wrap_future(future)
+        except Exception as e:
+            self._inflight = None
+            print(f"Persistence flush failed, retrying in {self.window}s: {e}")
+            self.failures += 1
+            self._restore(batch)
+            self._schedule()
+            if self.on_flush is not None:
+                self.on_flush(time.perf_counter() - start, False)
+            return
+        self._inflight = None
+        self._record(batch, elapsed_ms)
+        if self.on_flush is not None:
+            self.on_flush(elapsed_ms / 1000, True)
+
+    def flush_sync(self):
+        """
+        Blocking flush for shutdown. Waits for the writer thread first; an
+        in-flight batch that failed or never ran is written again here.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._executor.shutdown(wait=True)
+        if self._inflight is not None:
+            future, batch = self._inflight
+            self._inflight = None
+            if future.cancelled():
+                self._restore(batch)
+            elif future.exception() is not None:
+                print(f"Persistence flush failed, retrying before shutdown: {future.exception()}")
+                self.failures += 1
+                self._restore(batch)
+            else:
+                self._record(batch, future.result())
+        batch = self._collect()
+        if batch:
+            self._record(batch, self._write(batch))
+
+    def stats(self):
+        return {
+            "marks": self.marks,
+            "flushes": self.flushes,
+            "failures": self.failures,
+            "writes_saved": max(self.marks - self.flushes, 0),
+            "records_written": self.records_written,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "max_flush_ms": round(self.max_flush_ms, 2),
+            "avg_flush_ms": round(self.total_flush_ms / self.flushes, 2) if self.flushes else 0.0,
+        }
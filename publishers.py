@@ -0,0 +1,190 @@
+"""
+Channel views that are kept up to date by editing the bot's own messages.
+
+ChunkedPublisher owns a run of bot messages in one channel and only edits
+the ones whose rendered text changed. CharacterListRenderer caches the
+character list chunks and re-renders only the chunks touched by a change.
+"""
+import hashlib
+
+import discord
+
+from indexes import DECEASED
+
+CHARACTER_LIST_CHUNK_SIZE = 50
+
+
+def content_hash(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class ChunkedPublisher:
+    """
+    Sync a list of rendered chunks onto a list of messages in one channel.
+
+    Messages are kept as PartialMessage handles built from their IDs, so an
+    edit is a single REST call with no fetch beforehand. The hash of the last
+    content sent is remembered per message and unchanged chunks are skipped.
+    """
+
+    def __init__(self, channel, message_ids=()):
+        self.channel = channel
+        self.messages = [channel.get_partial_message(message_id) for message_id in message_ids]
+        self.hashes = [None] * len(self.messages)  # Unknown after a restart: first publish edits once
+        self.edits = 0
+        self.skipped = 0
+
+    @property
+    def message_ids(self):
+        return [message.id for message in self.messages]
+
+    async def publish(self, chunks):
+        """Bring the channel in line with `chunks`. Returns True if the message IDs changed."""
+        ids_changed = False
+        for i, content in enumerate(chunks):
+            digest = content_hash(content)
+            if i < len(self.messages):
+                if self.hashes[i] == digest:
+                    self.skipped += 1
+                    continue
+                try:
+                    await self.messages[i].edit(content=content)
+                    self.edits += 1
+                except discord.NotFound:
+                    # Someone deleted our message: post a replacement
+                    self.messages[i] = await self.channel.send(content)
+                    ids_changed = True
+                self.hashes[i] = digest
+            else:
+                self.messages.append(await self.channel.send(content))
+                self.hashes.append(digest)
+                ids_changed = True
+
+        # Remove extra messages if the content shrank
+        while len(self.messages) > len(chunks):
+            message = self.messages.pop()
+            self.hashes.pop()
+            ids_changed = True
+            try:
+                await message.delete()
+            except discord.NotFound:
+                pass  # Already deleted
+        return ids_changed
+
+
+class CharacterListRenderer:
+    """
+    The "All Characters" list, split into parts of 50 lines.
+
+    Changes are reported with invalidate(name). render() then re-renders only
+    the parts containing those names, or every part from the first affected
+    position onwards when a character was added or removed (the numbering
+    shifts).
+    """
+
+    def __init__(self, characters, name_index, chunk_size=CHARACTER_LIST_CHUNK_SIZE):
+        self.characters = characters
+        self.name_index = name_index
+        self.chunk_size = chunk_size
+        self.chunks = []
+        self._rendered_names = set()
+        self._dirty = set()
+        self._full = True
+
+    def invalidate(self, name=None):
+        """Mark one character (or, with no name, the whole list) as changed."""
+        if name is None:
+            self._full = True
+        else:
+            self._dirty.add(name)
+
+    def _line(self, number, name):
+        char = self.characters[name]
+        owner_id = char.owner
+        if char.status is DECEASED:
+            return f"{number}. 💀 {name}"
+        if owner_id:
+            return f"{number}. 🔒 {name} (Owned by <@{owner_id}>)"
+        return f"{number}. 🌿 {name}"
+
+    def _render_chunk(self, index):
+        start = index * self.chunk_size
+        names = self.name_index.ordered_slice(start, start + self.chunk_size)
+        lines = [self._line(start + offset + 1, name) for offset, name in enumerate(names)]
+        return f"**All Characters (Part {index + 1}):**\n" + "\n".join(lines)
+
+    def render(self):
+        """Return the current chunks, re-rendering only what changed since the last call."""
+        total = len(self.name_index)
+        chunk_count = -(-total // self.chunk_size)
+
+        if self._full:
+            affected = range(chunk_count)
+            self._rendered_names = set(self.characters)
+        else:
+            structural = [
+                name for name in self._dirty
+                if (name in self.characters) != (name in self._rendered_names)
+            ]
+            if structural:
+                first = min(self.name_index.position(name) for name in structural) // self.chunk_size
+                affected = set(range(first, chunk_count))
+                for name in structural:
+                    if name in self.characters:
+                        self._rendered_names.add(name)
+                    else:
+                        self._rendered_names.discard(name)
+            else:
+                affected = set()
+            for name in self._dirty:
+                if name in self.characters:
+                    affected.add(self.name_index.position(name) // self.chunk_size)
+
+        del self.chunks[chunk_count:]
+        while len(self.chunks) < chunk_count:
+            self.chunks.append(None)
+        for index in affected:
+            self.chunks[index] = self._render_chunk(index)
+
+        self._dirty.clear()
+        self._full = False
+        return list(self.chunks)
+
+
+DISCORD_MESSAGE_LIMIT = 2000
+GRAVEYARD_HEADER = "**Graveyard of Deceased Characters:**"
+
+
+def split_lines(header, lines, limit=DISCORD_MESSAGE_LIMIT):
+    """Pack lines into as few messages as possible, each at most `limit` characters."""
+    messages = []
+    current = header
+    for line in lines:
+        if len(current) + 1 + len(line) > limit:
+            messages.append(current)
+            current = line
+        else:
+            current = f"{current}\n{line}" if current else line
+    messages.append(current)
+    return messages
+
+
+class GraveyardRenderer:
+    """The graveyard view: every deceased character, split to fit Discord's limit."""
+
+    def __init__(self, character_index):
+        self.character_index = character_index
+        self._rendered = None  # frozenset of names shown in the last render
+
+    def is_affected(self, name):
+        """Whether a change to `name` could change the graveyard."""
+        return self._rendered is None or (name in self._rendered) != (
+            name in self.character_index.with_status(DECEASED)
+        )
+
+    def render(self):
+        deceased = self.character_index.with_status(DECEASED)
+        self._rendered = frozenset(deceased)
+        if not deceased:
+            return [f"{GRAVEYARD_HEADER}\nNo deceased characters yet."]
+        return split_lines(GRAVEYARD_HEADER, [f"💀 {name}" for name in sorted(deceased)])
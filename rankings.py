@@ -0,0 +1,187 @@
+"""
+Leaderboards kept in rank order as scores change.
+
+RankedList is an indexable skip list: every link also stores how many items
+it skips, so besides O(log n) insert and remove it can answer "what position
+is this key at" (rank) and "which key is at position i" (select) in O(log n)
+without a sort. The layout follows the sorted-set skip list Redis uses.
+
+Leaderboard maps members to scores on top of it, ordered by score
+(highest first) and then member ID, so every member has a distinct rank.
+Members with a score of 0 or less are left off the board.
+"""
+import random
+
+MAX_LEVEL = 32
+P = 0.25
+
+
+class _Node:
+    __slots__ = ("key", "next", "width")
+
+    def __init__(self, key, level):
+        self.key = key
+        self.next = [None] * level
+        self.width = [0] * level  # items stepped over by next[i], including the one it lands on
+
+
+class RankedList:
+    def __init__(self, seed=None):
+        self._random = random.Random(seed).random
+        self._head = _Node(None, MAX_LEVEL)
+        self._level = 1
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def _random_level(self):
+        level = 1
+        while level < MAX_LEVEL and self._random() < P:
+            level += 1
+        return level
+
+    def _find_before(self, key):
+        """The last node before `key` on every level, and its position."""
+        update = [self._head] * MAX_LEVEL
+        ranks = [0] * MAX_LEVEL
+        node = self._head
+        position = 0
+        for i in range(self._level - 1, -1, -1):
+            following = node.next[i]
+            while following is not None and following.key < key:
+                position += node.width[i]
+                node = following
+                following = node.next[i]
+            update[i] = node
+            ranks[i] = position
+        return update, ranks
+
+    def insert(self, key):
+        update, ranks = self._find_before(key)
+        level = self._random_level()
+        if level > self._level:
+            for i in range(self._level, level):
+                update[i] = self._head
+                ranks[i] = 0
+                self._head.width[i] = self._size
+            self._level = level
+
+        node = _Node(key, level)
+        for i in range(level):
+            before = update[i]
+            node.next[i] = before.next[i]
+            before.next[i] = node
+            node.width[i] = before.width[i] - (ranks[0] - ranks[i])
+            before.width[i] = ranks[0] - ranks[i] + 1
+        for i in range(level, self._level):
+            update[i].width[i] += 1
+        self._size += 1
+
+    def remove(self, key):
+        """Remove `key`; returns False if it wasn't there."""
+        update, _ = self._find_before(key)
+        node = update[0].next[0]
+        if node is None or node.key != key:
+            return False
+        for i in range(self._level):
+            before = update[i]
+            if before.next[i] is node:
+                before.width[i] += node.width[i] - 1
+                before.next[i] = node.next[i]
+            else:
+                before.width[i] -= 1
+        while self._level > 1 and self._head.next[self._level - 1] is None:
+            self._level -= 1
+        self._size -= 1
+        return True
+
+    def rank(self, key):
+        """0-based position of `key`, or None if it isn't in the list."""
+        node = self._head
+        position = 0
+        for i in range(self._level - 1, -1, -1):
+            following = node.next[i]
+            while following is not None and following.key <= key:
+                position += node.width[i]
+                node = following
+                following = node.next[i]
+            if node is not self._head and node.key == key:
+                return position - 1
+        return None
+
+    def _node_at(self, index):
+        target = index + 1
+        node = self._head
+        traversed = 0
+        for i in range(self._level - 1, -1, -1):
+            while node.next[i] is not None and traversed + node.width[i] <= target:
+                traversed += node.width[i]
+                node = node.next[i]
+            if traversed == target:
+                return node
+        raise IndexError(index)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError(index)
+        return self._node_at(index).key
+
+    def slice(self, start, count):
+        """Up to `count` keys from position `start` on."""
+        if start >= self._size or count <= 0:
+            return []
+        node = self._node_at(max(start, 0))
+        keys = []
+        while node is not None and len(keys) < count:
+            keys.append(node.key)
+            node = node.next[0]
+        return keys
+
+    def __iter__(self):
+        node = self._head.next[0]
+        while node is not None:
+            yield node.key
+            node = node.next[0]
+
+
+class Leaderboard:
+    def __init__(self, seed=None):
+        self._scores = {}
+        self._ranked = RankedList(seed)
+
+    def __len__(self):
+        return len(self._ranked)
+
+    def update(self, member, score):
+        """Set a member's score (a score of 0 or less takes them off the board)."""
+        old = self._scores.get(member)
+        if old == score:
+            return
+        if old is not None:
+            self._ranked.remove((-old, member))
+        if score > 0:
+            self._scores[member] = score
+            self._ranked.insert((-score, member))
+        else:
+            self._scores.pop(member, None)
+
+    def remove(self, member):
+        self.update(member, 0)
+
+    def score(self, member):
+        return self._scores.get(member, 0)
+
+    def rank(self, member):
+        """1-based rank of `member`, or None if they aren't on the board."""
+        score = self._scores.get(member)
+        if score is None:
+            return None
+        return self._ranked.rank((-score, member)) + 1
+
+    def page(self, offset, count):
+        """[(rank, member, score), ...] for ranks offset + 1 to offset + count."""
+        return [(offset + i + 1, member, -negative)
+                for i, (negative, member) in enumerate(self._ranked.slice(offset, count))]
@@ -0,0 +1,49 @@
+"""
+Track the bot's interactive messages by message ID.
+
+Button presses reach their CarouselView through discord.py's view store,
+which is itself keyed by message ID, so no per-message bot.wait_for() is
+needed. This registry keeps the other half: which messages are still live,
+the view attached to each one, and when they expire. Expiry deadlines go
+into the shared DeadlineScheduler.
+"""
+
+
+class MessageRouter:
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self._routes = {}  # message_id -> (view, on_expire)
+
+    def register(self, message_id, view, expires_at=None, on_expire=None):
+        """
+        Track `view` as live on `message_id` until `expires_at` (a timestamp),
+        then stop it and call `on_expire()` (a coroutine function).
+        """
+        self._routes[message_id] = (view, on_expire)
+        if expires_at is not None:
+            self.scheduler.schedule(("route", message_id), expires_at, lambda: self._expire(message_id))
+
+    def unregister(self, message_id):
+        route = self._routes.pop(message_id, None)
+        self.scheduler.cancel(("route", message_id))
+        if route is not None:
+            route[0].stop()
+
+    async def _expire(self, message_id):
+        route = self._routes.pop(message_id, None)
+        if route is None:
+            return
+        route[0].stop()
+        if route[1] is not None:
+            await route[1]()
+
+    def get(self, message_id):
+        """The live view on `message_id`, or None."""
+        route = self._routes.get(message_id)
+        return route[0] if route else None
+
+    def __contains__(self, message_id):
+        return message_id in self._routes
+
+    def __len__(self):
+        return len(self._routes)
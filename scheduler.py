@@ -0,0 +1,111 @@
+"""
+A single-task deadline scheduler backed by a min-heap.
+
+Instead of one sleeping coroutine (or a once-a-second poll) per timer, every
+deadline goes into one heap and one task sleeps exactly until the earliest
+of them. Scheduling an earlier deadline wakes the task immediately.
+Deadlines are wall-clock timestamps (time.time()) so they can be computed
+from persisted datetimes.
+"""
+import asyncio
+import heapq
+import itertools
+import time
+
+
+class DeadlineScheduler:
+    def __init__(self, on_fired=None):
+        """
+        Args:
+            on_fired: Optional `on_fired(key, seconds, ok)`, called after each
+                job with how long it ran (used for metrics).
+        """
+        self.on_fired = on_fired
+        self._heap = []  # [when, sequence, key]
+        self._entries = {}  # key -> (when, sequence, callback)
+        self._sequence = itertools.count()
+        self._wakeup = None
+        self._task = None
+
+    def schedule(self, key, when, callback):
+        """
+        Run `callback()` (a coroutine function) at timestamp `when`.
+
+        Scheduling an existing key replaces its previous deadline.
+        """
+        sequence = next(self._sequence)
+        self._entries[key] = (when, sequence, callback)
+        heapq.heappush(self._heap, (when, sequence, key))
+        if self._wakeup is not None and self._heap[0][1] == sequence:
+            self._wakeup.set()  # New earliest deadline: re-arm the sleep
+
+    def cancel(self, key):
+        # Heap entries are dropped lazily when they reach the top
+        self._entries.pop(key, None)
+
+    def deadline(self, key):
+        entry = self._entries.get(key)
+        return entry[0] if entry else None
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def start(self):
+        """Start the scheduler task; calling it again while running does nothing."""
+        if self._task is not None and not self._task.done():
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _pop_stale(self):
+        while self._heap:
+            when, sequence, key = self._heap[0]
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] == sequence:
+                return
+            heapq.heappop(self._heap)
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            self._pop_stale()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            delay = self._heap[0][0] - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                    continue  # Woken early: the earliest deadline changed
+                except asyncio.TimeoutError:
+                    pass
+
+            now = time.time()
+            while self._heap:
+                self._pop_stale()
+                if not self._heap or self._heap[0][0] > now:
+                    break
+                _, _, key = heapq.heappop(self._heap)
+                _, _, callback = self._entries.pop(key)
+                asyncio.get_running_loop().create_task(self._fire(key, callback))
+
+    async def _fire(self, key, callback):
+        start = time.perf_counter()
+        ok = False
+        try:
+            await callback()
+            ok = True
+        except Exception as e:
+            print(f"Scheduled job {key!r} failed: {e}")
+        finally:
+            if self.on_fired is not None:
+                self.on_fired(key, time.perf_counter() - start, ok)
@@ -0,0 +1,46 @@
+"""
+Startup phase timings.
+
+Import this first: the clock starts when the module is imported, so the
+"imports" phase covers discord.py and the bot's own modules. Each loading
+step is wrapped in `startup.phase(name)` and on_ready calls
+`startup.mark_ready()` to get the total time-to-ready.
+"""
+import time
+from contextlib import contextmanager
+
+
+class StartupTimer:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}  # name -> seconds, in the order they ran
+        self.ready = None  # seconds from start to the first on_ready
+        self._last = self.started
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.phases[name] = self.phases.get(name, 0.0) + end - start
+            self._last = end
+
+    def lap(self, name):
+        """Record everything since the previous phase ended (e.g. the imports) as `name`."""
+        now = time.perf_counter()
+        self.phases[name] = self.phases.get(name, 0.0) + now - self._last
+        self._last = now
+
+    def mark_ready(self):
+        """Record time-to-ready on the first call; returns it (later calls return the same value)."""
+        if self.ready is None:
+            self.ready = time.perf_counter() - self.started
+        return self.ready
+
+    def summary(self):
+        return ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in self.phases.items())
+
+
+startup = StartupTimer()
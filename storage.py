@@ -0,0 +1,329 @@
+"""
+SQLite storage for the bot's characters, gold balances, gold ledger, market
+listings, auctions, trade offers and channel settings.
+
+Every table keeps one row per record so a claim, kill or sale only rewrites
+the rows that changed instead of re-serializing the whole data set. Writes
+arrive in batches from the persistence scheduler (see persistence.py). The
+database runs in WAL mode so readers never block the single writer.
+Rows are decoded with orjson when it is installed (it's optional).
+"""
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    from orjson import loads
+except ImportError:
+    loads = json.loads
+
+
+def _serialize(obj):
+    """JSON fallback for values json can't encode natively (datetimes in settings)."""
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def encode(data):
+    """Encode a record for storage."""
+    return json.dumps(data, default=_serialize, ensure_ascii=False)
+
+
+class IdSequence:
+    """
+    IDs that never repeat, even across restarts. Ledger idempotency keys are
+    built from listing, auction and offer IDs and live forever, so an ID
+    can't be derived from the records that happen to still be open. A
+    high-water mark in the meta table reserves IDs a block at a time, so
+    handing one out rarely touches the database; whatever is left of a block
+    at a restart is skipped.
+    """
+
+    def __init__(self, store, name, existing=(), ledger_prefix=None, block=50):
+        """
+        Args:
+            store: The Store holding the high-water mark.
+            name: The sequence name ("listing", ...).
+            existing: IDs of saved records, and `ledger_prefix` the idempotency
+                key prefix built from these IDs: both only matter the first time,
+                to start a database from before this counter past every ID used.
+            block: How many IDs to reserve per database write.
+        """
+        self.store = store
+        self.key = f"{name}_ids_reserved"
+        self.block = block
+        reserved = store.get_meta(self.key)
+        if reserved is None:
+            ids = [int(i) for i in existing if str(i).isdigit()]
+            if ledger_prefix is not None:
+                ids.append(store.max_ledger_key_id(ledger_prefix))
+            reserved = max(ids, default=0)
+        self._next = int(reserved) + 1
+        self._limit = int(reserved)
+
+    def __call__(self):
+        if self._next > self._limit:
+            self._limit = self._next + self.block - 1
+            self.store.set_meta(self.key, str(self._limit))
+        value = self._next
+        self._next += 1
+        return str(value)
+
+
+class Store:
+    """Small repository API over a single SQLite database file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        # isolation_level=None gives us explicit BEGIN/COMMIT control
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_tables()
+
+    def _create_tables(self):
+        with self.transaction() as cur:
+            cur.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            cur.execute("CREATE TABLE IF NOT EXISTS characters (name TEXT PRIMARY KEY, data TEXT NOT NULL)")
+            cur.execute("CREATE TABLE IF NOT EXISTS gold (user_id TEXT PRIMARY KEY, balance INTEGER NOT NULL)")
+            cur.execute("CREATE TABLE IF NOT EXISTS channel_settings (guild_id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+            cur.execute("CREATE TABLE IF NOT EXISTS spawns (message_id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+            cur.execute("CREATE TABLE IF NOT EXISTS listings (listing_id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+            cur.execute("CREATE TABLE IF NOT EXISTS auctions (auction_id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+            cur.execute("CREATE TABLE IF NOT EXISTS trades (offer_id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+            cur.execute(
+                "CREATE TABLE IF NOT EXISTS ledger ("
+                "seq INTEGER PRIMARY KEY, key TEXT UNIQUE, kind TEXT NOT NULL, "
+                "legs TEXT NOT NULL, memo TEXT, created_at REAL NOT NULL)"
+            )
+
+    @contextmanager
+    def transaction(self):
+        """Run a block of statements atomically; rolls back on any error."""
+        with self._lock:
+            cur = self.conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                yield cur
+            except BaseException:
+                cur.execute("ROLLBACK")
+                raise
+            else:
+                cur.execute("COMMIT")
+            finally:
+                cur.close()
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    #---------------- meta ----------------#
+
+    def get_meta(self, key, default=None):
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        with self.transaction() as cur:
+            cur.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    #---------------- characters ----------------#
+
+    def load_characters(self):
+        with self._lock:
+            rows = self.conn.execute("SELECT name, data FROM characters").fetchall()
+        return {name: loads(data) for name, data in rows}
+
+    def write_characters(self, rows):
+        """
+        Apply a batch of character rows in one transaction.
+
+        `rows` maps name -> encoded JSON, or None to delete the row. A rename is
+        simply the old name mapped to None and the new name to its data.
+        """
+        self._write_rows("characters", "name", "data", rows)
+
+    #---------------- gold ----------------#
+
+    def load_gold(self):
+        with self._lock:
+            rows = self.conn.execute("SELECT user_id, balance FROM gold").fetchall()
+        return {user_id: balance for user_id, balance in rows}
+
+    def write_gold(self, rows):
+        """Apply a batch of balances (user_id -> int, or None to delete)."""
+        self._write_rows("gold", "user_id", "balance", rows)
+
+    #---------------- gold ledger ----------------#
+
+    # The gold table doubles as the ledger's balance snapshot: it holds every
+    # balance as of the entry in the 'ledger_snapshot_seq' meta key.
+
+    def ledger_snapshot_seq(self):
+        return int(self.get_meta("ledger_snapshot_seq", 0))
+
+    def last_ledger_seq(self):
+        with self._lock:
+            row = self.conn.execute("SELECT MAX(seq) FROM ledger").fetchone()
+        return row[0] or 0
+
+    def load_ledger(self, after_seq=0):
+        """Ledger rows (seq, key, kind, legs, memo, created_at) after `after_seq`, in order."""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT seq, key, kind, legs, memo, created_at FROM ledger WHERE seq > ? ORDER BY seq",
+                (after_seq,)
+            ).fetchall()
+
+    def max_ledger_key_id(self, prefix):
+        """The highest number N among idempotency keys "<prefix>N" or "<prefix>N:...", or 0."""
+        with self._lock:
+            rows = self.conn.execute("SELECT key FROM ledger WHERE key LIKE ?", (prefix + "%",)).fetchall()
+        ids = [key[len(prefix):].split(":", 1)[0] for key, in rows]
+        return max((int(i) for i in ids if i.isdigit()), default=0)
+
+    def find_ledger_entry(self, key):
+        with self._lock:
+            return self.conn.execute(
+                "SELECT seq, key, kind, legs, memo, created_at FROM ledger WHERE key = ?", (key,)
+            ).fetchone()
+
+    def append_ledger(self, entries, snapshot=None):
+        """
+        Append ledger entries and, if given, a balance snapshot
+        (seq, {user_id: balance}) in one transaction.
+        """
+        with self.transaction() as cur:
+            cur.executemany(
+                "INSERT OR IGNORE INTO ledger (seq, key, kind, legs, memo, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                [(e.seq, e.key, e.kind, json.dumps(e.legs), e.memo, e.created_at) for e in entries]
+            )
+            if snapshot is not None:
+                seq, balances = snapshot
+                cur.executemany(
+                    "INSERT OR REPLACE INTO gold (user_id, balance) VALUES (?, ?)",
+                    [(str(user_id), balance) for user_id, balance in balances.items()]
+                )
+                cur.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('ledger_snapshot_seq', ?)", (str(seq),))
+
+    #---------------- channel settings ----------------#
+
+    def load_channel_settings(self):
+        with self._lock:
+            rows = self.conn.execute("SELECT guild_id, data FROM channel_settings").fetchall()
+        return {guild_id: loads(data) for guild_id, data in rows}
+
+    def write_channel_settings(self, rows):
+        """Apply a batch of guild settings (guild_id -> encoded JSON, or None to delete)."""
+        self._write_rows("channel_settings", "guild_id", "data", rows)
+
+    #---------------- active spawns ----------------#
+
+    def load_spawns(self):
+        with self._lock:
+            rows = self.conn.execute("SELECT message_id, data FROM spawns").fetchall()
+        return {message_id: loads(data) for message_id, data in rows}
+
+    def write_spawns(self, rows):
+        """Apply a batch of spawns (message_id -> encoded JSON, or None once resolved)."""
+        self._write_rows("spawns", "message_id", "data", rows)
+
+    #---------------- market listings ----------------#
+
+    def load_listings(self):
+        with self._lock:
+            rows = self.conn.execute("SELECT listing_id, data FROM listings").fetchall()
+        return {listing_id: loads(data) for listing_id, data in rows}
+
+    def write_listings(self, rows):
+        """Apply a batch of listings (listing_id -> encoded JSON, or None once closed)."""
+        self._write_rows("listings", "listing_id", "data", rows)
+
+    #---------------- auctions ----------------#
+
+    def load_auctions(self):
+        with self._lock:
+            rows = self.conn.execute("SELECT auction_id, data FROM auctions").fetchall()
+        return {auction_id: loads(data) for auction_id, data in rows}
+
+    def write_auctions(self, rows):
+        """Apply a batch of auctions (auction_id -> encoded JSON, or None once settled)."""
+        self._write_rows("auctions", "auction_id", "data", rows)
+
+    #---------------- trade offers ----------------#
+
+    def load_trades(self):
+        with self._lock:
+            rows = self.conn.execute("SELECT offer_id, data FROM trades").fetchall()
+        return {offer_id: loads(data) for offer_id, data in rows}
+
+    def write_trades(self, rows):
+        """Apply a batch of trade offers (offer_id -> encoded JSON, or None once closed)."""
+        self._write_rows("trades", "offer_id", "data", rows)
+
+    #---------------- batched writes ----------------#
+
+    def _write_rows(self, table, key_column, value_column, rows):
+        upserts = [(str(key), value) for key, value in rows.items() if value is not None]
+        deletes = [(str(key),) for key, value in rows.items() if value is None]
+        with self.transaction() as cur:
+            if deletes:
+                cur.executemany(f"DELETE FROM {table} WHERE {key_column} = ?", deletes)
+            if upserts:
+                cur.executemany(
+                    f"INSERT OR REPLACE INTO {table} ({key_column}, {value_column}) VALUES (?, ?)",
+                    upserts
+                )
+
+    #---------------- one-time migration ----------------#
+
+    def migrate_from_json(self, characters_file, gold_file, settings_file):
+        """
+        Import the legacy JSON files into the database.
+
+        Runs once: afterwards the 'migrated_json' meta key is set and the JSON
+        files are left untouched on disk as a backup. Returns True if a
+        migration happened.
+        """
+        if self.get_meta("migrated_json"):
+            return False
+
+        def read(path):
+            if not os.path.exists(path):
+                return {}
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    return loads(f.read())
+            except (json.JSONDecodeError, ValueError):
+                print(f"Corrupted or empty {path}. Skipping it during migration.")
+                return {}
+
+        legacy_characters = read(characters_file)
+        legacy_gold = read(gold_file)
+        legacy_settings = read(settings_file)
+
+        with self.transaction() as cur:
+            cur.executemany(
+                "INSERT OR REPLACE INTO characters (name, data) VALUES (?, ?)",
+                [(name, encode(data)) for name, data in legacy_characters.items()]
+            )
+            cur.executemany(
+                "INSERT OR REPLACE INTO gold (user_id, balance) VALUES (?, ?)",
+                [(str(user_id), balance) for user_id, balance in legacy_gold.items()]
+            )
+            cur.executemany(
+                "INSERT OR REPLACE INTO channel_settings (guild_id, data) VALUES (?, ?)",
+                [(str(guild_id), encode(data)) for guild_id, data in legacy_settings.items()]
+            )
+            cur.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_json', ?)",
+                        (datetime.now().isoformat(),))
+
+        print(f"Migrated {len(legacy_characters)} characters, {len(legacy_gold)} gold balances "
+              f"and {len(legacy_settings)} guild settings into {self.path}.")
+        return True
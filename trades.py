@@ -0,0 +1,385 @@
+"""
+Two-party trade offers with escrow.
+
+An offer bundles characters and gold on both sides: the proposer gives
+`give` and asks for `want`. Confirming the offer escrows the proposer's side
+right away: their gold moves into the offer's escrow account in the ledger
+and their characters are held, so they can't be sold, auctioned, released
+or offered again while the offer is pending. The recipient confirms by
+accepting, which commits the whole swap in one step: with the ledger locks
+held and no await in between, both sides are re-checked, one ledger entry
+pays out the escrow and the recipient's gold, and the characters change
+owner. Declining, cancelling or expiry refunds the escrow.
+
+Pending offers live in an index (by ID, by user and by held character) with
+their expiry in the shared DeadlineScheduler, instead of a coroutine parked
+on wait_for per offer. Escrow, settlement and refund entries are posted under
+idempotency keys ("trade:<id>:escrow", ":settle", ":refund"), so recover()
+finishes whatever a crash interrupted and returns gold stranded in the
+escrow of an offer that was never saved.
+"""
+import asyncio
+import itertools
+import time
+
+from ledger import InsufficientFunds
+
+# How an offer ended
+ACCEPTED = "accepted"
+DECLINED = "declined"
+CANCELLED = "cancelled"
+EXPIRED = "expired"
+INVALID = "invalid"  # Someone no longer owns what they put in
+
+MAX_PENDING = 10  # Offers a user can have open as proposer
+
+
+class TradeError(Exception):
+    pass
+
+
+def escrow_account(offer_id):
+    return f"escrow:trade:{offer_id}"
+
+
+def escrow_key(offer_id):
+    return f"trade:{offer_id}:escrow"
+
+
+def settle_key(offer_id):
+    return f"trade:{offer_id}:settle"
+
+
+def refund_key(offer_id):
+    return f"trade:{offer_id}:refund"
+
+
+class TradeDesk:
+    def __init__(self, characters, ledger, scheduler, on_change=None, on_closed=None, next_id=None):
+        """
+        Args:
+            characters: The characters dict.
+            ledger: The GoldLedger that holds the escrow.
+            scheduler: The shared DeadlineScheduler (offer expiry).
+            on_change: Called with an offer ID whenever an offer changes (used to queue a save).
+            on_closed: Called as `on_closed(offer, result)` once an offer is accepted or called off.
+            next_id: `next_id()` -> an offer ID that has never been used
+                (storage.IdSequence). Escrow, settlement and refund keys are built
+                from it, so it must not repeat across restarts; the default
+                counter is for tests only.
+        """
+        self.characters = characters
+        self.ledger = ledger
+        self.scheduler = scheduler
+        self.on_change = on_change
+        self.on_closed = on_closed
+        # offer ID -> {"id", "proposer", "recipient", "give": {"characters", "gold"},
+        #              "want": {"characters", "gold"}, "created_at", "expires_at", "channel_id", "message_id"}
+        self.offers = {}
+        self._by_user = {}  # user ID -> set of offer IDs they're part of
+        self._held = {}  # character name -> offer ID holding it
+        if next_id is None:
+            counter = itertools.count(1)
+            next_id = lambda: str(next(counter))
+        self.next_id = next_id
+
+        # Stats
+        self.proposed = 0
+        self.accepted = 0
+        self.called_off = 0
+        self.gold_moved = 0
+
+    def __len__(self):
+        return len(self.offers)
+
+    def _changed(self, offer_id):
+        if self.on_change is not None:
+            self.on_change(offer_id)
+
+    def _index(self, offer):
+        self.offers[offer["id"]] = offer
+        for user_id in (offer["proposer"], offer["recipient"]):
+            self._by_user.setdefault(user_id, set()).add(offer["id"])
+        for name in offer["give"]["characters"]:
+            self._held[name] = offer["id"]
+
+    def _unindex(self, offer):
+        self.offers.pop(offer["id"], None)
+        for user_id in (offer["proposer"], offer["recipient"]):
+            ids = self._by_user.get(user_id)
+            if ids is not None:
+                ids.discard(offer["id"])
+                if not ids:
+                    del self._by_user[user_id]
+        for name in offer["give"]["characters"]:
+            if self._held.get(name) == offer["id"]:
+                del self._held[name]
+
+    def load(self, offers):
+        """Index saved offers (call recover() once the bot is running)."""
+        for offer in offers.values():
+            self._index(offer)
+
+    def recover(self):
+        """Finish swaps and refunds a restart interrupted, and refund escrow left without an offer."""
+        for offer in list(self.offers.values()):
+            if self.ledger.find(settle_key(offer["id"])) is not None:
+                self._finish(offer, ACCEPTED)
+            elif self._swapped(offer):
+                self._recover_swap(offer)
+            elif self.ledger.find(refund_key(offer["id"])) is not None:
+                self._finish(offer, CANCELLED)
+            else:
+                for name in offer["give"]["characters"]:
+                    self.revalidate(name)
+        for account, balance in list(self.ledger.balances.items()):
+            if account.startswith("escrow:trade:") and balance > 0:
+                offer_id = account.rsplit(":", 1)[1]
+                entry = self.ledger.find(escrow_key(offer_id))
+                if offer_id not in self.offers and entry is not None:
+                    proposer = next(user_id for user_id, delta in entry.legs if delta < 0)
+                    self.ledger.post(((account, -balance), (proposer, balance)), kind="trade_refund",
+                                     key=refund_key(offer_id))
+
+    def _recover_swap(self, offer):
+        """
+        The characters were saved swapped but the settlement never reached the
+        ledger: post it now, or swap the characters back and refund the escrow
+        if the recipient can no longer pay.
+        """
+        give_gold, want_gold = offer["give"]["gold"], offer["want"]["gold"]
+        if give_gold or want_gold:
+            try:
+                self.ledger.post(self._settle_legs(offer), kind="trade", key=settle_key(offer["id"]),
+                                 memo=f"offer #{offer['id']}")
+            except InsufficientFunds:
+                for name in offer["give"]["characters"]:
+                    self.characters[name].owner = offer["proposer"]
+                for name in offer["want"]["characters"]:
+                    self.characters[name].owner = offer["recipient"]
+                self._refund(offer, INVALID)
+                return
+            self.gold_moved += give_gold + want_gold
+        self._finish(offer, ACCEPTED)
+
+    def _swapped(self, offer):
+        """True if an offer's characters (it has some) all belong to the other side already."""
+        sides = ((offer["give"]["characters"], offer["recipient"]), (offer["want"]["characters"], offer["proposer"]))
+        names = [(name, owner) for names, owner in sides for name in names]
+        return bool(names) and all(name in self.characters and self.characters[name].owner == owner
+                                   for name, owner in names)
+
+    def schedule(self, offer_id):
+        offer = self.offers.get(offer_id)
+        if offer is not None:
+            self.scheduler.schedule(("trade", offer_id), offer["expires_at"], lambda: self._expire(offer_id))
+
+    async def _expire(self, offer_id):
+        try:
+            await self.call_off(offer_id, EXPIRED)
+        except TradeError:
+            pass  # Accepted or called off while the timer waited for the locks
+
+    #---------------- reading ----------------#
+
+    def offer_holding(self, name):
+        """The pending offer holding `name` in escrow, or None."""
+        offer_id = self._held.get(name)
+        return self.offers.get(offer_id) if offer_id else None
+
+    def offers_for(self, user_id):
+        """Pending offers `user_id` made or received, oldest first."""
+        return sorted((self.offers[offer_id] for offer_id in self._by_user.get(user_id, ())),
+                      key=lambda offer: offer["created_at"])
+
+    #---------------- proposing ----------------#
+
+    def _check_side(self, owner, names, gold):
+        if gold < 0:
+            raise TradeError("Gold amounts can't be negative.")
+        if len(set(names)) != len(names):
+            raise TradeError("A character can only be in an offer once.")
+        for name in names:
+            character = self.characters.get(name)
+            if character is None:
+                raise TradeError(f"Character '{name}' not found.")
+            if character.owner != owner:
+                raise TradeError(f"<@{owner}> does not own '{name}'.")
+
+    def validate(self, proposer, recipient, give_characters=(), give_gold=0, want_characters=(), want_gold=0):
+        """Raise TradeError if this offer couldn't be made right now."""
+        if proposer == recipient:
+            raise TradeError("You can't trade with yourself.")
+        if not (give_characters or give_gold or want_characters or want_gold):
+            raise TradeError("An offer has to include at least one character or some gold.")
+        if not (give_characters or give_gold):
+            raise TradeError("You have to offer something in return.")
+        if sum(1 for offer in self.offers_for(proposer) if offer["proposer"] == proposer) >= MAX_PENDING:
+            raise TradeError(f"You already have {MAX_PENDING} offers waiting. Cancel one first.")
+        self._check_side(proposer, give_characters, give_gold)
+        self._check_side(recipient, want_characters, want_gold)
+        if give_gold > self.ledger.balance(proposer):
+            raise TradeError(f"You only have {self.ledger.balance(proposer):,} gold.")
+        for name in give_characters:
+            if name in self._held:
+                raise TradeError(f"'{name}' is already part of another offer.")
+
+    async def propose(self, proposer, recipient, give_characters=(), give_gold=0, want_characters=(), want_gold=0,
+                      duration=3600, now=None):
+        """
+        Create an offer and escrow the proposer's side. Returns the offer.
+
+        Raises TradeError for an invalid offer and InsufficientFunds if the
+        proposer can't cover `give_gold`.
+        """
+        give_characters, want_characters = list(give_characters), list(want_characters)
+        self.validate(proposer, recipient, give_characters, give_gold, want_characters, want_gold)
+
+        offer_id = self.next_id()
+        escrow = escrow_account(offer_id)
+        async with self.ledger.locked(proposer, escrow):
+            # Re-check what could have changed while waiting for the locks
+            self._check_side(proposer, give_characters, give_gold)
+            for name in give_characters:
+                if name in self._held:
+                    raise TradeError(f"'{name}' is already part of another offer.")
+            if give_gold:
+                self.ledger.post(((proposer, -give_gold), (escrow, give_gold)), kind="trade_escrow",
+                                 key=escrow_key(offer_id))
+
+            now = time.time() if now is None else now
+            offer = {
+                "id": offer_id,
+                "proposer": proposer,
+                "recipient": recipient,
+                "give": {"characters": give_characters, "gold": give_gold},
+                "want": {"characters": want_characters, "gold": want_gold},
+                "created_at": now,
+                "expires_at": now + duration,
+                "channel_id": None,
+                "message_id": None,
+            }
+            self._index(offer)
+        self.proposed += 1
+        self.schedule(offer_id)
+        self._changed(offer_id)
+        return offer
+
+    def attach_message(self, offer_id, channel_id, message_id):
+        offer = self.offers.get(offer_id)
+        if offer is not None:
+            offer["channel_id"] = channel_id
+            offer["message_id"] = message_id
+            self._changed(offer_id)
+
+    #---------------- settling ----------------#
+
+    async def accept(self, offer_id, user_id):
+        """
+        Accept an offer as its recipient: swap everything in one step. Returns the offer.
+
+        Raises TradeError if the offer is gone, isn't theirs or someone no
+        longer owns what they put in (the offer is then called off), and
+        InsufficientFunds if the recipient can't cover the gold asked for.
+        """
+        offer = self.offers.get(offer_id)
+        if offer is None:
+            raise TradeError("This offer is no longer open.")
+        if offer["recipient"] != user_id:
+            raise TradeError("Only the person this offer was made to can accept it.")
+
+        proposer, recipient = offer["proposer"], offer["recipient"]
+        escrow = escrow_account(offer_id)
+        async with self.ledger.locked(proposer, recipient, escrow):
+            if self.offers.get(offer_id) is not offer:
+                raise TradeError("This offer is no longer open.")
+            try:
+                self._check_side(proposer, offer["give"]["characters"], 0)
+                self._check_side(recipient, offer["want"]["characters"], 0)
+            except TradeError:
+                self._refund(offer, INVALID)
+                raise
+
+            give_gold, want_gold = offer["give"]["gold"], offer["want"]["gold"]
+            if give_gold or want_gold:
+                self.ledger.post(self._settle_legs(offer), kind="trade", key=settle_key(offer_id),
+                                 memo=f"offer #{offer_id}")
+            self.gold_moved += give_gold + want_gold
+            return self._finish(offer, ACCEPTED)
+
+    async def call_off(self, offer_id, result, user_id=None):
+        """
+        Decline, cancel or expire an offer and refund the escrow. Returns the offer.
+
+        With `user_id`, only the recipient may decline and only the proposer may cancel.
+        """
+        offer = self.offers.get(offer_id)
+        if offer is None:
+            raise TradeError("This offer is no longer open.")
+        if result == DECLINED and user_id is not None and user_id != offer["recipient"]:
+            raise TradeError("Only the person this offer was made to can decline it.")
+        if result == CANCELLED and user_id is not None and user_id != offer["proposer"]:
+            raise TradeError("Only the person who made this offer can cancel it.")
+        async with self.ledger.locked(offer["proposer"], escrow_account(offer_id)):
+            if self.offers.get(offer_id) is not offer:
+                raise TradeError("This offer is no longer open.")
+            return self._refund(offer, result)
+
+    def _settle_legs(self, offer):
+        """Pay the escrow to the recipient and the gold asked for to the proposer."""
+        escrow = escrow_account(offer["id"])
+        give_gold, want_gold = offer["give"]["gold"], offer["want"]["gold"]
+        return [(escrow, -give_gold), (offer["recipient"], give_gold),
+                (offer["recipient"], -want_gold), (offer["proposer"], want_gold)]
+
+    def _refund(self, offer, result):
+        escrow = escrow_account(offer["id"])
+        balance = self.ledger.balance(escrow)
+        if balance:
+            self.ledger.post(((escrow, -balance), (offer["proposer"], balance)), kind="trade_refund",
+                             key=refund_key(offer["id"]))
+        return self._finish(offer, result)
+
+    def _finish(self, offer, result):
+        """Close an offer; an accepted one swaps the characters (the gold has already moved)."""
+        self._unindex(offer)
+        self.scheduler.cancel(("trade", offer["id"]))
+        if result == ACCEPTED:
+            for name in offer["give"]["characters"]:
+                if name in self.characters:
+                    self.characters[name].owner = offer["recipient"]
+            for name in offer["want"]["characters"]:
+                if name in self.characters:
+                    self.characters[name].owner = offer["proposer"]
+            self.accepted += 1
+        else:
+            self.called_off += 1
+        offer["result"] = result
+        self._changed(offer["id"])
+        if self.on_closed is not None:
+            self.on_closed(offer, result)
+        return offer
+
+    def revalidate(self, name):
+        """Call off the offer holding `name` if its proposer lost the character some other way."""
+        offer = self.offer_holding(name)
+        if offer is None:
+            return
+        character = self.characters.get(name)
+        if character is None or character.owner != offer["proposer"]:
+            async def invalidate():
+                try:
+                    await self.call_off(offer["id"], INVALID)
+                except TradeError:
+                    pass  # Closed while we waited for the locks
+            asyncio.get_running_loop().create_task(invalidate())
+
+    def stats(self):
+        return {
+            "pending": len(self.offers),
+            "held_characters": len(self._held),
+            "proposed": self.proposed,
+            "accepted": self.accepted,
+            "called_off": self.called_off,
+            "gold_moved": self.gold_moved,
+        }
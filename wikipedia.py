@@ -0,0 +1,168 @@
+"""
+Wikipedia lead-paragraph extraction.
+
+The article page is streamed through an incremental HTMLParser and reading
+stops as soon as the first real paragraph of the article body is complete,
+so a long article costs a few kilobytes instead of the whole page. Empty
+paragraphs, infobox tables, coordinates, references, hidden elements and
+parenthesised asides are skipped; every HTML entity is decoded. The work is
+linear in the bytes read.
+"""
+import codecs
+import re
+from html.parser import HTMLParser
+
+WIKIPEDIA_URL = "https://en.wikipedia.org/wiki/"
+DISAMBIGUATION_SUFFIX = " may refer to:"
+
+# Elements whose whole content is dropped
+SKIP_TAGS = frozenset({"sup", "style", "script", "table", "math", "figure"})
+SKIP_CLASSES = frozenset({
+    "mw-empty-elt", "reference", "noprint", "mw-ref", "hatnote", "geo-inline-hidden", "sortkey",
+})
+SKIP_IDS = frozenset({"coordinates"})
+VOID_TAGS = frozenset({
+    "area", "base", "br", "col", "embed", "hr", "img", "input",
+    "link", "meta", "param", "source", "track", "wbr",
+})
+
+_BRACKETS = re.compile(r"[()\[\]]")
+
+
+class LeadParagraphParser(HTMLParser):
+    """
+    Feed it HTML in chunks; `done` turns True once the first paragraph with
+    text in it has been closed, and `text` then holds that paragraph.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.done = False
+        self.text = None
+        self._in_paragraph = False
+        self._skip_tag = None  # tag that opened the element being skipped
+        self._skip_depth = 0
+        self._brackets = 0  # nesting depth of ( ) and [ ]
+        self._parts = []
+
+    def _skipped(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            return True
+        attrs = dict(attrs)
+        if attrs.get("id") in SKIP_IDS:
+            return True
+        if "display:none" in (attrs.get("style") or "").replace(" ", ""):
+            return True
+        return not SKIP_CLASSES.isdisjoint((attrs.get("class") or "").split())
+
+    def handle_starttag(self, tag, attrs):
+        if self.done or tag in VOID_TAGS:
+            return
+        if self._skip_tag is not None:
+            if tag == self._skip_tag:
+                self._skip_depth += 1
+            return
+        if tag == "p":
+            # A paragraph that was never closed ends where the next one starts
+            if self._in_paragraph:
+                self._end_paragraph()
+                if self.done:
+                    return
+            if self._skipped(tag, attrs):
+                self._skip_tag, self._skip_depth = tag, 1
+            else:
+                self._in_paragraph = True
+            return
+        if self._skipped(tag, attrs):
+            self._skip_tag, self._skip_depth = tag, 1
+
+    def handle_endtag(self, tag):
+        if self.done:
+            return
+        if self._skip_tag is not None:
+            if tag == self._skip_tag:
+                self._skip_depth -= 1
+                if self._skip_depth == 0:
+                    self._skip_tag = None
+            return
+        if self._in_paragraph and tag in ("p", "div"):
+            self._end_paragraph()
+
+    def handle_data(self, data):
+        if self.done or not self._in_paragraph or self._skip_tag is not None:
+            return
+        position = 0
+        for match in _BRACKETS.finditer(data):
+            if self._brackets == 0:
+                self._parts.append(data[position:match.start()])
+            if match.group() in "([":
+                if self._brackets == 0 and match.group() == "(":
+                    self._strip_trailing_space()
+                self._brackets += 1
+            elif self._brackets:
+                self._brackets -= 1
+            position = match.end()
+        if self._brackets == 0:
+            self._parts.append(data[position:])
+
+    def _strip_trailing_space(self):
+        # "Name (born 1990) is" -> "Name is"; the space may be in an earlier data chunk
+        while self._parts and not self._parts[-1].strip():
+            self._parts.pop()
+        if self._parts:
+            self._parts[-1] = self._parts[-1].rstrip()
+
+    def close(self):
+        """Flush buffered input; a paragraph still open at the end of the page counts."""
+        super().close()
+        if not self.done and self._in_paragraph:
+            self._end_paragraph()
+
+    def _end_paragraph(self):
+        text = " ".join("".join(self._parts).split())
+        self._in_paragraph = False
+        self._brackets = 0
+        self._parts = []
+        if text:
+            self.text = text
+            self.done = True
+
+
+def extract_lead_paragraph(html):
+    """Return the first real paragraph of an article's HTML, or None."""
+    parser = LeadParagraphParser()
+    for start in range(0, len(html), 16384):
+        parser.feed(html[start:start + 16384])
+        if parser.done:
+            return parser.text
+    parser.close()
+    return parser.text
+
+
+async def fetch_lead_paragraph(http, title, chunk_size=16384, max_bytes=2_000_000):
+    """
+    Stream the article for `title` and return (status, lead paragraph or None).
+
+    Reading stops once the paragraph is complete or after `max_bytes`.
+    """
+    url = WIKIPEDIA_URL + title.replace(" ", "_")
+    async with http.open("GET", url) as response:
+        if response.status != 200:
+            return response.status, None
+
+        parser = LeadParagraphParser()
+        decoder = codecs.getincrementaldecoder(response.charset or "utf-8")(errors="replace")
+        read = 0
+        async for chunk in response.content.iter_chunked(chunk_size):
+            parser.feed(decoder.decode(chunk))
+            read += len(chunk)
+            if parser.done or read >= max_bytes:
+                break
+        if not parser.done:
+            parser.feed(decoder.decode(b"", final=True))
+            parser.close()
+        return response.status, parser.text
+
+
+def is_disambiguation(text):
+    return text.endswith(DISAMBIGUATION_SUFFIX)